@@ -33,42 +33,44 @@ wget https://mystic.the-eye.eu/public/AI/pile/train/27.jsonl.zst
 wget https://mystic.the-eye.eu/public/AI/pile/train/28.jsonl.zst
 wget https://mystic.the-eye.eu/public/AI/pile/train/29.jsonl.zst
 
-unzstd 00.jsonl.zst
-unzstd 01.jsonl.zst
-unzstd 02.jsonl.zst
-unzstd 03.jsonl.zst
-unzstd 04.jsonl.zst
-unzstd 05.jsonl.zst
-unzstd 06.jsonl.zst
-unzstd 07.jsonl.zst
-unzstd 08.jsonl.zst
-unzstd 09.jsonl.zst
-unzstd 10.jsonl.zst
-unzstd 11.jsonl.zst
-unzstd 12.jsonl.zst
-unzstd 13.jsonl.zst
-unzstd 14.jsonl.zst
-unzstd 15.jsonl.zst
-unzstd 16.jsonl.zst
-unzstd 17.jsonl.zst
-unzstd 18.jsonl.zst
-unzstd 19.jsonl.zst
-unzstd 20.jsonl.zst
-unzstd 21.jsonl.zst
-unzstd 22.jsonl.zst
-unzstd 23.jsonl.zst
-unzstd 24.jsonl.zst
-unzstd 25.jsonl.zst
-unzstd 26.jsonl.zst
-unzstd 27.jsonl.zst
-unzstd 28.jsonl.zst
-unzstd 29.jsonl.zst
+# parse_pile.py reads the compressed `.jsonl.zst` files directly (requires `zstandard`),
+# so decompressing them is only necessary for other tools.
+# unzstd 00.jsonl.zst
+# unzstd 01.jsonl.zst
+# unzstd 02.jsonl.zst
+# unzstd 03.jsonl.zst
+# unzstd 04.jsonl.zst
+# unzstd 05.jsonl.zst
+# unzstd 06.jsonl.zst
+# unzstd 07.jsonl.zst
+# unzstd 08.jsonl.zst
+# unzstd 09.jsonl.zst
+# unzstd 10.jsonl.zst
+# unzstd 11.jsonl.zst
+# unzstd 12.jsonl.zst
+# unzstd 13.jsonl.zst
+# unzstd 14.jsonl.zst
+# unzstd 15.jsonl.zst
+# unzstd 16.jsonl.zst
+# unzstd 17.jsonl.zst
+# unzstd 18.jsonl.zst
+# unzstd 19.jsonl.zst
+# unzstd 20.jsonl.zst
+# unzstd 21.jsonl.zst
+# unzstd 22.jsonl.zst
+# unzstd 23.jsonl.zst
+# unzstd 24.jsonl.zst
+# unzstd 25.jsonl.zst
+# unzstd 26.jsonl.zst
+# unzstd 27.jsonl.zst
+# unzstd 28.jsonl.zst
+# unzstd 29.jsonl.zst
 
 cd ..
 wget https://mystic.the-eye.eu/public/AI/pile/test.jsonl.zst
 wget https://mystic.the-eye.eu/public/AI/pile/val.jsonl.zst
 
-unzstd test.jsonl.zst
-unzstd val.jsonl.zst
+# unzstd test.jsonl.zst
+# unzstd val.jsonl.zst
 
 echo "finished at $date"
\ No newline at end of file
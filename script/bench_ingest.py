@@ -0,0 +1,81 @@
+# coding=utf-8
+"""
+Benchmark for reading texts of a pile subset from `.jsonl` files:
+full JSON decoding of every record vs. the raw byte `pile_set_name` prefilter.
+
+    example:
+        python script/bench_ingest.py demo/data/pile/*.jsonl -c Pile-CC -n 20
+"""
+import argparse
+import time
+from pathlib import Path
+
+from pile_ingest import iter_subset_texts
+
+
+def _main():
+    args = _parse_args()
+    paths = [p for p in args.input_files if p.is_file()]
+    total_bytes = sum(p.stat().st_size for p in paths)
+    total_records = sum(_count_lines(p) for p in paths)
+    print(f'{len(paths)} file(s): {total_records} records, '
+          f'{round(total_bytes / 1024**2, 2)} MB; '
+          f'selected subset: {args.corpus_selection}; {args.repeat} repetition(s)\n')
+
+    results = {}
+    for label, prefilter in (('full decode', False), ('prefilter', True)):
+        texts, secs = _time_read(paths, args.corpus_selection,
+                                 prefilter, args.repeat)
+        results[label] = texts
+        print(f'{label:>12}: {len(texts)} texts selected'
+              f' | {round(secs, 4)} sec per pass'
+              f' | {round(total_records / secs):,} records/sec'
+              f' | {round(total_bytes / 1024**2 / secs, 1)} MB/sec')
+
+    if results['full decode'] != results['prefilter']:
+        print('\n! Selected texts differ between methods !')
+    else:
+        print('\nSelected texts are identical.')
+
+
+def _time_read(paths, subset, prefilter, repeat):
+    texts = []
+    t0 = time.perf_counter()
+    for __ in range(repeat):
+        texts = [t for p in paths
+                 for t in iter_subset_texts(p, subset, prefilter=prefilter)]
+    return texts, (time.perf_counter() - t0) / repeat
+
+
+def _count_lines(path):
+    with path.open('rb') as f:
+        return sum(1 for line in f if line.strip())
+
+
+def _parse_args():
+
+    parser = argparse.ArgumentParser(
+        description=('Compare records/sec for full JSON decoding vs. '
+                     'the raw byte pile set prefilter.'),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        'input_files', type=Path, nargs='*',
+        default=sorted(Path(__file__).parent.parent
+                       .joinpath('demo', 'data', 'pile').glob('*.jsonl')),
+        help='`.jsonl` file(s) to read. Defaults to the demo data files.')
+
+    parser.add_argument(
+        '-c', '--corpus_selection', type=str, default='Pile-CC',
+        help='pile set to select.')
+
+    parser.add_argument(
+        '-n', '--repeat', type=int, default=50,
+        help='number of passes over the input to average.')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    _main()
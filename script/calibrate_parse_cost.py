@@ -0,0 +1,135 @@
+# coding=utf-8
+"""
+Fit the parse cost model (`pile_parsecost`) used to slice dataframes by predicted
+parsing time (`parse_pile.py --slice_hours`) to the parsing times of completed
+slices, and report predicted vs actual time per slice.
+
+Inputs are slice indexes with parsing times: `all-completed-slices_meta-index.csv`
+(as exported from the slice ledger by `export_slice_ledger.py`),
+the `slice-info_[data group].csv` files of sliced data groups, or compilations
+such as `cluster_log_info/master_all-slices_index.csv`. For slices recorded
+before character and sentence counts were added to the slice info, the counts
+are taken from the slice dataframes (paths relative to the `puddin/` dir, `-d`).
+
+    examples:
+        python script/calibrate_parse_cost.py /share/compling/data/puddin/all-completed-slices_meta-index.csv
+        python script/calibrate_parse_cost.py cluster_log_info/master_all-slices_index.csv -d /share/compling/data/puddin
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from pile_parsecost import FEATURES, ParseCostModel, text_features
+
+# slice info columns of the feature totals of each slice
+_FEATURE_COLS = {'texts': 'total_texts', 'chars': 'total_chars',
+                 'sentences': 'est_sentences'}
+
+
+def _main():
+    args = _parse_args()
+    puddin_dir = args.puddin_dir or args.index_files[0].parent
+    slices = load_completed_slices(args.index_files, puddin_dir)
+    if slices.empty:
+        sys.exit('No completed slices with parsing times found.')
+    try:
+        model = ParseCostModel.fit(slices, slices.seconds)
+    except ValueError as e:
+        sys.exit(str(e))
+    previous = ParseCostModel.load(args.output)
+
+    report = slices.assign(
+        previous_prediction=previous.predict(slices).round(),
+        prediction=model.predict(slices).round())
+    report = report.assign(
+        error_pct=(100 * (report.prediction - report.seconds) / report.seconds).round(1))
+    print(report.loc[:, list(FEATURES) + ['seconds', 'previous_prediction',
+                                          'prediction', 'error_pct']].to_string())
+    for label, m, col in (('previous', previous, 'previous_prediction'),
+                          ('new', model, 'prediction')):
+        abs_err = (report[col] - report.seconds).abs() / report.seconds
+        print(f'\n{label}: {m}\n  mean absolute error: {100 * abs_err.mean():.1f}%; '
+              f'max: {100 * abs_err.max():.1f}%')
+
+    model.save(args.output)
+    print('\nmodel saved to', args.output)
+
+
+def load_completed_slices(index_files, puddin_dir: Path):
+    """feature totals (columns `FEATURES`) and parsing `seconds` of each completed
+    slice in the given slice indexes (one row per slice)"""
+    info = pd.concat((pd.read_csv(path) for path in index_files), ignore_index=True)
+    # (`parsing_seconds` since slicing by predicted parsing time; before, only `parsing_time`)
+    seconds = pd.Series(np.nan, index=info.index)
+    if 'parsing_seconds' in info.columns:
+        seconds = pd.to_numeric(info.parsing_seconds, errors='coerce')
+    if 'parsing_time' in info.columns:
+        seconds = seconds.fillna(pd.to_timedelta(info.parsing_time, errors='coerce')
+                                 .dt.total_seconds())
+    info['seconds'] = seconds
+    key_col = 'final_slice_path' if 'final_slice_path' in info.columns else 'tmp_slice_path'
+    info = (info.loc[info.seconds > 0, :]
+            .drop_duplicates(subset=key_col, keep='last')
+            .reset_index(drop=True))
+    for col in _FEATURE_COLS.values():
+        if col not in info.columns:
+            info[col] = pd.NA
+
+    rows = []
+    for row in info.itertuples():
+        totals = {feature: getattr(row, col) for feature, col in _FEATURE_COLS.items()}
+        if any(pd.isna(v) for v in totals.values()):
+            slice_path = _find_slice(row, puddin_dir)
+            if slice_path is None:
+                print('  slice dataframe not found; skipping', getattr(row, key_col))
+                continue
+            totals = text_features(pd.read_pickle(slice_path).text).sum().to_dict()
+        rows.append(dict(totals, seconds=row.seconds))
+    return pd.DataFrame(rows, columns=list(FEATURES) + ['seconds'])
+
+
+def _find_slice(row, puddin_dir: Path):
+    for col in ('final_slice_path', 'tmp_slice_path'):
+        path = getattr(row, col, None)
+        if isinstance(path, str):
+            path = Path(path) if Path(path).is_absolute() else puddin_dir.joinpath(path)
+            if path.is_file():
+                return path
+    return None
+
+
+def _parse_args():
+
+    parser = argparse.ArgumentParser(
+        description=('Fit the parse cost model to the parsing times of completed '
+                     'slices, and save it for `parse_pile.py --slice_hours`.'),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        'index_files', type=Path, nargs='+',
+        help=('slice index `.csv` file(s) with parsing times, e.g. '
+              '`puddin/all-completed-slices_meta-index.csv`.'))
+
+    parser.add_argument(
+        '-d', '--puddin_dir', type=Path, default=None,
+        help=('`puddin/` output directory that slice paths are relative to. '
+              'Defaults to the directory of the first index file.'))
+
+    parser.add_argument(
+        '-o', '--output', type=Path, default=None,
+        help=('path to save the model to. Defaults to '
+              '`[puddin_dir]/parse-cost-model.json`, where `parse_pile.py` looks for it.'))
+
+    args = parser.parse_args()
+    if args.output is None:
+        args.output = (args.puddin_dir or args.index_files[0].parent).joinpath(
+            'parse-cost-model.json')
+    return args
+
+
+if __name__ == '__main__':
+    _main()
@@ -37,6 +37,8 @@ from pathlib import Path
 # from multiprocessing_logging import install_mp_handler
 import pandas as pd
 
+from pile_ingest import table_exists
+from pile_sliceledger import LEGACY_INDEX_FNAME, SliceLedger
 from validate_data_group import (
     VALID_EXCL_DIR_NAME,
     assess_data_group,
@@ -44,6 +46,8 @@ from validate_data_group import (
     _format,
 )
 
+_LEDGER_FNAME = "slice-ledger.sqlite"
+
 # assign monikers for logging actions
 # _debug = logging.debug
 #! do not use logging.inform! It just causes problems with the output. Just use print().
@@ -111,7 +115,7 @@ def _main():
     print(
         f'\n{time.strftime("%Y-%m-%d  %I:%M%p")}: Starting Puddin Validation of {_DATA_GRPS if _DATA_GRPS else "ALL data groups"}...'
     )
-    # > Load meta info dataframe
+    # > Load meta info dataframe (completed slices in the slice ledger)
     meta_info_path, meta = _load_meta_info()
     # For each row (i.e. slice) compare the text ids found in the files at
     # the following paths: raw, final, conllu. Make sure any missing
@@ -186,45 +190,49 @@ def _format_counts(df, columns):
 
 
 def _load_meta_info():
-    meta_info_path = _INFO_DIR.joinpath("completed-puddin_meta-index.pkl")
+    """info on the completed slices, one row per slice, from the slice ledger
+    (see `pile_sliceledger`)"""
+    ledger_path = DATA_DIR.joinpath(_LEDGER_FNAME)
     print(
-        f'{time.strftime("%Y-%m-%d  %I:%M%p")}: Loading processing meta info from {meta_info_path} ...'
+        f'{time.strftime("%Y-%m-%d  %I:%M%p")}: Loading processing meta info from {ledger_path} ...'
     )
-    if not meta_info_path.is_file():
-        print(
-            f"<!> ERROR! {meta_info_path} does not exist. Data cannot be assessed.")
-        sys.exit(1)
-    meta = pd.read_pickle(meta_info_path)
-
+    legacy_index_path = DATA_DIR.joinpath(LEGACY_INDEX_FNAME)
+    if not ledger_path.is_file():
+        if not legacy_index_path.is_file():
+            print(
+                f"<!> ERROR! {ledger_path} does not exist. Data cannot be assessed.")
+            sys.exit(1)
+        # > (builds processed before the slice ledger was kept:
+        # >   the last record of each slice in the completed slices index)
+        print(f"  no slice ledger yet; importing completed slices from {legacy_index_path}")
+    ledger = SliceLedger(ledger_path)
+    if not len(ledger) and legacy_index_path.is_file():
+        ledger.import_completed(legacy_index_path)
+
+    all_slices = ledger.to_frame(states=None)
+    meta = ledger.to_frame().reset_index()
     if _DATA_GRPS:
         meta = meta.loc[(meta.data_origin_group.isin(_DATA_GRPS)), :]
+        all_slices = all_slices.loc[all_slices.data_origin_group.isin(_DATA_GRPS), :]
 
         if meta.empty:
             print(
                 f"<!> ERROR! No processing data found for sources: {_DATA_GRPS}.")
             sys.exit(1)
 
-    was_overwritten = meta.slice_name.duplicated(keep="last")
-    if any(was_overwritten):
-        owdf = (
-            meta.loc[
-                :,
-                meta.columns.isin(
-                    ["slice_name", "finished_at", "conllu_mtime", "conllu_path"]
-                ),
-            ]
-            .assign(overwritten=was_overwritten)
-            .sort_values("conllu_path")
-        )
-        slices_with_dups = owdf.slice_name[owdf.overwritten].unique()
-        list_str = "  ~ " + \
-            " and ".join(", ".join(slices_with_dups).rsplit(" ", 1))
+    unfinished = all_slices.loc[all_slices.state != "done", ["state", "worker", "error"]]
+    if not unfinished.empty:
         print(
-            f"ERROR! Multiple records found for {len(slices_with_dups)} "
-            f'slices:\n{list_str}\n{"."*len(list_str)}\n{owdf}'
+            f"WARNING! {len(unfinished)} slices not (yet) done; "
+            f"their texts will show up as missing:\n{unfinished}"
         )
+    # > (paths are saved as strings in the ledger)
+    meta = meta.assign(
+        origin_filepath=meta.origin_filepath.map(Path, na_action="ignore"),
+        final_df_path=meta.final_df_path.map(Path, na_action="ignore"),
+    )
     # apparently some `slice_name` values are not zfilled? so can't sort by slice_name
-    return meta_info_path, meta
+    return ledger_path, meta
 
 
 def _assess_files(meta):
@@ -368,7 +376,7 @@ def _check_meta_info(grp, info, tables_dir, data_dir):
 
     findf_path = data_dir.joinpath(info.final_df_path.iloc[0])
     rawdf_path = Path(findf_path.parent, "raw", findf_path.name)
-    if not rawdf_path.is_file():
+    if not table_exists(rawdf_path):
         print(
             "ERROR! Raw/initial dataframe not found. " f"Invalid path: {rawdf_path}")
         return None
@@ -0,0 +1,84 @@
+# coding=utf-8
+"""
+Export the slice ledger (`puddin/slice-ledger.sqlite`, see `pile_sliceledger`)
+as a table of slices: by default, the completed slices in the layout of the
+former `all-completed-slices_meta-index.csv` (one row per slice, in order of
+completion). The format is chosen by the output file extension: `.csv`,
+`.xlsx` (requires `openpyxl`), or `.pkl(.gz)`.
+
+    examples:
+        python script/export_slice_ledger.py -d /share/compling/data
+        python script/export_slice_ledger.py -d /share/compling/data -s claimed -s parsing -s failed -o stalled-slices.xlsx
+        python script/export_slice_ledger.py -d /share/compling/data --all_states -o info/slice-ledger.csv -o info/slice-ledger.pkl
+"""
+import argparse
+import sys
+from pathlib import Path
+
+from pile_sliceledger import LEGACY_INDEX_FNAME, STATES, SliceLedger
+
+_LEDGER_FNAME = 'slice-ledger.sqlite'
+
+
+def _main():
+    args = _parse_args()
+    ledger_path = args.destination.joinpath('puddin', _LEDGER_FNAME)
+    if not ledger_path.is_file():
+        sys.exit(f'No slice ledger found at {ledger_path}')
+    ledger = SliceLedger(ledger_path)
+
+    counts = ledger.to_frame(states=None)
+    if not counts.empty:
+        print('slices by state:',
+              counts.state.value_counts().reindex(STATES, fill_value=0).to_dict())
+    states = None if args.all_states else (args.states or ['done'])
+    slices = ledger.to_frame(states=states)
+    if slices.empty:
+        sys.exit('No slices to export.')
+
+    outputs = args.output or [args.destination.joinpath('puddin', LEGACY_INDEX_FNAME)]
+    for out_path in outputs:
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        if out_path.suffix == '.xlsx':
+            try:
+                # (timedeltas are not an excel type)
+                slices.assign(parsing_time=slices.parsing_time.astype(str)).to_excel(out_path)
+            except ImportError as e:
+                sys.exit(f'Exporting to `.xlsx` requires `openpyxl`: {e}')
+        elif '.pkl' in out_path.suffixes:
+            slices.to_pickle(out_path)
+        else:
+            slices.to_csv(out_path)
+        print(f'{len(slices)} slices exported to {out_path}')
+
+
+def _parse_args():
+
+    parser = argparse.ArgumentParser(
+        description=('Export the slice ledger (state, timings, and info of every '
+                     'slice) to csv, xlsx, or pickle.'),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        '-d', '--destination', type=Path, default=Path.cwd(),
+        help='destination of `parse_pile.py` output (containing `puddin/`).')
+
+    parser.add_argument(
+        '-s', '--state', dest='states', action='append', choices=STATES, default=[],
+        help='state of slices to export (can be used multiple times). Default: done.')
+
+    parser.add_argument(
+        '-a', '--all_states', action='store_true', default=False,
+        help='export slices in every state.')
+
+    parser.add_argument(
+        '-o', '--output', type=Path, action='append', default=[],
+        help=('path to export to (`.csv`, `.xlsx`, or `.pkl(.gz)`; can be used '
+              f'multiple times). Defaults to `[destination]/puddin/{LEGACY_INDEX_FNAME}`.'))
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    _main()
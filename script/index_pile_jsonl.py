@@ -0,0 +1,110 @@
+# coding=utf-8
+"""
+Build (or check) the sidecar byte offset index for pile `.jsonl(.zst/.gz)` files,
+and use it to pull specific records by raw ordinal without reading the whole file.
+
+The index (`[file].idx`, saved next to the data file) holds one record per line:
+byte offset, length, pile set code, and a 64-bit content hash.
+Raw ordinals are saved in the `raw_ordinal` column of `pile_tables/` dataframes.
+
+    examples:
+        python script/index_pile_jsonl.py /share/compling/data/pile/train/00.jsonl
+        python script/index_pile_jsonl.py data/pile/val.jsonl -r 17 -r 2040
+        python script/index_pile_jsonl.py data/pile/val.jsonl -c Pile-CC -n 100 -o val_pcc-sample.jsonl
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from pile_ingest import (build_jsonl_index, get_index_path, load_jsonl_index,
+                         read_records, subset_ordinals)
+
+
+def _main():
+    args = _parse_args()
+    if (args.records or args.sample_size) and len(args.input_files) > 1:
+        sys.exit('Records can only be pulled from one file at a time.')
+
+    for raw_fpath in args.input_files:
+        if not raw_fpath.is_file():
+            print(f'{raw_fpath} does not exist. Skipping.')
+            continue
+        index, set_names = (None, None) if args.force else load_jsonl_index(raw_fpath)
+        if index is None:
+            print(f'building index for {raw_fpath}...')
+            t0 = time.perf_counter()
+            index_path = build_jsonl_index(raw_fpath)
+            index, set_names = load_jsonl_index(raw_fpath)
+            print(f'  ~ {round(time.perf_counter() - t0, 2)} sec elapsed\n'
+                  f'  = {len(index)} records indexed in {index_path} '
+                  f'({index_path.stat().st_size} bytes)')
+        else:
+            print(f'{raw_fpath} index: {get_index_path(raw_fpath)}'
+                  f' ({len(index)} records)')
+
+        counts = np.bincount(index['set_code'], minlength=len(set_names))
+        for name, count in sorted(zip(set_names, counts), key=lambda x: -x[1]):
+            print(f'  {count:>10}  {name}')
+
+        ordinals = list(args.records)
+        if args.sample_size:
+            candidates = subset_ordinals(index, set_names, args.corpus_selection)
+            rng = np.random.default_rng(args.seed)
+            n = min(args.sample_size, len(candidates))
+            ordinals += sorted(rng.choice(candidates, n, replace=False).tolist())
+
+        if ordinals:
+            records = read_records(raw_fpath, ordinals, index=index)
+            out = args.output.open('w') if args.output else sys.stdout
+            for record in records:
+                out.write(json.dumps(record) + '\n')
+            if args.output:
+                out.close()
+                print(f'{len(records)} records written to {args.output}')
+
+
+def _parse_args():
+
+    parser = argparse.ArgumentParser(
+        description=('Build sidecar byte offset indexes for pile jsonl files '
+                     'and pull records by raw ordinal.'),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        'input_files', type=Path, nargs='+',
+        help='`.jsonl`, `.jsonl.zst`, or `.jsonl.gz` file(s) to index.')
+
+    parser.add_argument(
+        '-f', '--force', action='store_true', default=False,
+        help='rebuild index even if a current one exists.')
+
+    parser.add_argument(
+        '-r', '--record', type=int, action='append', dest='records', default=[],
+        help='raw ordinal of a record to output (can be used multiple times).')
+
+    parser.add_argument(
+        '-n', '--sample_size', type=int, default=0,
+        help='number of records of the selected pile set to sample and output.')
+
+    parser.add_argument(
+        '-c', '--corpus_selection', type=str, default='Pile-CC',
+        help='pile set to sample from.')
+
+    parser.add_argument(
+        '-s', '--seed', type=int, default=0,
+        help='random seed for sampling.')
+
+    parser.add_argument(
+        '-o', '--output', type=Path, default=None,
+        help='path to write output records to (jsonl). Defaults to stdout.')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    _main()
@@ -3,21 +3,38 @@ import argparse
 import json
 import sys
 import time
+from contextlib import nullcontext
 from datetime import datetime, timedelta
 from pathlib import Path
 from pprint import pprint
 
-import jsonlines
+import numpy as np
 import pandas as pd
 import stanza
-from unidecode import unidecode
 
-from pile_regex_imports import (bracket_url, code_regex, defwiki,
-                                end_of_line_abbr, extra_newlines, json_regex,
-                                likely_html, likely_url, linebreak_is_sent,
-                                midword_punc_regex, missing_space_regex,
-                                mixed_letter_digit_regex, punc_only,
-                                solonew_or_dupwhite, underscore_regex, wikipat)
+from pile_regex_imports import (extra_newlines, linebreak_is_sent,
+                                solonew_or_dupwhite)
+from pile_cleancache import CleaningCache, rules_version
+from pile_dedup import (CorpusDedupStore, FingerprintStore,
+                         drop_duplicate_texts, get_dups_path)
+from pile_exclude import (EXCL_KEPT, EXCL_KNOWN, EXCL_PREVIOUS, EXCL_RULE_OFFSET,
+                          EXCLUSION_CLASSIFIER, load_rule_versions,
+                          save_rule_versions)
+from pile_filestate import ChunkProgress, FileLedger, file_fingerprint
+from pile_ingest import (JSONL_SUFFIXES, build_jsonl_index, get_chunk_dir,
+                         get_chunk_path, is_jsonl_path, iter_routed_chunks,
+                         iter_routed_records, iter_subset_records, iter_table,
+                         jsonl_stem, load_jsonl_index, mem_budget_to_chunk_chars,
+                         read_table, table_exists)
+from pile_neardup import (MinHashLSH, get_saved_signature_paths,
+                           get_signatures_chunk_path, get_signatures_path)
+from pile_normalize import (DEFAULT_CHUNK_ROWS, POST_EXCLUSION_PIPELINE,
+                            PRE_EXCLUSION_PIPELINE, UNK_CHAR_STR, apply_pipeline)
+from pile_parsecost import (ParseCostModel, slice_bounds, stream_slices,
+                             text_features)
+from pile_regex_engine import set_regex_engine
+from pile_sliceledger import (DEFAULT_STALE_SECONDS, HEARTBEAT_SECONDS,
+                              LEGACY_INDEX_FNAME, SliceLedger)
 
 # mr249
 # This no longer works with this method name. 
@@ -32,8 +49,45 @@ _SLICE_INFO_FILE_PREFIX = 'slice-info_'
 _DATAFRAMES_DIRNAME = 'pile_tables'
 _EXCLUSIONS_DIRNAME = 'pile_exclusions'
 _SLDF_ROW_LIMIT = 9999
+# target predicted parsing seconds per slice; 0 = slice by text count (`_SLDF_ROW_LIMIT`)
+_SLICE_SECONDS = 0
+_PARSE_COST = ParseCostModel()
+_PARSE_COST_FNAME = 'parse-cost-model.json'
+# texts taken from the final table at a time when slicing (see `slice_df()`)
+_SLICE_PIECE_ROWS = 1000
+# 0 = no limit; if both are 0, jsonl files are preprocessed all at once
+_CHUNK_ROWS = 0
+_CHUNK_CHARS = 0
+# check raw bytes for `pile_set_name` before decoding jsonl records
+_PREFILTER = True
+# processes for decoding/filtering byte ranges of a single jsonl file (1 = serial)
+_READ_WORKERS = 1
+# build sidecar byte offset index for jsonl inputs without one
+_BUILD_INDEX = False
+# corpus-wide (cross data group) fingerprint store; None = no cross-group dedup
+_CORPUS_DEDUP = None
+_CORPUS_DEDUP_FNAME = 'accepted-texts.sqlite'
+# MinHash/LSH near-duplicate detection; None = no near-duplicate exclusion
+_NEAR_DUP = None
+_NEAR_DUP_DIRNAME = 'neardup'
+# content fingerprints of saved files & what they were derived from (staleness checks)
+_FILE_LEDGER = None
+_FILE_LEDGER_FNAME = 'file-fingerprints.sqlite'
+# state & timings of every slice (created, claimed, parsing, done, failed), shared by all jobs
+_SLICE_LEDGER = None
+_SLICE_LEDGER_FNAME = 'slice-ledger.sqlite'
+_CLAIM_STALE_SECONDS = DEFAULT_STALE_SECONDS
+_FORCE_CLAIM = False
+# processes (and texts per task) for the text normalization steps in `clean_df()`
+_CLEAN_WORKERS = 1
+_CLEAN_CHUNK_ROWS = DEFAULT_CHUNK_ROWS
+# cleaning results by input text fingerprint & cleaning rules version; None = no cache
+_CLEAN_CACHE = None
+_CLEAN_CACHE_FNAME = 'cleaned-texts.sqlite'
+
+_CHECKPOINT_ROWS = 0
 pd.set_option('display.max_colwidth', 80)
-_UNK_CHAR_STR = '<__?UNK__>'
+_UNK_CHAR_STR = UNK_CHAR_STR
 _PILE_SET_CODE_DICT = {'Gutenberg (PG-19)': 'Pgn',
                        'Books3': 'Bks',
                        'BookCorpus2': 'Bkc',
@@ -46,12 +100,83 @@ _DESTINATION = None
 
 def _main():
     args = _parse_arg_inputs()
+    unknown_subsets = set(args.corpus_selection) - set(_PILE_SET_CODE_DICT)
+    if unknown_subsets:
+        sys.exit(f'Unknown pile set(s): {", ".join(unknown_subsets)}. Options: '
+                 + ', '.join(_PILE_SET_CODE_DICT))
 
-    global _SLDF_ROW_LIMIT
+    global _SLDF_ROW_LIMIT, _SLICE_SECONDS
     _SLDF_ROW_LIMIT = args.output_size
+    _SLICE_SECONDS = max(0, args.slice_hours) * 3600
+
+    global _CHUNK_ROWS, _CHUNK_CHARS
+    _CHUNK_ROWS = args.chunk_rows
+    _CHUNK_CHARS = mem_budget_to_chunk_chars(args.max_mem)
+
+    global _PREFILTER, _READ_WORKERS, _BUILD_INDEX
+    _PREFILTER = not args.full_decode
+    _READ_WORKERS = max(1, args.read_workers)
+    _BUILD_INDEX = args.build_index
+
+    global _CLEAN_WORKERS, _CLEAN_CHUNK_ROWS, _CHECKPOINT_ROWS
+    _CLEAN_WORKERS = max(1, args.clean_workers)
+    _CLEAN_CHUNK_ROWS = max(1, args.clean_chunk_rows)
+    _CHECKPOINT_ROWS = max(0, args.checkpoint_rows)
+
+    if args.regex_engine != 're':
+        try:
+            unported = set_regex_engine(args.regex_engine)
+        except ImportError as e:
+            sys.exit(str(e))
+        print(f'Regex engine: {args.regex_engine}; patterns still using `re`:',
+              ', '.join(f'{p.pattern[:20]!r}... ({p.port_error})' for p in unported))
 
     confirm_destination_dir(args.destination)
 
+    global _PARSE_COST
+    _PARSE_COST = ParseCostModel.load(
+        args.cost_model or _DESTINATION.joinpath(_PARSE_COST_FNAME))
+    if _SLICE_SECONDS:
+        print(f'Slicing by predicted parsing time ({args.slice_hours:g} hours per slice):',
+              _PARSE_COST)
+
+    global _FILE_LEDGER
+    _FILE_LEDGER = FileLedger(_DESTINATION.joinpath(_FILE_LEDGER_FNAME),
+                              full_hash=args.full_hash)
+
+    global _SLICE_LEDGER, _CLAIM_STALE_SECONDS, _FORCE_CLAIM
+    _CLAIM_STALE_SECONDS = max(0, args.stale_hours) * 3600
+    _FORCE_CLAIM = args.force_claim
+    _SLICE_LEDGER = SliceLedger(_DESTINATION.joinpath(_SLICE_LEDGER_FNAME))
+    legacy_index_path = _DESTINATION.joinpath(LEGACY_INDEX_FNAME)
+    if not len(_SLICE_LEDGER) and legacy_index_path.is_file():
+        print(_SLICE_LEDGER.import_completed(legacy_index_path),
+              'completed slices imported into slice ledger from',
+              get_print_path(legacy_index_path))
+
+    if args.corpus_dedup:
+        global _CORPUS_DEDUP
+        _CORPUS_DEDUP = CorpusDedupStore(
+            _DESTINATION.joinpath('dedup', _CORPUS_DEDUP_FNAME))
+        print('Corpus-wide deduplication store:',
+              get_print_path(_CORPUS_DEDUP.db_path))
+
+    if args.clean_cache:
+        global _CLEAN_CACHE
+        _CLEAN_CACHE = CleaningCache(
+            _DESTINATION.joinpath('clean_cache', _CLEAN_CACHE_FNAME))
+        print('Cleaning cache:', get_print_path(_CLEAN_CACHE.db_path),
+              f'(rules version {_CLEAN_CACHE.version}'
+              + (f'; {_CLEAN_CACHE.purged} results of other versions removed)'
+                 if _CLEAN_CACHE.purged else ')'))
+
+    if args.near_dup:
+        global _NEAR_DUP
+        _NEAR_DUP = MinHashLSH(threshold=args.near_dup,
+                               num_perm=args.minhash_perms)
+        print(f'Near-duplicate threshold: {_NEAR_DUP.threshold} '
+              f'({_NEAR_DUP.bands} bands x {_NEAR_DUP.rows} rows)')
+
     input_files = [inpf for inpf in args.input_files if inpf.exists()]
     if set(args.input_files) - set(input_files):
         print('Warning: Not all inputs could be found:')
@@ -80,6 +205,10 @@ def _main():
                              if p.is_file() and '.pkl' in p.suffixes
                              and _EXCLUSIONS_DIRNAME not in p.parts]
 
+        # chunks of tables saved in chunked mode are not processed individually
+        init_df_paths = [p for p in init_df_paths
+                         if not p.parent.name.endswith('.chunks')]
+
     data_selection = init_js_paths + init_df_paths
 
     # remove any incomplete corresponding pkls
@@ -88,7 +217,7 @@ def _main():
         if stem.endswith('pkl'):
             validate_pkl(datapath)
         else:
-            seek = f'_{stem}-'
+            seek = f'_{jsonl_stem(datapath)}-'
             if not list(_DESTINATION.glob(f'*/{seek}*.conllu')):
                 for path in _DESTINATION.joinpath('pile_tables').rglob(f'{seek}'):
                     validate_pkl(path)
@@ -98,12 +227,32 @@ def _main():
         sys.exit('No data selected. Exiting.')
     print('Initial data selection:')
     pprint([get_print_path(path) for path in data_selection])
-    js_paths = init_js_paths
+    js_paths = [(p, subset) for p in init_js_paths
+                for subset in args.corpus_selection]
     df_paths = init_df_paths
-    if data_selection and not args.Reprocess:
+    admitted_dfs = []
+    if args.recheck_exclusions:
+        # only the exclusions of already processed data are rechecked
+        finaldf_paths = []
+        for datapath in data_selection:
+            if is_jsonl_path(datapath):
+                finaldf_paths.extend(get_dfpkl_outpath(jsonl_stem(datapath), subset)
+                                     for subset in args.corpus_selection)
+            elif 'slices' not in datapath.parts:
+                finaldf_paths.append(get_dfpkl_outpath(datapath.stem))
+        for finaldf_path in dict.fromkeys(finaldf_paths):
+            if table_exists(finaldf_path):
+                admitted_df = recheck_exclusions(finaldf_path)
+                if not admitted_df.empty:
+                    admitted_dfs.append(admitted_df)
+        if not admitted_dfs:
+            sys.exit('\nNo excluded texts admitted. Exiting.')
+        js_paths, df_paths = [], []
+
+    elif data_selection and not args.Reprocess:
         js_paths, df_paths = check_processing_status(args, data_selection)
 
-    if not js_paths + df_paths or not data_selection:
+    if not js_paths + df_paths + admitted_dfs or not data_selection:
         sys.exit('No valid files in need of processing. Exiting.')
 
     # initiate language model for dependency parsing (load just once)
@@ -126,10 +275,15 @@ def _main():
             processors='tokenize,pos,lemma,depparse')
 
     if js_paths:
-        subcorpus_str = args.corpus_selection
-        print('\nsubcorpora selection:', subcorpus_str)
+        print('\nsubcorpora selection:', ', '.join(args.corpus_selection))
 
     step_count = 1
+    if admitted_dfs:
+        print(f'\n\n*** ({step_count}) Texts Admitted by Exclusion Recheck ***')
+        step_count += 1
+        for df in admitted_dfs:
+            slice_df(df, append=True)
+
     if df_paths:
         print('Dataframes to be processed:')
         pprint([str(path) for path in df_paths])
@@ -140,10 +294,8 @@ def _main():
 
             print(f'\n\n*** ({step_count}) Unsliced Dataframe(s) ***')
             step_count += 1
-            full_dfs_gen = process_pickledf(fulldf_files, data_selection)
-            for df in full_dfs_gen:
-                df = pop_unwanted_cols(df)
-                slice_df(df)
+            for finaldf_fpath in process_pickledf(fulldf_files, data_selection):
+                slice_df(finaldf_fpath)
 
         # TODO : move this up to parse before the full dataframes
         if slice_paths:
@@ -158,7 +310,7 @@ def _main():
             slices_metadf_search = slice_path.parent.rglob(
                 get_metadf_fname(slice_path.stem
                                  .split('_')[1]  # get second _ delimited chunk
-                                 .rsplit('-', n=1)[0])  # pop off the slice number
+                                 .rsplit('-', 1)[0])  # pop off the slice number
                                  # Above mr249 edit for Pandas >= 1.5
                                  # see https://stackoverflow.com/questions/76812405/typeerror-stringmethods-rsplit-takes-from-1-to-2-positional-arguments-but-3-w
             )
@@ -184,14 +336,16 @@ def _main():
     if js_paths:
         print(
             f'\n\n*** ({step_count}) The Pile\'s Original Data Files (.jsonl) ***')
-        if len(js_paths) > 1:
-            pprint(js_paths)
-        else:
-            print(js_paths[0])
+        # pile sets still to be processed for each file: all are read in one pass
+        js_subsets = {}
+        for js_path, subset in js_paths:
+            js_subsets.setdefault(js_path, []).append(subset)
+        pprint({str(js_path): subsets for js_path, subsets in js_subsets.items()})
 
-        for df in process_raw_jsonlines(js_paths, subcorpus_str):
-            df = pop_unwanted_cols(df)
-            slice_df(df)
+        for js_path, subsets in js_subsets.items():
+            subsets = sorted(set(subsets), key=args.corpus_selection.index)
+            for finaldf_fpath in process_raw_jsonlines([js_path], subsets):
+                slice_df(finaldf_fpath)
 
 
 def confirm_destination_dir(dest_dir):
@@ -235,18 +389,30 @@ def get_jsonl_paths(args):
     jsonl_list = None
 
     if inputs:
-        jsonl_list = [i for i in inputs if i.suffix == '.jsonl']
+        jsonl_list = [i for i in inputs if is_jsonl_path(i)]
 
     else:
         print('seeking jsonl files:', glob_expr)
         jsonl_list = [p for p in Path('/').glob(glob_expr)
-                      if p.is_file() and p.suffix == '.jsonl']
+                      if p.is_file() and is_jsonl_path(p)]
 
-        if not jsonl_list and glob_expr.endswith('jsonl'):
+        if not jsonl_list and glob_expr.endswith(('jsonl', 'jsonl*', 'zst', 'gz')):
             sys.exit('Error: No input files or valid search '
                      '(glob) expression specified. See --help for more info.')
 
-    return jsonl_list
+    # if the same data is selected both compressed and uncompressed,
+    #   keep only one (uncompressed first: it can be read in parallel byte ranges)
+    jsonl_list.sort(key=lambda p: JSONL_SUFFIXES.index(
+        p.name[len(jsonl_stem(p)):]))
+    unique_jsonl = {}
+    for path in jsonl_list:
+        data_key = (path.parent, jsonl_stem(path))
+        if data_key in unique_jsonl:
+            print(f'  {path} ignored: same data as {unique_jsonl[data_key]}')
+        else:
+            unique_jsonl[data_key] = path
+
+    return list(unique_jsonl.values())
 
 
 def validate_pkl(path):
@@ -258,27 +424,36 @@ def validate_pkl(path):
 
 
 def check_processing_status(args, data_selection):
+    """Returns:
+        tuple: (list of `(jsonl path, pile set name)` pairs still to be read,
+                list of dataframe paths at their most advanced stage)
+    """
     js_paths = []
     df_paths = []
     print('seeking existing progress on selected files...'
           '\n---------------')
-    for datapath in data_selection:
+    # each jsonl file is checked separately for every selected pile set
+    selection = [(datapath, subset) for datapath in data_selection
+                 for subset in (args.corpus_selection if is_jsonl_path(datapath)
+                                else [None])]
+    for datapath, js_subset in selection:
         if any(part.startswith('.') for part in datapath.parts):
             print(f'\n > Ignoring path in hidden dir, {datapath}')
             continue
         fname = datapath.name
-        print('\n', datapath)
+        print('\n', datapath, f'[{js_subset}]' if js_subset else '')
         if not datapath.is_file():
             print(' x - does not exist! Skipping.')
             continue
 
         datadir = datapath.parent
-        path_mod_time = datapath.stat().st_mtime
         data_file_stem = datapath.stem
         is_df = '.pkl' in datapath.suffixes
-        is_js = datapath.suffix == '.jsonl'
+        is_js = is_jsonl_path(datapath)
+        if is_js:
+            data_file_stem = jsonl_stem(datapath)
         is_slice = 'slices' in datapath.parts
-        pile_set_name = (args.corpus_selection if is_js
+        pile_set_name = (js_subset if is_js
                          else data_file_stem.split('_')[2])
         data_group = (data_file_stem if is_js
                       else data_file_stem.split('_')[1])
@@ -288,7 +463,7 @@ def check_processing_status(args, data_selection):
                               if datadir.name == 'tmp' else datapath)
             # TODO : add warning or input request here if slice's info csv cannot be located
             if (finished_slice.exists()
-                    and finished_slice.stat().st_mtime >= path_mod_time):
+                    and is_up_to_date(finished_slice, datapath)):
 
                 has_conllu = confirm_conllu(finished_slice)
                 if not has_conllu:
@@ -312,7 +487,6 @@ def check_processing_status(args, data_selection):
         else:
             finalfull_dfpath = get_dfpkl_outpath(data_group,
                                                  pile_set_name)
-        toplevel_dfdir = finalfull_dfpath.parent
         fulldf_filename = finalfull_dfpath.name
         if fulldf_filename in (f.name for f in df_paths):
             print(' x - Data already included '
@@ -325,8 +499,11 @@ def check_processing_status(args, data_selection):
         # *  (i.e. if they have been moved from where they were originally created)
         if not args.reSlice:
             # TODO : save slice info to "finished" slice dir, above `tmp/`
-            slices_info_glob = toplevel_dfdir.glob(
-                'slices/**/' + get_metadf_fname(data_group))
+            # (only in the pile set's own slices dir, e.g. `slices/Pcc00/`:
+            #   data groups have the same names across pile sets)
+            slices_info_glob = get_dfpkl_outpath(
+                finalfull_dfpath.stem, slice_id='_').parent.glob(
+                    '**/' + get_metadf_fname(data_group))
             try:
                 newest_sliceinfo_path = most_recent(slices_info_glob)
             except ValueError:
@@ -389,16 +566,17 @@ def check_processing_status(args, data_selection):
             f'{_DATAFRAMES_DIRNAME}/**/{fulldf_filename}'))
 
         if not matching_fulldfs and is_js:
-            js_paths.append(datapath)
+            js_paths.append((datapath, pile_set_name))
             print(' -> No prior processing found.')
             continue
 
+        n_found = len(df_paths)
         final_df_list = [p for p in matching_fulldfs
                          if not {'tmp', 'raw'}.intersection(set(p.parts))]
 
         if final_df_list:
             final_df_path = most_recent(final_df_list)
-            if final_df_path.stat().st_mtime >= path_mod_time:
+            if is_up_to_date(final_df_path, datapath):
                 df_paths.append(final_df_path)
                 if final_df_path != datapath:
                     print(' -> final full df:\n  +',
@@ -411,7 +589,7 @@ def check_processing_status(args, data_selection):
             if tmp_df_list:
 
                 tmp_df_path = most_recent(tmp_df_list)
-                if tmp_df_path.stat().st_mtime >= path_mod_time:
+                if is_up_to_date(tmp_df_path, datapath):
                     df_paths.append(tmp_df_path)
                     if tmp_df_path != datapath:
                         print(' -> partially processed df:\n  +',
@@ -431,7 +609,7 @@ def check_processing_status(args, data_selection):
                     pprint([get_print_path(m) for m in matching_fulldfs])
 
                 else:
-                    if raw_df_path.stat().st_mtime >= path_mod_time:
+                    if is_up_to_date(raw_df_path, datapath):
                         df_paths.append(raw_df_path)
                         if raw_df_path != datapath:
                             print(' -> raw df:\n  +',
@@ -439,6 +617,11 @@ def check_processing_status(args, data_selection):
                         else:
                             print(' -> No prior processing found.')
 
+        # dataframes exist, but were not made from the current jsonl content
+        if is_js and len(df_paths) == n_found:
+            js_paths.append((datapath, pile_set_name))
+            print(' -> Previous processing is out of date. Reprocessing.')
+
     # remove duplicates
     if df_paths and any(pd.Series(df_paths).value_counts() > 1):
         print(pd.Series(df_paths).value_counts())
@@ -468,14 +651,14 @@ def get_metadf_fname(data_group):
 def confirm_conllu(final_slice: Path):
     pile_set_name = final_slice.stem.split('_')[2]
     data_group = final_slice.stem.split('_')[1]
-    data_group, slice_num = data_group.rsplit('-', n=1) #mr249
-    path_mod_time = final_slice.stat().st_mtime
+    data_group, slice_num = data_group.rsplit('-', 1) #mr249
     has_conllu = False
     conllu_path = get_conllu_outpath(data_group, slice_num,
                                      pile_set_name)
     #! final slice files are saved *after* conllu is finished
+    #   (and recorded as derived from it)
     if (conllu_path.is_file()
-            and conllu_path.stat().st_mtime < path_mod_time):
+            and is_up_to_date(final_slice, conllu_path, strict=True)):
 
         print(' ! already has corresponding conllu file',
               get_print_path(conllu_path),
@@ -484,6 +667,32 @@ def confirm_conllu(final_slice: Path):
     return has_conllu
 
 
+def is_up_to_date(output_path: Path, source_path: Path, strict: bool = False):
+    """whether `output_path` was derived from the current content of `source_path`,
+    according to the recorded file fingerprints (see `pile_filestate.FileLedger`).
+    For files saved without a record, falls back on comparing modification times
+    (output newer than source; or at least as new, unless `strict`)."""
+    current = (None if _FILE_LEDGER is None
+               else _FILE_LEDGER.is_current(output_path, source_path))
+    if current is None:
+        output_mtime = output_path.stat().st_mtime
+        source_mtime = source_path.stat().st_mtime
+        current = (output_mtime > source_mtime if strict
+                   else output_mtime >= source_mtime)
+    return current
+
+
+def record_derived(output_path: Path, *source_paths):
+    """records the content fingerprint of a just saved file and those of its sources"""
+    if _FILE_LEDGER is not None:
+        _FILE_LEDGER.record(output_path, *(Path(p) for p in source_paths if p))
+
+
+def _data_origin(df: pd.DataFrame):
+    return (Path(df.data_origin_fpath.iat[0])
+            if 'data_origin_fpath' in df.columns and not df.empty else None)
+
+
 def most_recent(Path_iter):
     """returns the most recently modified path from an iterable of PosixPaths
 
@@ -525,28 +734,69 @@ def get_conllu_outpath(source_fname: str, slice_numstr: str, subset_label: str):
 
 
 ### raw processing functions ###
-def process_raw_jsonlines(rfiles, subcorpus_name: str):
+def process_raw_jsonlines(rfiles, subcorpora):
+    """preprocesses the texts of the selected pile set(s) in each raw jsonl file
+    and yields the path of the final table of each file and pile set.
+    Each file is read (and decoded) only once for all of `subcorpora`."""
+    if isinstance(subcorpora, str):
+        subcorpora = [subcorpora]
     for rawfile_path in rfiles:
         print(f'\n---\n\nPreprocessing {rawfile_path}...')
 
-        df = preprocess_pile_texts(rawfile_path, subcorpus_name)
+        if _BUILD_INDEX and load_jsonl_index(rawfile_path)[0] is None:
+            print('  building sidecar index...')
+            try:
+                index_path = build_jsonl_index(rawfile_path)
+            except OSError:
+                print('  WARNING: could not write index next to', rawfile_path)
+            else:
+                print('  index saved to', index_path)
+
+        if _CHUNK_ROWS or _CHUNK_CHARS:
+            finaldf_fpaths = preprocess_pile_texts_chunked(rawfile_path, subcorpora)
+        elif len(subcorpora) == 1:
+            finaldf_fpaths = [preprocess_pile_texts(rawfile_path, subcorpora[0])]
+        else:
+            finaldf_fpaths = preprocess_routed_pile_texts(rawfile_path, subcorpora)
+
+        for finaldf_fpath in finaldf_fpaths:
+            if finaldf_fpath is not None:
+                yield finaldf_fpath
+
+
+def preprocess_routed_pile_texts(raw_fpath: Path, selected_subsets):
+    """reads the texts of all `selected_subsets` from a raw jsonl file in a single
+    pass, then preprocesses each subset's texts (see `preprocess_pile_texts()`)"""
+    print(f'  reading texts for {len(selected_subsets)} subsets:',
+          ', '.join(selected_subsets))
+    read_t0 = datetime.now().timestamp()
+    routed = {subset: [] for subset in selected_subsets}
+    for raw_ordinal, pile_set_name, text in iter_routed_records(
+            raw_fpath, selected_subsets, prefilter=_PREFILTER, workers=_READ_WORKERS):
+        routed[pile_set_name].append((raw_ordinal, text))
+    print('  ~ total time reading jsonl:',
+          timedelta(seconds=round(datetime.now().timestamp() - read_t0)))
+    for subset in selected_subsets:
+        print(f'  = {len(routed[subset])} {subset} texts')
+
+    for subset in selected_subsets:
+        print(f'\n-- {subset} --')
+        yield preprocess_pile_texts(raw_fpath, subset, records=routed.pop(subset))
 
-        yield df
 
+def preprocess_pile_texts(raw_fpath: Path, selected_subset: str, records=None):
+    """`records`: `(raw_ordinal, text)` records of `selected_subset` already read
+    from `raw_fpath` (see `preprocess_routed_pile_texts()`). If not given,
+    they are read here.
 
-def preprocess_pile_texts(raw_fpath: Path, selected_subset: str):
+    Returns:
+        Path: path of the final table (None if there are no texts)
+    """
 
     # pile_data_path = Path('test.jsonl')
-    data_source_label = raw_fpath.stem
-    # path to save final version of df
-    finaldf_fpath = get_dfpkl_outpath(data_source_label, selected_subset)
-    # get temporary version of path for unfinished df files
-    tmpdf_fpath = get_dfpkl_outpath(finaldf_fpath.stem, is_tmp=True)
-    # raw path set for just this method: dataframes at any stage of pre-processing
-    rawdf_dir = tmpdf_fpath.parent.parent.joinpath('raw')
-    if not rawdf_dir.is_dir():
-        rawdf_dir.mkdir()
-    rawdf_fpath = rawdf_dir.joinpath(tmpdf_fpath.name)
+    data_source_label = jsonl_stem(raw_fpath)
+    rawdf_fpath, tmpdf_fpath, finaldf_fpath, __ = get_table_paths(
+        data_source_label, selected_subset)
 
     # define namedtuple to simplify dataframe creation from json object
     # //text_info = namedtuple(
@@ -563,29 +813,66 @@ def preprocess_pile_texts(raw_fpath: Path, selected_subset: str):
     # Use pandas to create a flattened dataframe from the generator.
     print('  creating `jsonlines` generator for corpus selection...')
     read_t0 = datetime.now().timestamp()
-    with raw_fpath.open(encoding='utf-8-sig', mode='r') as jlf:
-        jlreader = jsonlines.Reader(jlf)
-        jlines = jlreader.iter()
-        texts = (d['text'] for d in jlines
-                 if d['meta']['pile_set_name'] == selected_subset)
-        read_t1 = datetime.now().timestamp()
-        print(
-            f'  ~ {round(read_t1 - read_t0, 3)}  sec elapsed')
-        print('  building dataframe from `jsonlines` generator object...')
-        #! This has to be done before the file is closed:
-        #   Since we're using a generator to speed things up, the data is not fully
-        #   loaded into the workspace until it's put into the dataframe.
-        toDf_t0 = datetime.now().timestamp()
-        df = pd.DataFrame(texts, columns=['raw'], dtype='string')
-
-        toDF_t1 = datetime.now().timestamp()
-        print(
-            f'  ~ {round(toDF_t1 - toDf_t0, 3)}  sec elapsed')
+    # (raw_ordinal, text) for each text: ordinal is the record's position in the
+    #   jsonl file (and its sidecar index, see `pile_ingest.build_jsonl_index()`)
+    if records is None:
+        records = iter_subset_records(raw_fpath, selected_subset,
+                                      prefilter=_PREFILTER, workers=_READ_WORKERS)
+    read_t1 = datetime.now().timestamp()
+    print(
+        f'  ~ {round(read_t1 - read_t0, 3)}  sec elapsed')
+    print('  building dataframe from `jsonlines` generator object...')
+    #! The file is only read as the generator is consumed:
+    #   Since we're using a generator to speed things up, the data is not fully
+    #   loaded into the workspace until it's put into the dataframe.
+    toDf_t0 = datetime.now().timestamp()
+    df = _records_to_df(records)
+    del records
+
+    toDF_t1 = datetime.now().timestamp()
+    print(
+        f'  ~ {round(toDF_t1 - toDf_t0, 3)}  sec elapsed')
     print('  ~ total time converting jsonl to dataframe:',
           timedelta(seconds=round(toDF_t1 - read_t0)))
+    if df.empty:
+        print('No texts found for', selected_subset)
+        return None
 
     # Clean it up a bit, and remove duplicate text items
-    df = df.drop_duplicates(subset='raw').reset_index(drop=True)
+    df, dups_df = drop_duplicate_texts(df)
+    df = df.reset_index(drop=True)
+    save_duplicates(dups_df, get_dfpkl_outpath(finaldf_fpath.stem, is_excl=True))
+
+    #! Since the script cannot currently distinguish between
+    # a partial and complete `raw` dataframe, no intermediate
+    # saves should be used since they would only introduce errors
+    # //# save tmp df
+    # // df.to_pickle(rawdfpath)
+
+    df = format_raw_df(df, selected_subset, data_source_label,
+                       raw_fpath, finaldf_fpath)
+    print('time to make raw dataframe from jsonl =', timedelta(
+        seconds=round(datetime.now().timestamp() - read_t0)), '\nsaving...')
+
+    df.to_pickle(rawdf_fpath)
+    record_derived(rawdf_fpath, raw_fpath)
+    print(f'raw dataframe saved to {get_print_path(rawdf_fpath)}')
+
+    # // print('\ndataframe info:')
+    # // print(df.info())
+    # // print('...')
+    return clean_df_checkpointed(df, tmpdf_fpath, raw_fpath)
+
+
+def format_raw_df(df: pd.DataFrame,
+                  selected_subset: str,
+                  data_source_label: str,
+                  raw_fpath: Path,
+                  finaldf_fpath: Path,
+                  zfill_len: int = None):
+    """adds subset, text id, and path columns to a deduplicated dataframe of `raw` texts.
+    The dataframe index gives the text id numbers (+1), so for chunks of a larger
+    data group, the index must already be offset and `zfill_len` must be given."""
     df = (df.assign(pile_set_name=selected_subset,
                     pile_set_code=_PILE_SET_CODE_DICT[selected_subset])
           .astype(dtype={'pile_set_name': 'category',
@@ -598,18 +885,10 @@ def preprocess_pile_texts(raw_fpath: Path, selected_subset: str):
     # //codes = (global_subset_abbr_dict[n] for n in df.pile_set_name)
     # //df = df.assign(pile_set_code=pd.Categorical(codes))
 
-    #! Since the script cannot currently distinguish between
-    # a partial and complete `raw` dataframe, no intermediate
-    # saves should be used since they would only introduce errors
-    # //# save tmp df
-    # // df.to_pickle(rawdfpath)
-
     print('  adding subset codes & text IDs...')
-    codedf = create_ids(df, data_source_label=data_source_label)
-    # // df = codedf[['text_id', 'raw', 'pile_set_name', 'pile_set_code']]
-    # // df = codedf
+    codedf = create_ids(df, data_source_label=data_source_label,
+                        zfill_len=zfill_len)
     first_cols = ['text_id', 'raw']
-    # //cols = [first_cols + codedf.columns.loc[~codedfcolumns.isin(first_cols)]]]
     following_cols = list(set(codedf.columns) - set(first_cols))
     df = codedf[first_cols + following_cols]
     df = (df.assign(data_origin_fpath=raw_fpath,
@@ -617,26 +896,195 @@ def preprocess_pile_texts(raw_fpath: Path, selected_subset: str):
           .astype(dtype={'text_id': 'string',
                          'data_origin_fpath': 'category',
                          'dataframe_fpath': 'category'}))
-    # //df = df.assign(data_origin_fpath=raw_file_path,
-    # //               dataframe_fpath=df_output_path)
+    return df
 
-    # df = df.assign(data_origin_fpath=df.data_origin_fpath.astype('category'))
-    print('time to make raw dataframe from jsonl =', timedelta(
-        seconds=round(datetime.now().timestamp() - read_t0)), '\nsaving...')
 
-    df.to_pickle(rawdf_fpath)
-    print(f'raw dataframe saved to {get_print_path(rawdf_fpath)}')
+def get_table_paths(data_source_label: str, selected_subset: str):
+    """paths of the raw, tmp, final, and exclusions tables of a data group & pile set"""
+    # path to save final version of df
+    finaldf_fpath = get_dfpkl_outpath(data_source_label, selected_subset)
+    # get temporary version of path for unfinished df files
+    tmpdf_fpath = get_dfpkl_outpath(finaldf_fpath.stem, is_tmp=True)
+    # raw path: dataframes before any cleaning
+    rawdf_dir = tmpdf_fpath.parent.parent.joinpath('raw')
+    if not rawdf_dir.is_dir():
+        rawdf_dir.mkdir()
+    rawdf_fpath = rawdf_dir.joinpath(tmpdf_fpath.name)
+    excl_fpath = get_dfpkl_outpath(finaldf_fpath.stem, is_excl=True)
+    return rawdf_fpath, tmpdf_fpath, finaldf_fpath, excl_fpath
+
+
+def preprocess_pile_texts_chunked(raw_fpath: Path, selected_subsets):
+    """bounded memory version of `preprocess_pile_texts()`:
+    texts are read, deduplicated, and cleaned in chunks of at most
+    `_CHUNK_ROWS` texts/`_CHUNK_CHARS` characters. All tables, including the
+    final and exclusions tables, are saved one chunk at a time (in `*.chunks/`
+    dirs next to where the full tables would be saved) and are never assembled
+    in full. Text ids match those of a whole-file run.
+    The file is read once for all `selected_subsets` (one chunk buffer each);
+    yields the path of the final table of each subset (None if it has no texts).
+    """
+    if isinstance(selected_subsets, str):
+        selected_subsets = [selected_subsets]
+    data_source_label = jsonl_stem(raw_fpath)
+    subset_paths = {subset: get_table_paths(data_source_label, subset)
+                    for subset in selected_subsets}
+    # chunks completed by an interrupted run of the same file & settings
+    #   (recorded with the final dataframe chunks)
+    source_key = {'source': file_fingerprint(raw_fpath), 'chunk_rows': _CHUNK_ROWS,
+                  'chunk_chars': _CHUNK_CHARS, 'rules': rules_version(),
+                  'near_dup': _near_dup_params()}
+    progress = {subset: ChunkProgress(get_chunk_dir(paths[2]),
+                                      dict(source_key, subset=subset))
+                for subset, paths in subset_paths.items()}
+    if all('chunk_texts' in p.info for p in progress.values()):
+        print('  resuming: texts already read into chunks;',
+              ', '.join(f'{len(p.done)} of {len(p.info["chunk_texts"])} {subset} chunks'
+                        for subset, p in progress.items()),
+              'already cleaned')
+        for subset in selected_subsets:
+            yield _clean_text_chunks(raw_fpath, subset, subset_paths[subset],
+                                     progress[subset])
+        return
 
-    df = clean_df(df, tmpdf_fpath)
+    for paths in subset_paths.values():
+        _clear_chunks(paths, paths[2])
+    for subset_progress in progress.values():
+        subset_progress.restart()
 
-    # // print('\ndataframe info:')
-    # // print(df.info())
-    # // print('...')
-    print('\nsaving final dataframe...')
-    df.to_pickle(finaldf_fpath)
-    print('Finished preprocessing and saved to', finaldf_fpath)
+    # * pass 1: stream the jsonl file & save deduplicated raw text chunks
+    #   (total text count is needed for the text id zfill before ids can be assigned)
+    print(f'  reading texts in chunks of <= {_CHUNK_ROWS or "any number of"} texts'
+          + (f' / {_CHUNK_CHARS} characters' if _CHUNK_CHARS else ''))
+    read_t0 = datetime.now().timestamp()
+    seen = {subset: FingerprintStore() for subset in selected_subsets}
+    dups_dfs = {subset: [] for subset in selected_subsets}
+    chunk_texts = {subset: [] for subset in selected_subsets}
+    for subset, records in iter_routed_chunks(
+            iter_routed_records(raw_fpath, selected_subsets,
+                                prefilter=_PREFILTER, workers=_READ_WORKERS),
+            _CHUNK_ROWS, _CHUNK_CHARS):
+        df, dups_df = drop_duplicate_texts(_records_to_df(records), seen[subset])
+        dups_dfs[subset].append(dups_df)
+        if df.empty:
+            continue
+        chunk_texts[subset].append(len(df))
+        rawdf_fpath = subset_paths[subset][0]
+        df.reset_index(drop=True).to_pickle(
+            get_chunk_path(rawdf_fpath, len(chunk_texts[subset])))
+        print(f'  + {subset} chunk {len(chunk_texts[subset])}: '
+              f'{len(df)} of {len(records)} texts unique')
+    print('  ~ total time reading jsonl in chunks:',
+          timedelta(seconds=round(datetime.now().timestamp() - read_t0)))
+    for subset in selected_subsets:
+        print(f'  {len(seen[subset])} {subset} text fingerprints: '
+              f'{round(seen[subset].nbytes / 1024**2, 1)} MB')
+        save_duplicates(pd.concat(dups_dfs[subset], ignore_index=True)
+                        if dups_dfs[subset] else pd.DataFrame(),
+                        subset_paths[subset][3])
+        print(f'  = {sum(chunk_texts[subset])} unique {subset} texts '
+              f'in {len(chunk_texts[subset])} chunks')
+        # (from here on, a requeued job does not need to read the file again)
+        progress[subset].set_info(chunk_texts=chunk_texts[subset])
+    del seen, dups_dfs
+
+    for subset in selected_subsets:
+        yield _clean_text_chunks(raw_fpath, subset, subset_paths[subset],
+                                 progress[subset])
+
+
+def _clean_text_chunks(raw_fpath: Path, selected_subset: str, table_paths,
+                       progress: ChunkProgress):
+    """pass 2 of `preprocess_pile_texts_chunked()` for one subset:
+    adds ids to and cleans each saved raw chunk not yet recorded as done in
+    `progress` (see `_clean_chunk()`). The final and exclusions tables stay in
+    their chunk files.
 
-    return df
+    Returns:
+        Path: path of the final table (None if there are no texts)
+    """
+    rawdf_fpath, tmpdf_fpath, finaldf_fpath, excl_fpath = table_paths
+    data_source_label = jsonl_stem(raw_fpath)
+    chunk_texts = progress.info['chunk_texts']
+    if not chunk_texts:
+        print('No texts found for', selected_subset)
+        return None
+    # text ids are zfilled to the length of the max index (as in `create_ids()`)
+    zfill_len = len(str(sum(chunk_texts) - 1))
+    offset = 0
+    for chunk_num, n_texts in enumerate(chunk_texts, start=1):
+        offset += n_texts
+        if chunk_num in progress.done:
+            continue
+        print(f'\n--- {selected_subset} chunk {chunk_num} of {len(chunk_texts)} ---')
+        raw_chunk_path = get_chunk_path(rawdf_fpath, chunk_num)
+        df = pd.read_pickle(raw_chunk_path)
+        # (already formatted if an interrupted run got that far)
+        if 'text_id' not in df.columns:
+            df.index = pd.RangeIndex(offset - n_texts, offset)
+            df = format_raw_df(df, selected_subset, data_source_label,
+                               raw_fpath, finaldf_fpath, zfill_len=zfill_len)
+            df.to_pickle(raw_chunk_path)
+        _clean_chunk(df, chunk_num, tmpdf_fpath, progress, raw_fpath)
+
+    save_rule_versions(excl_fpath, EXCLUSION_CLASSIFIER.versions)
+    print('Finished preprocessing; final table saved in chunks to',
+          get_print_path(get_chunk_dir(finaldf_fpath)))
+    return finaldf_fpath
+
+
+def _clean_chunk(df: pd.DataFrame, chunk_num: int, tmp_save_path: Path,
+                 progress: ChunkProgress, *source_paths):
+    """cleans one chunk of a data group, excludes its near-duplicates (also of the
+    texts kept from earlier chunks), saves its tmp, exclusions, and final tables as
+    chunk files, and records it as done in `progress`"""
+    finaldf_fpath = get_dfpkl_outpath(tmp_save_path.stem)
+    excl_fpath = get_dfpkl_outpath(tmp_save_path.stem, is_excl=True)
+    df = clean_df(df, get_chunk_path(tmp_save_path, chunk_num),
+                  excl_save_path=get_chunk_path(excl_fpath, chunk_num))
+    df = exclude_near_duplicates(df, finaldf_fpath, chunk_num=chunk_num)
+    final_chunk_path = get_chunk_path(finaldf_fpath, chunk_num)
+    df.to_pickle(final_chunk_path)
+    record_derived(final_chunk_path, *source_paths)
+    progress.mark_done(chunk_num)
+
+
+def _clear_chunks(table_paths, finaldf_fpath: Path):
+    """removes the chunk files of a data group's tables (and the near-duplicate
+    signatures saved with them) before it is cleaned in chunks from the start,
+    along with any final & exclusions tables saved whole by a previous run"""
+    for table_path in table_paths:
+        chunk_dir = get_chunk_dir(table_path)
+        if chunk_dir.is_dir():
+            print('  clearing previous chunks from', get_print_path(chunk_dir))
+            for chunk_path in chunk_dir.glob('chunk-*'):
+                chunk_path.unlink()
+        else:
+            chunk_dir.mkdir(parents=True)
+    excl_fpath = get_dfpkl_outpath(finaldf_fpath.stem, is_excl=True)
+    sig_path = get_signatures_path(_DESTINATION.joinpath(_NEAR_DUP_DIRNAME),
+                                   finaldf_fpath)
+    for path in [finaldf_fpath, excl_fpath, sig_path,
+                 *sig_path.with_suffix('.chunks').glob('chunk-*')]:
+        if path.is_file():
+            path.unlink()
+
+
+def _records_to_df(records):
+    df = pd.DataFrame(records, columns=['raw_ordinal', 'raw'])
+    return df.assign(raw=df.raw.astype('string'),
+                     raw_ordinal=df.raw_ordinal.astype('uint32'))
+
+
+def save_duplicates(dups_df: pd.DataFrame, excl_path: Path):
+    """saves the record of dropped duplicate texts (raw ordinal of each duplicate and
+    of the text it collapsed into) next to the data group's exclusions"""
+    dups_path = get_dups_path(excl_path)
+    if not dups_path.parent.is_dir():
+        dups_path.parent.mkdir(parents=True)
+    dups_df.to_pickle(dups_path)
+    print(f'  {len(dups_df)} duplicate texts dropped; record saved to '
+          f'{get_print_path(dups_path)}')
 
 
 def get_dfpkl_outpath(stem: str,
@@ -742,8 +1190,11 @@ def get_dfpkl_outpath(stem: str,
         f'{stem}_{subcorpus_label}_{data_type}.pkl.gz')
 
 
-def create_ids(df: pd.DataFrame, data_source_label: str = None, zfilled_slice_num: str = None):
-    '''Create text ids from raw file name, pile subset code, and dataframe index.'''
+def create_ids(df: pd.DataFrame, data_source_label: str = None, zfilled_slice_num: str = None,
+               zfill_len: int = None):
+    '''Create text ids from raw file name, pile subset code, and dataframe index.
+    `zfill_len` overrides the id number width derived from the index
+    (needed when `df` is only one chunk of a data group).'''
     print('updating `text_id` column...')
     # //codedf = pd.DataFrame()
     # codes_t0 = time.perf_counter()
@@ -766,7 +1217,8 @@ def create_ids(df: pd.DataFrame, data_source_label: str = None, zfilled_slice_nu
 
     # start at 1 instead of 0
     idnums = df.index + 1
-    zfill_len = len(str(df.index.max()))
+    if not zfill_len:
+        zfill_len = len(str(df.index.max()))
     idnums = idnums.astype('string').str.zfill(zfill_len)
 
     # e.g. pcc_val_00001; pcc_eng_00_01.0001
@@ -861,6 +1313,7 @@ def process_pickledf(dfiles, init_data_paths):
         if changed:
             print('added data path info columns saving...')
             df.to_pickle(dfpath)
+            record_derived(dfpath, _data_origin(df))
             df.loc[:, ['dataframe_fpath', 'data_origin_fpath']] = (
                 df.loc[:, ['dataframe_fpath', 'data_origin_fpath']]
                 .astype('category'))
@@ -872,18 +1325,18 @@ def process_pickledf(dfiles, init_data_paths):
             tmpdfpath = (get_dfpkl_outpath(dfpath.stem, is_tmp=True)
                          if dfpath.parent.name == 'raw'
                          else dfpath)
-            df = clean_df(df, tmpdfpath)
-            print('saving finalized dataframe...')
-            df.to_pickle(get_dfpkl_outpath(dfpath.stem))
+            yield clean_df_checkpointed(df, tmpdfpath, dfpath, _data_origin(df))
 
         else:
             print('  yes')
-
-        yield df
+            yield dfpath
 
 
 def find_jsonl(dirpath: Path, jsonl_fname: str):
-    matches = list(dirpath.rglob(jsonl_fname))
+    # original data may be compressed (or no longer be)
+    data_stem = jsonl_stem(Path(jsonl_fname))
+    matches = [p for suffix in JSONL_SUFFIXES
+               for p in dirpath.rglob(data_stem + suffix)]
     if matches:
         return most_recent(matches)
     else:
@@ -891,7 +1344,62 @@ def find_jsonl(dirpath: Path, jsonl_fname: str):
 
 
 # process dataframes
-def clean_df(orig_df, tmp_save_path):
+def clean_df_checkpointed(df, tmp_save_path, *source_paths):
+    """`clean_df()` and `exclude_near_duplicates()`, then saves the final table
+    (recorded as derived from `source_paths`). Dataframes of more than
+    `_CHECKPOINT_ROWS` texts are cleaned in chunks of that many texts, each saved
+    (with its exclusions) as soon as it is cleaned, so that a requeued job resumes
+    after the last chunk completed instead of cleaning the whole dataframe again;
+    their final and exclusions tables stay in the chunk files.
+
+    Returns:
+        Path: path of the final table
+    """
+    finaldf_fpath = get_dfpkl_outpath(tmp_save_path.stem)
+    if not _CHECKPOINT_ROWS or len(df) <= _CHECKPOINT_ROWS:
+        df = clean_df(df, tmp_save_path)
+        df = exclude_near_duplicates(df, finaldf_fpath)
+        print('\nsaving final dataframe...')
+        df.to_pickle(finaldf_fpath)
+        record_derived(finaldf_fpath, *source_paths)
+        print('Finished preprocessing and saved to', finaldf_fpath)
+        return finaldf_fpath
+
+    excl_fpath = get_dfpkl_outpath(tmp_save_path.stem, is_excl=True)
+    progress = ChunkProgress(
+        get_chunk_dir(finaldf_fpath),
+        {'texts': len(df), 'first_text_id': str(df.text_id.iloc[0]),
+         'last_text_id': str(df.text_id.iloc[-1]),
+         'chunk_rows': _CHECKPOINT_ROWS, 'rules': rules_version(),
+         'near_dup': _near_dup_params()})
+    chunk_count = -(-len(df) // _CHECKPOINT_ROWS)
+    if progress.resumed:
+        print(f'resuming: {len(progress.done)} of {chunk_count} chunks already cleaned')
+    else:
+        _clear_chunks((tmp_save_path, excl_fpath, finaldf_fpath), finaldf_fpath)
+        progress.restart()
+
+    for chunk_num in range(1, chunk_count + 1):
+        if chunk_num in progress.done:
+            continue
+        print(f'\n--- checkpoint chunk {chunk_num} of {chunk_count} ---')
+        start = (chunk_num - 1) * _CHECKPOINT_ROWS
+        _clean_chunk(df.iloc[start:start + _CHECKPOINT_ROWS], chunk_num,
+                     tmp_save_path, progress, *source_paths)
+    del df
+
+    save_rule_versions(excl_fpath, EXCLUSION_CLASSIFIER.versions)
+    print('Finished preprocessing; final table saved in chunks to',
+          get_print_path(get_chunk_dir(finaldf_fpath)))
+    return finaldf_fpath
+
+
+def _near_dup_params():
+    """near-duplicate exclusion settings, as part of what chunk progress is kept for"""
+    return None if _NEAR_DUP is None else [_NEAR_DUP.threshold, _NEAR_DUP.num_perm]
+
+
+def clean_df(orig_df, tmp_save_path, excl_save_path=None):
 
     print('\nCleaning text in dataframe...')
     if any(orig_df.text_id.str.startswith(('PiCC', 'Pcc'))):
@@ -905,43 +1413,47 @@ def clean_df(orig_df, tmp_save_path):
     if 'text' not in orig_df.columns:
         orig_df = orig_df.assign(text=orig_df.raw)
 
+    # texts already accepted from another data group are excluded before any cleaning
+    orig_df, xdup_df = exclude_corpus_duplicates(orig_df)
+    if not xdup_df.empty:
+        xdup_df = xdup_df.assign(text_changes=np.uint16(0))
+
+    # results of previous runs (with the same cleaning rules) for the same texts
+    cached = (_CLEAN_CACHE.lookup(orig_df.text) if _CLEAN_CACHE is not None
+              else [None] * len(orig_df))
+    if _CLEAN_CACHE is not None:
+        print(f'  {sum(c is not None for c in cached)} of {len(orig_df)} texts '
+              'found in cleaning cache')
+
     # moved this here from preprocessing method because translating encoding belongs in cleanup
     # doing it before `pull_exclusions()` because texts with errors will be excluded
-    print('  translating encoding...')
-    unidecode_t0 = datetime.now()
-    df = orig_df.assign(
-        text=orig_df.text.apply(
-            lambda t: unidecode(t, errors='replace',
-                                replace_str=_UNK_CHAR_STR))
-    )
-    unidecode_t1 = datetime.now()
-    elapsed_time = get_elapsed_time(unidecode_t0, unidecode_t1)
-    print(f'  ~ {elapsed_time} elapsed')
-
     # removing urls before pulling exclusions so that "variable" and "id" patterns
     #   will not throw out texts simply due to urls that would have been removed
-    print('  removing URLs...')
-    t0 = time.perf_counter()
-    df = df.assign(text=df.text.apply(
-        lambda t: bracket_url.sub(r'\1', t)))
-    df = df.assign(text=df.text.apply(lambda t: likely_url.sub(r' ', t)))
-    t1 = time.perf_counter()
-    print(f'  ~ {round(t1 - t0, 2)}  sec elapsed')
-
-    t0 = time.perf_counter()
-    print('  adding missing spaces after word-edge punctuation...')
-    df = df.assign(text=df.text.apply(
-        lambda t: missing_space_regex.sub(r'\1\3 \2\4', t)))
-    t1 = time.perf_counter()
-    print(f'  ~ {round(t1 - t0, 2)}  sec elapsed')
+    pre_texts, changes = normalize_texts(orig_df.text, PRE_EXCLUSION_PIPELINE,
+                                         cached=[c and (c[0], c[3]) for c in cached])
+    # (dataframes from `tmp/` were already cleaned, by the steps flagged)
+    prior_changes = (orig_df.text_changes.to_numpy(dtype='uint16')
+                     if 'text_changes' in orig_df.columns
+                     else np.zeros(len(orig_df), dtype='uint16'))
+    df = orig_df.assign(text=pre_texts, text_changes=prior_changes | changes)
+    # the input texts are only needed as cache keys
+    in_texts = orig_df.text if _CLEAN_CACHE is not None else None
+    text_ids = orig_df.text_id.astype(str)
+    del orig_df, prior_changes
 
     print('saving...')
     df.to_pickle(tmp_save_path)
+    record_derived(tmp_save_path, _data_origin(df))
     print(f'dataframe saved to {get_print_path(tmp_save_path)}')
 
     print('+ Excluding messy data...')
-    excl_save_path = get_dfpkl_outpath(tmp_save_path.stem, is_excl=True)
-    df, __ = pull_exclusions(df, excl_save_path)
+    if excl_save_path is None:
+        excl_save_path = get_dfpkl_outpath(tmp_save_path.stem, is_excl=True)
+    verdicts = {text_id: c[1] for text_id, c in zip(text_ids, cached)
+                if c is not None and c[1] is not None}
+    df, __ = pull_exclusions(df, excl_save_path, new_excl=xdup_df,
+                             verdicts=verdicts)
+    release_corpus_claims(text_ids[~text_ids.isin(df.text_id.astype(str))])
 
     # removed this because, if the script crashes before the next save,
     # it will still run through this method regardless;
@@ -952,18 +1464,31 @@ def clean_df(orig_df, tmp_save_path):
     df = df.assign(text=df.text.astype('string'))
 
     # clean up internet syntax quirks
-    print('+ Cleaning up text...\n   - punctuation delineated text breaks')
-    df = df.assign(text=df.text.apply(
-        lambda t: punc_only.sub(r'\1\2\3\4\5\6\7\n\n', t)))
-
-    print('   - title abbreviations at line breaks...')
-    df = df.assign(
-        text=df.text.apply(lambda t: end_of_line_abbr.sub(r'\1\2\5\6 \3\4', t)))
-
-    text_diff = ~df.text.isin(orig_df.text)
-    if any(text_diff):
-        changedf = df.loc[text_diff, :]
-        print(f'{len(changedf)} of {len(df)} texts modified')
+    print('+ Cleaning up text...')
+    cached_post = {text_id: (c[2], c[3]) for text_id, c in zip(text_ids, cached)
+                   if c is not None and c[1] == ''}
+    kept_ids = df.text_id.astype(str)
+    post_texts, post_changes = normalize_texts(
+        df.text, POST_EXCLUSION_PIPELINE,
+        cached=[cached_post.get(text_id) for text_id in kept_ids])
+    df = df.assign(text=post_texts,
+                   text_changes=df.text_changes.to_numpy(dtype='uint16') | post_changes)
+
+    if _CLEAN_CACHE is not None:
+        # record everything not already fully cached
+        post_texts = dict(zip(kept_ids, post_texts))
+        changes = pd.Series(changes, index=text_ids)
+        changes[kept_ids] |= post_changes
+        new = [c is None or c[1] is None for c in cached]
+        new_ids = text_ids[new]
+        _CLEAN_CACHE.store(in_texts[new], pre_texts[new],
+                           [verdicts.get(text_id) for text_id in new_ids],
+                           [post_texts.get(text_id) for text_id in new_ids],
+                           changes[new].to_numpy())
+
+    n_changed = np.count_nonzero(df.text_changes)
+    if n_changed:
+        print(f'{n_changed} of {len(df)} texts modified')
 
     # raw column will no longer be saved to finalized dataframe output
     # dataframes in `raw/` will have only `raw`
@@ -974,15 +1499,182 @@ def clean_df(orig_df, tmp_save_path):
     return df
 
 
+def normalize_texts(texts: pd.Series, pipeline, cached=None):
+    """applies a text normalization pipeline (see `pile_normalize`), in parallel
+    if `_CLEAN_WORKERS` > 1, and reports how many texts each step changed
+    and the time spent on it.
+    `cached`: already known `(result, change flags)` (None where not known),
+    one per text; the pipeline is only applied to the other texts
+
+    Returns:
+        tuple: (series of normalized texts,
+                `uint16` array of the flags of the steps that changed each text)
+    """
+    to_run = (np.ones(len(texts), dtype=bool) if cached is None
+              else np.array([c is None for c in cached], dtype=bool))
+    workers = _CLEAN_WORKERS if to_run.sum() > _CLEAN_CHUNK_ROWS else 1
+    print('  ' + ', '.join(pipeline.labels) + '...'
+          + (f' [{workers} workers]' if workers > 1 else '')
+          + (f' [{len(texts) - to_run.sum()} cached]' if not to_run.all() else ''))
+    t0 = time.perf_counter()
+    new_texts, changes, step_secs = apply_pipeline(texts[to_run], pipeline, workers=workers,
+                                                   chunk_rows=_CLEAN_CHUNK_ROWS)
+    if not to_run.all():
+        values = np.empty(len(texts), dtype=object)
+        all_changes = np.zeros(len(texts), dtype='uint16')
+        for i in np.flatnonzero(~to_run):
+            values[i], all_changes[i] = cached[i]
+        values[to_run] = new_texts.to_numpy(dtype=object)
+        all_changes[to_run] = changes
+        new_texts = pd.Series(values, index=texts.index, name=texts.name)
+        changes = all_changes & pipeline.mask
+    t1 = time.perf_counter()
+    for label, bit in zip(pipeline.labels, pipeline.bits):
+        print(f'   - {label}: {np.count_nonzero(changes & bit)} of {len(texts)} texts changed, '
+              f'{round(step_secs[label], 2)} sec'
+              + (' (total across workers)' if workers > 1 else ''))
+    print(f'  ~ {round(t1 - t0, 2)}  sec elapsed')
+    return new_texts, changes
+
+
 def get_elapsed_time(start, end):
     elapsed_time = timedelta(seconds=round(
         end.timestamp()) - round(start.timestamp()))
     return elapsed_time
 
 
+def exclude_corpus_duplicates(df: pd.DataFrame):
+    """claims the (raw) texts for their data group in the corpus-wide store and
+    splits off those already accepted from another data group (`excl_type='xdup'`,
+    with the accepted text's id in `duplicate_of`). Claims of texts that are then
+    excluded are released again (`release_corpus_claims()`)."""
+    if _CORPUS_DEDUP is None or df.empty:
+        return df, pd.DataFrame()
+
+    print('  checking corpus-wide deduplication store...')
+    t0 = time.perf_counter()
+    texts = df.raw if 'raw' in df.columns else df.text
+    # e.g. pcc_00_0000001 -> pcc_00
+    data_group = str(df.text_id.iloc[0]).rsplit('_', 1)[0]
+    owners = _CORPUS_DEDUP.claim(texts, df.text_id, data_group)
+    is_dup = owners.notna().to_numpy()
+    xdup_df = df.loc[is_dup, :].assign(excl_type='xdup',
+                                       duplicate_of=owners[is_dup].to_numpy())
+    t1 = time.perf_counter()
+    print(f'   +{len(xdup_df)} texts already accepted from other data groups')
+    print(f'= xdup excl ~~ {round(t1-t0, 2)} seconds')
+    return df.loc[~is_dup, :], xdup_df
+
+
+def release_corpus_claims(text_ids: pd.Series):
+    """releases the claims in the corpus-wide store on texts excluded after
+    `exclude_corpus_duplicates()` claimed them, so that a copy in another data
+    group is kept instead"""
+    if _CORPUS_DEDUP is None or text_ids.empty:
+        return
+    text_ids = text_ids.astype(str)
+    for data_group, group_ids in text_ids.groupby(
+            text_ids.str.rsplit('_', n=1).str[0].to_numpy()):
+        released = _CORPUS_DEDUP.release(group_ids, data_group)
+        if released:
+            print(f'  {released} excluded texts released from corpus-wide deduplication store')
+
+
+def exclude_near_duplicates(df: pd.DataFrame, finaldf_fpath: Path, chunk_num: int = None):
+    """excludes texts of a cleaned data group dataframe that are near-duplicates
+    (estimated Jaccard similarity of word shingles >= threshold) of texts kept
+    from other data groups (with saved signatures) or of earlier texts in `df`.
+    Near-duplicates are added to the exclusions with `excl_type='ndup'`, the id
+    of the matched text as `duplicate_of`, and the estimated `similarity`.
+    `chunk_num`: `df` is this chunk of a data group cleaned in chunks; its texts
+    are also compared to those kept from the earlier chunks, and its signatures
+    and near-duplicates are saved with the chunk's."""
+    if _NEAR_DUP is None or df.empty:
+        return df
+
+    print('\n+ Excluding near-duplicate texts...')
+    t0 = time.perf_counter()
+    sigs = _NEAR_DUP.signatures(df.text)
+    keys = _NEAR_DUP.band_keys(sigs)
+    t1 = time.perf_counter()
+    print(f'  {len(df)} MinHash signatures ~~ {round(t1-t0, 2)} seconds')
+
+    owners = np.full(len(df), None, dtype=object)
+    similarity = np.zeros(len(df), dtype='float32')
+    sig_dir = _DESTINATION.joinpath(_NEAR_DUP_DIRNAME)
+    saved_paths = get_saved_signature_paths(sig_dir, finaldf_fpath)
+    excl_fpath = get_dfpkl_outpath(finaldf_fpath.stem, is_excl=True)
+    if chunk_num is None:
+        sig_path = get_signatures_path(sig_dir, finaldf_fpath)
+    else:
+        # (chunks left without texts by cleaning have no signatures)
+        saved_paths += [path for path in (get_signatures_chunk_path(sig_dir, finaldf_fpath, n)
+                                          for n in range(1, chunk_num))
+                        if path.is_file()]
+        sig_path = get_signatures_chunk_path(sig_dir, finaldf_fpath, chunk_num)
+        excl_fpath = get_chunk_path(excl_fpath, chunk_num)
+    for saved_path in saved_paths:
+        saved_ids, saved_sigs, saved_keys = _NEAR_DUP.load(saved_path)
+        if saved_ids is None:
+            print('  [skipping signatures with different parameters:',
+                  f'{get_print_path(saved_path)}]')
+            continue
+        unmatched = pd.isna(owners)
+        best_ix, best_sim = _NEAR_DUP.match_saved(
+            sigs[unmatched], keys[unmatched], saved_sigs, saved_keys)
+        found = best_ix >= 0
+        match_pos = np.flatnonzero(unmatched)[found]
+        owners[match_pos] = saved_ids[best_ix[found]]
+        similarity[match_pos] = best_sim[found]
+        print(f'   +{found.sum()} near-duplicates of texts in',
+              get_print_path(saved_path))
+
+    in_saved = pd.notna(owners)
+    best_ix, best_sim = _NEAR_DUP.match_within(sigs, keys, skip=in_saved)
+    found = best_ix >= 0
+    owners[found] = df.text_id.to_numpy()[best_ix[found]]
+    similarity[found] = best_sim[found]
+    print(f'   +{found.sum()} near-duplicates of earlier texts in the data group')
+
+    is_ndup = pd.notna(owners)
+    _NEAR_DUP.save(sig_path, df.text_id[~is_ndup], sigs[~is_ndup], keys[~is_ndup])
+    if chunk_num is None:
+        # (signatures of chunks of a previous run in chunks)
+        for path in sig_path.with_suffix('.chunks').glob('chunk-*'):
+            path.unlink()
+    t2 = time.perf_counter()
+    print(f'= ndup excl ~~ {round(t2-t0, 2)} seconds')
+
+    if is_ndup.any():
+        ndup_df = df.loc[is_ndup, :].assign(excl_type='ndup',
+                                            duplicate_of=owners[is_ndup].astype(str),
+                                            similarity=similarity[is_ndup])
+        if excl_fpath.is_file():
+            prev_excl = pd.read_pickle(excl_fpath)
+            ndup_df = pd.concat([prev_excl, ndup_df.loc[
+                ~ndup_df.text_id.isin(prev_excl.text_id), :]])
+        ndup_df = pop_unwanted_cols(ndup_df)
+        ndup_df.to_pickle(excl_fpath)
+        print(f'  = {is_ndup.sum()} near-duplicates added to exclusions in',
+              get_print_path(excl_fpath))
+        release_corpus_claims(df.text_id[is_ndup])
+        df = df.loc[~is_ndup, :]
+
+    return df
+
+
 def pull_exclusions(df: pd.DataFrame,
                     excl_save_path: Path,
-                    recheck: bool = False):
+                    new_excl: pd.DataFrame = None,
+                    verdicts: dict = None):
+    """`new_excl`: exclusions found before this step (e.g. corpus-wide duplicates),
+    already removed from `df`; added to the saved exclusions if not already there.
+    `verdicts`: text_id -> `excl_type` ('' = kept) of texts already classified
+    (e.g. from the cleaning cache), which are not checked again;
+    the verdicts of the texts checked here are added to it.
+    Exclusions by pattern are saved with the version of their rule (`excl_version`),
+    and the rule versions the kept texts were checked against next to them
+    (see `pile_exclude.get_rules_path()`)."""
 
     print('  pulling excluded formats...')
     excl_df = pd.DataFrame(
@@ -991,222 +1683,351 @@ def pull_exclusions(df: pd.DataFrame,
     loaded_from_file = False
     found_exclusions = False
     prev_excl_count = 0
-    if excl_save_path.is_file() and not recheck:
+    # exclusion code of each row of `df` (by position, in original order),
+    #   filled in step by step; the kept & excluded rows are only selected at the end
+    codes = np.full(len(df), EXCL_KEPT, dtype='int8')
+    if excl_save_path.is_file():
         loaded_from_file = True
         prev_excl = pd.read_pickle(excl_save_path)
         excl_df = pd.concat([excl_df, prev_excl],
                             ignore_index=True)
-        df = df.loc[~df.text_id.isin(excl_df.text_id)]
+        codes[df.text_id.isin(excl_df.text_id).to_numpy()] = EXCL_PREVIOUS
         prev_excl_count = len(excl_df)
         print(f'  -> {prev_excl_count} previously '
               'identified exclusions loaded from file')
     else:
         print('[No previous exclusion assessment found.]')
 
-    # uninterpretable/unknown characters (could not be decoded)
-    print('  looking for uninterpretable characters...')
-    t0 = time.perf_counter()
-    cannot_interpret = df.text.str.contains(_UNK_CHAR_STR)
-    if any(cannot_interpret):
-        found_exclusions = True
-        unkchardf = df.loc[cannot_interpret, :].assign(excl_type='?unk')
-        print(f'   +{len(unkchardf)} exclusions')
-        excl_df = pd.concat([excl_df, unkchardf])
-        df = df.loc[~cannot_interpret, :]
-    t1 = time.perf_counter()
-    print(f'= ?unk char excl ~~ {round(t1-t0, 2)} seconds')
-
-    # wikitext
-    t0 = time.perf_counter()
-    df, wiki_df = exclude_wikitexts(df)
-    if not wiki_df.empty:
-        found_exclusions = True
-        wiki_df = wiki_df.assign(excl_type='wiki')
-        excl_df = pd.concat([excl_df, wiki_df])
-    t1 = time.perf_counter()
-    print(f'= wiki excl ~~ {round(t1-t0, 2)} seconds')
+    if new_excl is not None and not new_excl.empty:
+        new_excl = new_excl.loc[~new_excl.text_id.isin(excl_df.text_id), :]
+        if not new_excl.empty:
+            found_exclusions = True
+            excl_df = pd.concat([excl_df, new_excl])
 
-    # html source code
+    text_ids = df.text_id.astype(str).to_numpy()
+    known = np.full(len(df), None, dtype=object)
+    if verdicts:
+        known = np.array([verdicts.get(text_id) for text_id in text_ids], dtype=object)
+        known[codes != EXCL_KEPT] = None
+        is_known = known != None  # noqa: E711 (elementwise)
+        codes[is_known & (known != '')] = EXCL_KNOWN
+        print(f'  {is_known.sum()} texts with known verdicts:',
+              f'+{(codes == EXCL_KNOWN).sum()} exclusions')
+    to_check = np.flatnonzero((codes == EXCL_KEPT) & (known == None))  # noqa: E711
+
+    print('  classifying texts by exclusion patterns...')
     t0 = time.perf_counter()
-    df, html_df = exclude_html(df)
-    if not html_df.empty:
-        found_exclusions = True
-        html_df = html_df.assign(excl_type='html')
-        excl_df = pd.concat([excl_df, html_df])
+    rule_ix = np.array(EXCLUSION_CLASSIFIER(df.text.to_numpy()[to_check]), dtype='int8')
+    is_rule_excl = rule_ix >= 0
+    codes[to_check[is_rule_excl]] = EXCL_RULE_OFFSET + rule_ix[is_rule_excl]
+    for i, excl_type_str in enumerate(EXCLUSION_CLASSIFIER.excl_types):
+        n_excl = (rule_ix == i).sum()
+        if n_excl:
+            print(f'   +{n_excl} {excl_type_str} exclusions')
     t1 = time.perf_counter()
-    print(f'= html excl ~~ {round(t1-t0, 2)} seconds')
+    print(f'= exclusion patterns ~~ {round(t1-t0, 2)} seconds')
 
-    # flag texts that contain technical seeming strings and exclude for now
-    print('  looking for other messy text...')
+    if verdicts is not None:
+        verdicts.update(zip(text_ids[to_check],
+                            [EXCLUSION_CLASSIFIER.excl_types[i] if i >= 0 else ''
+                             for i in rule_ix.tolist()]))
 
-    df, excl_df, found_exclusions = exclude_regex(
-        df, excl_df, found_exclusions)
-
-    #! currently unreachable (no calls of function as recheck)
-    if recheck:
-        if not found_exclusions:
-            print('all previously flagged exclusions have been fixed by simple cleanup')
-        elif len(excl_df) < len(df):
-            print('some excluded texts have been fixed by simple cleanup')
-        else:
-            print('all prev exclusions remain')
+    # new exclusions grouped by code: known verdicts first, then by rule precedence
+    excl_pos = np.flatnonzero(codes > EXCL_KEPT)
+    excl_pos = excl_pos[np.argsort(codes[excl_pos], kind='stable')]
+    if len(excl_pos):
+        found_exclusions = True
+        excl_types = np.array(['', ''] + list(EXCLUSION_CLASSIFIER.excl_types),
+                              dtype=object)[codes[excl_pos]]
+        is_known_excl = codes[excl_pos] == EXCL_KNOWN
+        excl_types[is_known_excl] = known[excl_pos[is_known_excl]]
+        excl_df = pd.concat([excl_df, df.iloc[excl_pos].assign(
+            excl_type=excl_types,
+            excl_version=[EXCLUSION_CLASSIFIER.versions.get(t) for t in excl_types])])
+    df = df.iloc[np.flatnonzero(codes == EXCL_KEPT)]
+
+    # * remove `raw` column for exclusion dataframes
+    # (any added later due to failed parsing attempts will not
+    #  have the `raw` column, and this info can always be
+    # retrieved from dataframes in `raw/` if needed)
+    excl_df = pop_unwanted_cols(excl_df)
+    # (concatenating with the empty frame above makes it float)
+    if 'text_changes' in excl_df.columns and excl_df.text_changes.notna().all():
+        excl_df = excl_df.astype({'text_changes': 'uint16'})
+
+    # only save if (new) texts were marked as exclusions
+    #   or if no pre-existing file (to prevent researching later)
+    if found_exclusions:
+        print('saving...')
+        excl_df.to_pickle(excl_save_path)
+        print(f'  = {len(excl_df)} exclusions '
+              f'({len(excl_df) - prev_excl_count} new) saved to '
+              f'{get_print_path(excl_save_path)}')
+
+    elif loaded_from_file:
+        print('  = No additional exclusions found.')
 
     else:
+        print('saving...')
+        excl_df.to_pickle(excl_save_path)
+        print('  = No exclusions found.')
+    # if len(excl_df) > 0:
+    #     print(f'e.g.:\n', excl_df.sample(1).text.iloc[0][:800])
 
-        # * remove `raw` column for exclusion dataframes
-        # (any added later due to failed parsing attempts will not
-        #  have the `raw` column, and this info can always be
-        # retrieved from dataframes in `raw/` if needed)
-        excl_df = pop_unwanted_cols(excl_df)
-
-        # only save if (new) texts were marked as exclusions
-        #   or if no pre-existing file (to prevent researching later)
-        if found_exclusions:
-            print('saving...')
-            excl_df.to_pickle(excl_save_path)
-            print(f'  = {len(excl_df)} exclusions '
-                  f'({len(excl_df) - prev_excl_count} new) saved to '
-                  f'{get_print_path(excl_save_path)}')
-
-        elif loaded_from_file:
-            print('  = No additional exclusions found.')
-
-        else:
-            print('saving...')
-            excl_df.to_pickle(excl_save_path)
-            print('  = No exclusions found.')
-        # if len(excl_df) > 0:
-        #     print(f'e.g.:\n', excl_df.sample(1).text.iloc[0][:800])
+    # (for chunks, once all chunks are cleaned, see `_clean_text_chunks()`)
+    if not excl_save_path.parent.name.endswith('.chunks'):
+        save_rule_versions(excl_save_path, EXCLUSION_CLASSIFIER.versions)
 
     return df, excl_df
 
 
-def exclude_regex(df, excl_df, found_excl):
-
-    pattern_type_dict = {
-        'json': json_regex,
-        'code': code_regex,
-        '_wrd': underscore_regex,
-        'a0wrd': mixed_letter_digit_regex,
-        'punc': midword_punc_regex
-    }
-
-    for excl_type_str, excl_regex in pattern_type_dict.items():
-        t0 = time.perf_counter()
-        excl_boolean = df.text.apply(lambda t: bool(excl_regex.search(t)))
-        if any(excl_boolean):
-            found_excl = True
-            new_excl = df.loc[excl_boolean, :]
-            new_excl = new_excl.assign(excl_type=excl_type_str)
-            print(f'   +{len(new_excl)} {excl_type_str} exclusions')
-            excl_df = pd.concat([excl_df, new_excl])
-            df = df.loc[~df.text_id.isin(excl_df.text_id), :]
-        t1 = time.perf_counter()
-        print(f'= {excl_type_str} filtering ~~ {round(t1-t0, 2)} seconds')
-
-    return df, excl_df, found_excl
-
-
-def exclude_wikitexts(df):
-    print('  looking for wikitext/wikimedia formatting...')
-    wikidf = pd.DataFrame()
-
-    is_wiki = df.text.apply(lambda t: bool(defwiki.search(t)))
-    if any(is_wiki):
-        wikidf = pd.concat([wikidf, df.loc[is_wiki, :]])
-        df = df.loc[~is_wiki, :]
-
-    maybe_wiki = (df.text.apply(lambda t: bool(wikipat.search(t))))
-    if any(maybe_wiki):
-        wikidf = pd.concat([wikidf, df.loc[maybe_wiki, :]])
-        df = df.loc[~maybe_wiki, :]
-
-    print(f'   +{len(wikidf)} exclusions')
-    return df, wikidf
+def recheck_exclusions(finaldf_fpath: Path):
+    """re-evaluates the exclusion verdicts of a processed data group & pile set
+    after exclusion patterns were edited or added, without reprocessing it:
+    only the exclusion types whose version changed since the texts were checked
+    are applied, and only to texts whose verdict they could change
+      - kept texts: the changed types
+      - texts excluded by an unchanged type: the changed types that take precedence
+      - texts excluded by a changed (or removed, or unversioned) type: all types
+    to their text before exclusion (from the table in `tmp/`).
+    Newly excluded texts are moved from the final dataframe to the exclusions
+    (their parses in already processed slices are not removed); excluded texts
+    no longer matching any pattern are moved to the final dataframe.
+    (Final and exclusions tables saved in chunks are loaded whole, and saved
+    whole in place of their chunks.)
 
+    Returns:
+        pd.DataFrame: the newly admitted texts, cleaned, to be sliced & parsed
+    """
+    excl_fpath = get_dfpkl_outpath(finaldf_fpath.stem, is_excl=True)
+    tmpdf_fpath = get_dfpkl_outpath(finaldf_fpath.stem, is_tmp=True)
+    print(f'\n---\n\n## Rechecking exclusions of {get_print_path(finaldf_fpath)}')
+    if not (table_exists(excl_fpath) and table_exists(tmpdf_fpath)):
+        print('  x - exclusions or uncleaned (`tmp/`) table not found. Skipping.')
+        return pd.DataFrame()
+
+    versions = EXCLUSION_CLASSIFIER.versions
+    precedence = list(versions)
+    checked = load_rule_versions(excl_fpath)
+    changed = [t for t in versions if checked.get(t) != versions[t]]
+    removed = [t for t in checked if t not in versions]
+    if not (changed or removed):
+        print('  = exclusion patterns unchanged since last checked.')
+        return pd.DataFrame()
+    print('  changed/added exclusion types:', ', '.join(changed) or '-',
+          '\n  removed exclusion types:', ', '.join(removed) or '-')
+
+    excl_df = read_table(excl_fpath).reset_index(drop=True)
+    if 'excl_version' not in excl_df.columns:
+        excl_df = excl_df.assign(excl_version=None)
+    final_df = read_table(finaldf_fpath)
+    tmp_df = read_table(tmpdf_fpath)
+    tmp_df.index = tmp_df.text_id.astype(str)
+    # exclusions by pattern (unversioned ones are assumed to be, if of a current type)
+    by_rule = (excl_df.excl_version.notna()
+               | excl_df.excl_type.isin(versions)).to_numpy()
+    excl_types = excl_df.excl_type.astype('string').fillna('').to_numpy(dtype=object)
+    excl_versions = excl_df.excl_version.to_numpy(dtype=object)
+
+    # text ids to check by the exclusion types to check them with
+    to_check = {tuple(changed): final_df.text_id.astype(str).tolist()}
+    has_current_version = np.fromiter((versions.get(t) == v and v is not None
+                                       for t, v in zip(excl_types, excl_versions)),
+                                      dtype=bool, count=len(excl_df))
+    for i in np.flatnonzero(by_rule):
+        if has_current_version[i]:
+            types = tuple(t for t in changed if precedence.index(t)
+                          < precedence.index(excl_types[i]))
+        else:
+            types = tuple(versions)
+        if types:
+            to_check.setdefault(types, []).append(str(excl_df.text_id.iat[i]))
 
-def exclude_html(df):
-    print('  looking for any html...')
-    html_df = pd.DataFrame()
-    is_html = df.text.apply(
-        lambda t: bool(likely_html.search(t)))
-
-    if any(is_html):
-
-        html_df = df.loc[is_html, :]
-        df = df.loc[~is_html, :]
-
-    print(f'   +{len(html_df)} exclusions')
-    return df, html_df
-
-
-# slicing up data for output
-def slice_df(full_df):
-
-    for subcorpus_code, df in full_df.groupby('pile_set_code'):
-        subcorpus_name = df.pile_set_name.iat[0]
-        data_orig_fpath = df.data_origin_fpath.iat[0]
-        data_grp_str = data_orig_fpath.stem
-        print(f'\n{len(df)} remaining {subcorpus_name} texts in '
+    t0 = time.perf_counter()
+    verdicts = {}
+    for types, text_ids in to_check.items():
+        classifier = EXCLUSION_CLASSIFIER.subset(types)
+        texts = tmp_df.text.reindex(text_ids)
+        is_missing = texts.isna().to_numpy()
+        if is_missing.any():
+            print(f'  ! {is_missing.sum()} texts not found in uncleaned table; not rechecked')
+        text_ids = [t for t, m in zip(text_ids, is_missing) if not m]
+        rule_ix = classifier(texts.loc[~is_missing].astype(str))
+        verdicts.update((text_id, classifier.excl_types[i] if i >= 0 else None)
+                        for text_id, i in zip(text_ids, rule_ix))
+    print(f'  {len(verdicts)} texts rechecked ~~ {round(time.perf_counter() - t0, 2)} seconds')
+
+    # * previously excluded texts: new type, or admitted
+    #   (without a match, texts checked only for the changed types that take
+    #   precedence keep their type: the unchanged ones did not match before)
+    excl_ids = excl_df.text_id.astype(str)
+    new_types = excl_ids.map(verdicts)
+    no_match = excl_ids.isin(verdicts).to_numpy() & new_types.isna().to_numpy()
+    is_admitted = no_match & ~has_current_version
+    is_retyped = new_types.notna().to_numpy()
+    excl_df = excl_df.astype({'excl_type': object, 'excl_version': object})
+    excl_df.loc[is_retyped, 'excl_type'] = new_types[is_retyped].to_numpy()
+    excl_df.loc[is_retyped, 'excl_version'] = new_types[is_retyped].map(versions).to_numpy()
+    print(f'  {(is_retyped & (new_types != excl_types).to_numpy()).sum()}',
+          f'exclusions assigned a different type; {is_admitted.sum()} texts admitted')
+
+    # * previously kept texts: newly excluded
+    kept_ids = final_df.text_id.astype(str)
+    kept_types = kept_ids.map(verdicts)
+    is_newly_excl = kept_types.notna().to_numpy()
+    newly_excl = pop_unwanted_cols(
+        tmp_df.loc[kept_ids[is_newly_excl]].reset_index(drop=True)).assign(
+        excl_type=kept_types[is_newly_excl].to_numpy(),
+        excl_version=kept_types[is_newly_excl].map(versions).to_numpy())
+    if is_newly_excl.any():
+        print(f'  {is_newly_excl.sum()} previously kept texts now excluded',
+              '(parses already written for them are not removed):')
+        print(newly_excl.excl_type.value_counts().to_string())
+
+    admitted = pop_unwanted_cols(
+        tmp_df.loc[excl_ids[is_admitted]].reset_index(drop=True))
+    del tmp_df
+    if not admitted.empty:
+        print('+ Cleaning up admitted texts...')
+        post_texts, post_changes = normalize_texts(admitted.text.astype('string'),
+                                                   POST_EXCLUSION_PIPELINE)
+        if 'text_changes' in admitted.columns:
+            post_changes |= admitted.text_changes.to_numpy(dtype='uint16')
+        admitted = admitted.assign(text=post_texts.astype('string'),
+                                   text_changes=post_changes,
+                                   dataframe_fpath=finaldf_fpath)
+
+    excl_df = pd.concat([excl_df.loc[~is_admitted, :], newly_excl], ignore_index=True)
+    excl_df.to_pickle(excl_fpath)
+    _remove_chunks(excl_fpath)
+    save_rule_versions(excl_fpath, versions)
+    print(f'  = {len(excl_df)} exclusions saved to {get_print_path(excl_fpath)}')
+    if is_newly_excl.any() or not admitted.empty:
+        final_df = (pd.concat([final_df.loc[~is_newly_excl, :], admitted])
+                    .sort_values('text_id'))
+        final_df = final_df.assign(text=final_df.text.astype('string'))
+        final_df.to_pickle(finaldf_fpath)
+        _remove_chunks(finaldf_fpath)
+        record_derived(finaldf_fpath, _data_origin(final_df))
+        print(f'  = {len(final_df)} texts in updated final dataframe')
+    release_corpus_claims(newly_excl.text_id)
+
+    return admitted
+
+
+def _remove_chunks(table_fpath: Path):
+    """removes the chunk files of a table that was just saved whole"""
+    for chunk_path in get_chunk_dir(table_fpath).glob('chunk-*'):
+        chunk_path.unlink()
+
+
+def slice_df(final_table, append: bool = False):
+    """`final_table`: path of a data group's final table (saved whole or as chunk
+    files), or a dataframe of texts (e.g. those admitted by an exclusion recheck)
+    `append`: add the texts as new slices of an already sliced data group
+    (numbered after its existing slices) instead of (re)slicing it from the start
+
+    Slices are cut from a stream of the texts in `text_id` order (see
+    `stream_slices()`) and saved, with their slice info, as each one fills.
+    A table saved in chunks is read one chunk file at a time, in order (chunks are
+    cut in `text_id` order): once for the parse cost features of its texts, then
+    again to cut the slices, so only about two slices (plus a chunk) are held
+    at a time."""
+    if isinstance(final_table, pd.DataFrame):
+        def iter_chunks():
+            yield final_table
+    else:
+        def iter_chunks():
+            for df in iter_table(final_table):
+                yield pop_unwanted_cols(df)
+
+    subcorpora = {}
+    for df in iter_chunks():
+        for subcorpus_code, positions in _subcorpus_positions(df).items():
+            if subcorpus_code not in subcorpora:
+                first_row = positions[0]
+                subcorpora[subcorpus_code] = {
+                    'name': df.pile_set_name.iat[first_row],
+                    'data_origin_fpath': df.data_origin_fpath.iat[first_row],
+                    'dataframe_fpath': df.dataframe_fpath.iat[first_row],
+                    'features': []}
+            subcorpora[subcorpus_code]['features'].extend(
+                text_features(df.text.iloc[positions[i:i + _SLICE_PIECE_ROWS]])
+                for i in range(0, len(positions), _SLICE_PIECE_ROWS))
+        del df
+
+    for subcorpus_code in sorted(subcorpora):
+        subcorpus = subcorpora[subcorpus_code]
+        subcorpus_name = subcorpus['name']
+        data_orig_fpath = subcorpus['data_origin_fpath']
+        data_grp_str = jsonl_stem(data_orig_fpath)
+        features = pd.concat(subcorpus['features'])
+        print(f'\n{len(features)} remaining {subcorpus_name} texts in '
               f'{data_grp_str} dataset\n'
-              f'Slicing dataframe into smaller subsets of around {_SLDF_ROW_LIMIT} rows each'
+              + (f'Slicing dataframe into smaller subsets of around {_SLICE_SECONDS / 3600:g} '
+                 'hours of predicted parsing time each' if _SLICE_SECONDS else
+                 f'Slicing dataframe into smaller subsets of around {_SLDF_ROW_LIMIT} rows each')
               )
-        # TODO : do this in a more elegant way...  pandas chunking?
-        remaining_df = df.sort_values('text_id')
-        slices = []
-        # e.g. if limit were 1000:
-        # slice off 1000 rows at a time until total is 2050 or less
-        while len(remaining_df) > int(2.2*_SLDF_ROW_LIMIT):
-
-            dfslice = remaining_df.iloc[:_SLDF_ROW_LIMIT, :]
-            remaining_df = remaining_df.iloc[_SLDF_ROW_LIMIT:, :]
-            slices.append(dfslice)
+        # e.g. if limit were 1000 rows:
+        # slice off 1000 rows at a time until total is 2200 or less;
         # if 2400 split remaining: 2 slices of 1200
-        # if 1202, split remaining: 2 slices of 610
-        # if remaining df is 1200 rows or less:
+        # if 1202, split remaining: 2 slices of 601
+        # if remaining df is 1100 rows or less:
         #   keep as is (no more slicing)
-        if len(remaining_df) > int(1.1*_SLDF_ROW_LIMIT):
-
-            half_remaining = int(len(remaining_df)/2)
-
-            dfslice_penult = remaining_df.iloc[:half_remaining, :]
-            slices.append(dfslice_penult)
-
-            remaining_df = remaining_df.iloc[half_remaining:, :]
-
-        # * this must be outdented to catch smaller dataframes
-        slices.append(remaining_df)
-        zfill_len = len(str(len(slices)))
+        costs, limit = ((_PARSE_COST.predict(features), _SLICE_SECONDS) if _SLICE_SECONDS
+                        else (np.ones(len(features)), _SLDF_ROW_LIMIT))
+        slice_count = len(slice_bounds(costs, limit))
+        pieces = _slice_pieces(iter_chunks(), subcorpus_code, features, costs)
+
+        prev_slice_info = pd.DataFrame()
+        if append:
+            prev_info_path = get_dfpkl_outpath(
+                data_grp_str, subcorpus_code, slice_id='0', is_tmp=True
+            ).with_name(get_metadf_fname(data_grp_str))
+            if prev_info_path.is_file():
+                prev_slice_info = pd.read_csv(prev_info_path, index_col=0,
+                                              dtype={'slice_number': str})
+        first_slice = (1 if prev_slice_info.empty
+                       else prev_slice_info.index.astype(int).max() + 1)
+        zfill_len = len(str(first_slice - 1 + slice_count))
+        # //final_df_path = get_dfpkl_outpath(data_source_label, subcorpus_name)
+        try:
+            final_df_path = subcorpus['dataframe_fpath'].relative_to(_DESTINATION)
+        except ValueError:
+            final_df_path = subcorpus['dataframe_fpath']
+        exclusions_path = get_dfpkl_outpath(
+            data_grp_str, subcorpus_name, is_excl=True).relative_to(_DESTINATION)
         # Andrea Hummel on Feb 3, 2022 at 4:45 PM
         # * Note that this first save of the dataframe slices is *after* `pull_exclusions()`
         #   is called, so to get the full set of texts covered in the full dataframe, need
         #   to look at the union of the slices _and_ the corresponding exclusions dataframe.
-        slice_labels = [str(x+1).zfill(zfill_len) for x in range(len(slices))]
         slice_info = pd.DataFrame(
             columns=['total_texts', 'first_text_id', 'last_text_id',
-                     'tmp_slice_path', 'final_slice_path', 'conllu_path'],
-            index=slice_labels)
-        for i, zipped in enumerate(zip(slice_labels, slices)):
+                     'tmp_slice_path', 'final_slice_path', 'conllu_path',
+                     'total_chars', 'est_sentences', 'predicted_seconds',
+                     'origin_filepath', 'data_origin_group', 'final_df_path',
+                     'exclusions_path'])
+        slice_info.index.name = 'slice_number'
+        for i, (sldf, slice_features) in enumerate(stream_slices(pieces, limit)):
             #! slice numbering starts at 1, not 0 (cannot use i)
-            slice_zfilled, sldf = zipped
+            slice_zfilled = str(first_slice + i).zfill(zfill_len)
 
             # reset index for each slice dataframe to range index
             #! must have `drop = True` bc otherwise inserts existing index as a column
             #! (and you can only do this 2x without renaming those columns before an error occurs)
             # * (original index from full df can be retrieved from `orig_text_id`)
-            sldf.reset_index(drop=True, inplace=True)
+            sldf = sldf.reset_index(drop=True)
 
             # update text ids
             sldf = create_ids(sldf, zfilled_slice_num=slice_zfilled)
             sldf = sldf.assign(slice_numstr=slice_zfilled)
-            #! must reassign modified dataframe to the list of slices to save update
-            slices[i] = sldf
 
             # save slice dataframe as compressed pickle
             outpath = get_dfpkl_outpath(
                 data_grp_str, subcorpus_code,
                 slice_id=slice_zfilled, is_tmp=True)
             sldf.to_pickle(outpath)
+            record_derived(outpath, sldf.dataframe_fpath.iat[0])
 
             # add info on slice to slice_info meta dataframe
             first_id = sldf.text_id.iloc[0]
@@ -1214,37 +2035,67 @@ def slice_df(full_df):
             texts_in_slice = len(sldf)
             conllu_path = get_conllu_outpath(
                 data_grp_str, slice_zfilled, subcorpus_code)
+            totals = slice_features.sum()
             slice_info.loc[slice_zfilled, :] = [
                 texts_in_slice, first_id, last_id,
                 outpath.relative_to(_DESTINATION),
                 outpath.parent.parent.joinpath(
                     outpath.name).relative_to(_DESTINATION),
-                conllu_path.relative_to(_DESTINATION)]
-
-        # //final_df_path = get_dfpkl_outpath(data_source_label, subcorpus_name)
-        try:
-            final_df_path = df.dataframe_fpath.iloc[0].relative_to(
-                _DESTINATION)
-        except ValueError:
-            final_df_path = df.dataframe_fpath.iloc[0]
-        slice_info = slice_info.assign(
-            origin_filepath=data_orig_fpath,
-            data_origin_group=data_grp_str,
-            final_df_path=final_df_path,
-            exclusions_path=get_dfpkl_outpath(
-                data_grp_str, subcorpus_name, is_excl=True
-            ).relative_to(_DESTINATION))
-        slice_info.index.name = 'slice_number'
-        # and save slice_info same directory when finished looping
-        slice_info.to_csv(outpath.with_name(
-            get_metadf_fname(data_grp_str)))
+                conllu_path.relative_to(_DESTINATION),
+                totals.chars, totals.sentences,
+                round(_PARSE_COST.predict(slice_features).sum()),
+                data_orig_fpath, data_grp_str, final_df_path, exclusions_path]
+            # (saved with each slice, so the info is complete for every slice saved)
+            pd.concat([prev_slice_info, slice_info]).to_csv(outpath.with_name(
+                get_metadf_fname(data_grp_str)))
+            if _SLICE_LEDGER is not None:
+                _SLICE_LEDGER.record_created(slice_info.loc[[slice_zfilled], :])
+            del sldf
         print(slice_info)
 
         #! this needs to be its own loop so that all the slices can be saved
         #!   before any of them are processed
         #!   (which takes a long time and has a high likelihood of crashing)
-        for sldf in slices:
-            process_slice(sldf, slice_info)
+        for tmp_slice_path in slice_info.tmp_slice_path:
+            process_slice(pd.read_pickle(_DESTINATION.joinpath(tmp_slice_path)),
+                          slice_info)
+
+
+def _subcorpus_positions(df: pd.DataFrame):
+    """row positions of the texts of each pile set in `df`, in `text_id` order"""
+    return {subcorpus_code: positions[df.text_id.iloc[positions].argsort().to_numpy()]
+            for subcorpus_code, positions in df.groupby('pile_set_code').indices.items()}
+
+
+def _slice_pieces(chunks, subcorpus_code, features: pd.DataFrame, costs):
+    """`(dataframe, features, costs)` pieces of at most `_SLICE_PIECE_ROWS` texts
+    of one pile set for `stream_slices()`, copied out of each of the table's
+    `chunks` in turn (`features` and `costs` are those of all its texts, in order)"""
+    offset = 0
+    for df in chunks:
+        positions = _subcorpus_positions(df).get(subcorpus_code)
+        if positions is None:
+            continue
+        for i in range(0, len(positions), _SLICE_PIECE_ROWS):
+            piece_positions = positions[i:i + _SLICE_PIECE_ROWS]
+            end = offset + len(piece_positions)
+            yield (df.iloc[piece_positions, :], features.iloc[offset:end],
+                   costs[offset:end])
+            offset = end
+
+
+def _record_parsing_time(tmp_slice_path: Path, data_group, slice_int: int,
+                         parsing_secs: int):
+    """adds the actual parsing time of a slice to its data group's slice info
+    (next to its predicted time, for calibrating the parse cost model)"""
+    info_path = tmp_slice_path.with_name(get_metadf_fname(data_group))
+    if not info_path.is_file():
+        return
+    slice_info = pd.read_csv(info_path, index_col=0, dtype={'slice_number': str})
+    is_slice = slice_info.index.astype(int) == slice_int
+    if is_slice.any():
+        slice_info.loc[is_slice, 'parsing_seconds'] = parsing_secs
+        slice_info.to_csv(info_path)
 
 
 def process_slice(sldf: pd.DataFrame, metadf: pd.DataFrame):
@@ -1296,48 +2147,59 @@ def process_slice(sldf: pd.DataFrame, metadf: pd.DataFrame):
     elif not local_conllu_path.parent.is_dir():
         local_conllu_path.parent.mkdir(parents=True)
 
-    successful_df = stanza_parse(
-        sldf, local_conllu_path, slice_int, slices_total_str)
+    ledger_key = str(this_sl_series.tmp_slice_path)
+    if _SLICE_LEDGER is not None:
+        claimed, previous = _SLICE_LEDGER.claim(
+            ledger_key, slice_name, this_sl_series.to_dict(),
+            stale_after=_CLAIM_STALE_SECONDS, force=_FORCE_CLAIM)
+        if not claimed:
+            print(f'Slice "{slice_name}" is {previous[0]} (by {previous[1]}); skipping.\n'
+                  '  (use `--force_claim` to parse it again)')
+            return
+        if previous and previous[0] != 'created':
+            print(f'(slice ledger: previously {previous[0]}, by {previous[1]})')
+        _SLICE_LEDGER.set_state(ledger_key, 'parsing')
+    try:
+        with (_SLICE_LEDGER.keep_alive(ledger_key) if _SLICE_LEDGER is not None
+              else nullcontext()):
+            successful_df = stanza_parse(
+                sldf, local_conllu_path, slice_int, slices_total_str)
+    except Exception as e:
+        if _SLICE_LEDGER is not None:
+            _SLICE_LEDGER.set_state(ledger_key, 'failed', error=repr(e))
+        raise
+    tmp_slice_path = Path(this_sl_series.tmp_slice_path)
+    if _DESTINATION not in tmp_slice_path.parents:
+        tmp_slice_path = _DESTINATION.joinpath(tmp_slice_path)
+    record_derived(local_conllu_path, tmp_slice_path)
 
     final_slice_path = Path(this_sl_series.final_slice_path)
     if _DESTINATION not in final_slice_path.parents:
         final_slice_path = _DESTINATION.joinpath(final_slice_path)
 
     successful_df.to_pickle(final_slice_path)
+    record_derived(final_slice_path, local_conllu_path)
     slice_t1 = datetime.now()
     print(f'Finished writing parses to {this_sl_series.conllu_path}\n'
           f'  @ {slice_t1.ctime()}')
     delta = get_elapsed_time(slice_t0, slice_t1)
-    print(f'    {delta} -- Slice parsing time')
+    parsing_secs = round((slice_t1 - slice_t0).total_seconds())
+    print(f'    {delta} -- Slice parsing time'
+          + (f' (predicted: {timedelta(seconds=int(this_sl_series.predicted_seconds))})'
+             if pd.notna(this_sl_series.get('predicted_seconds')) else ''))
+    # (data group as in the slice info file name; `data_group` may have been read as a number)
+    _record_parsing_time(tmp_slice_path, jsonl_stem(Path(this_sl_series.origin_filepath)),
+                         slice_int, parsing_secs)
 
     # // runtime = timedelta(seconds=round(
     # // slice.timestamp() - global_start_time.timestamp()))
     print(f'    {get_elapsed_time(_SCRIPT_START_TIME, datetime.now())} '
           '-- Current script runtime')
 
-    # save version of dataframe for all texts actually processed
-    this_sl_metadf = this_sl_metadf.assign(
-        finished_at=slice_t1.ctime(),
-        parsing_time=delta)
-
-    this_sl_metadf = this_sl_metadf.set_index('slice_name')
-
-    all_completed_metadf_path = _DESTINATION.joinpath(
-        'all-completed-slices_meta-index.csv')
-    if all_completed_metadf_path.is_file():
-        completed_slice_metadf = pd.read_csv(all_completed_metadf_path)
-
-    else:
-        completed_slice_metadf = pd.DataFrame()
-
-    if 'slice_name' in completed_slice_metadf.columns:
-        completed_slice_metadf = completed_slice_metadf.set_index('slice_name')
-
-    completed_slice_metadf = pd.concat(
-        [completed_slice_metadf, this_sl_metadf])
-    completed_slice_metadf.to_csv(all_completed_metadf_path)
-    print('Info for fully processed slice added to all completed slices index:',
-          get_print_path(all_completed_metadf_path))
+    if _SLICE_LEDGER is not None:
+        _SLICE_LEDGER.set_state(ledger_key, 'done')
+        print('Slice recorded as done in slice ledger:',
+              get_print_path(_SLICE_LEDGER.db_path))
 
     if len(successful_df) == len(sldf):
         print('No skipped texts added to exclusions')
@@ -1360,6 +2222,13 @@ def process_slice(sldf: pd.DataFrame, metadf: pd.DataFrame):
         excl_df = pd.read_pickle(excl_save_path)
         print('Adding skipped texts to', get_print_path(excl_save_path))
 
+    elif table_exists(excl_save_path):
+        # (exclusions saved in chunks: skipped texts are saved as a chunk of their own)
+        excl_df = pd.DataFrame()
+        excl_save_path = get_chunk_dir(excl_save_path).joinpath(
+            f'chunk-fail-{this_sl_numstr}.pkl.gz')
+        print('Adding skipped texts to', get_print_path(excl_save_path))
+
     else:
         backup_path = excl_save_path.with_name(excl_save_path.name
                                                .split('.', 1)[0]+'-alt.pkl.gz')
@@ -1640,13 +2509,13 @@ def _parse_arg_inputs():
     parser.add_argument(
         '-i', '--input_file', default=[],
         type=Path, action='append', dest='input_files',
-        help=('path(s) for input file(s). Can be `.jsonl` or `.pkl(.gz).` '
+        help=('path(s) for input file(s). Can be `.jsonl(.zst/.gz)` or `.pkl(.gz).` '
               'If not specified, script will seek all applicable files '
               'the scope of the calling directory or directory specified with -s flag.'))
 
     parser.add_argument(
         '-g', '--glob_expr',
-        type=str, default='*/*/data/pile/**/*jsonl',
+        type=str, default='*/*/data/pile/**/*jsonl*',
         help=("glob expression for file input selection. Ignored if `-i` flag is used."
               "*Must be enclosed in '/\" in order to be input as string "
               "instead of multiple files!* "
@@ -1654,9 +2523,9 @@ def _parse_arg_inputs():
               "the search is now relative to the anchor (i.e. /). "
               "Therefore beginning the expression with '**' is highly discouraged"
               "--it will take a very long time to look through EVERYthing."
-              "Defaults to '*/*/data/pile/**/*jsonl', which will seek a 'data/' directory "
+              "Defaults to '*/*/data/pile/**/*jsonl*', which will seek a 'data/' directory "
               "2 levels down from the anchor of the file system with subdir 'pile/'"
-              "and all subsequent paths ending in 'jsonl'"))
+              "and all subsequent `.jsonl`, `.jsonl.zst`, or `.jsonl.gz` files"))
 
     parser.add_argument(
         '-d', '--destination',
@@ -1668,9 +2537,12 @@ def _parse_arg_inputs():
 
     parser.add_argument(
         '-c', '--corpus_selection',
-        default='Pile-CC',
+        default=['Pile-CC'], nargs='+',
         type=str,
-        help=('option to specify the pile set. Default pile set: "Pile-CC".'))
+        help=('option to specify the pile set(s). Default pile set: "Pile-CC". '
+              'If more than one is given (e.g. `-c Pile-CC OpenWebText2`), '
+              'each jsonl file is read only once, and every pile set gets its own '
+              'dataframes, slices, and conllu files.'))
 
     parser.add_argument(
         '-R', '--Reprocess',
@@ -1697,6 +2569,160 @@ def _parse_arg_inputs():
               'Note that this will only apply to *new* (or redone) slicing.')
     )
 
+    parser.add_argument(
+        '--slice_hours',
+        default=0, type=float,
+        help=('option to slice dataframes by predicted parsing time instead of by text '
+              'count (`-o`): texts are packed into slices of around this many hours, '
+              'estimated from their length (characters and sentences) with the parse cost '
+              'model. Predicted and actual parsing times are recorded in the slice info. '
+              'See `script/calibrate_parse_cost.py`. Default: 0 (slice by text count).'))
+
+    parser.add_argument(
+        '--cost_model',
+        default=None, type=Path,
+        help=('path of the parse cost model to predict parsing time with. Defaults to '
+              f'`[DESTINATION]/puddin/{_PARSE_COST_FNAME}` (as saved by '
+              '`calibrate_parse_cost.py`) if it exists, else default coefficients.'))
+
+    parser.add_argument(
+        '--stale_hours',
+        default=DEFAULT_STALE_SECONDS / 3600, type=float,
+        help=('hours without a heartbeat after which a slice left `claimed` or `parsing` '
+              'in the slice ledger (by a job that was presumably killed) is parsed again by '
+              'the next job to reach it. A job parsing a slice records a heartbeat every '
+              f'{HEARTBEAT_SECONDS // 60} minutes, so this only needs to be longer than '
+              'that. Slices that are `done` or still within this time are skipped.'))
+
+    parser.add_argument(
+        '--force_claim',
+        default=False, action='store_true',
+        help=('option to parse slices whatever their state in the slice ledger, '
+              'e.g. to reparse `done` slices or ones another job is still parsing.'))
+
+    parser.add_argument(
+        '--chunk_rows',
+        default=0, type=int,
+        help=('option to read, deduplicate, and clean `.jsonl` inputs in chunks of '
+              'at most this many texts instead of all at once, to bound memory use. '
+              'Raw, tmp, and exclusions tables are then saved as chunk files in '
+              '`*.chunks/` directories. Text IDs are identical to a whole-file run. '
+              'Defaults to 0 (whole file at once, unless --max_mem is given).'))
+
+    parser.add_argument(
+        '--max_mem',
+        default=0, type=float,
+        help=('option to specify a memory budget (in GB) for preprocessing `.jsonl` inputs. '
+              'Implies chunked preprocessing (see --chunk_rows): chunks are limited to the '
+              'number of text characters that can be cleaned within the budget. '
+              'Can be combined with --chunk_rows. Defaults to 0 (no budget).'))
+
+    parser.add_argument(
+        '--full_decode',
+        default=False, action='store_true',
+        help=('option to JSON decode every `.jsonl` record to check its pile set. '
+              'By default, the raw bytes of each line are checked for the selected '
+              '`"pile_set_name"` first and only candidate records are decoded.'))
+
+    parser.add_argument(
+        '--read_workers',
+        default=1, type=int,
+        help=('option to split each `.jsonl` input into byte ranges (aligned on line breaks) '
+              'that are decoded and filtered by this many processes in parallel '
+              '(compressed inputs are decompressed in a background thread and passed '
+              'to the processes in blocks). '
+              'Texts are reassembled in their original order, so text IDs do not change. '
+              'Defaults to 1 (serial reading).'))
+
+    parser.add_argument(
+        '--build_index',
+        default=False, action='store_true',
+        help=('option to build a sidecar byte offset index (`[input].idx`) for each '
+              '`.jsonl` input that does not have one yet. Records can then be pulled '
+              'by `raw_ordinal` (saved in the dataframes) without reading the whole file; '
+              'see `script/index_pile_jsonl.py`.'))
+
+    parser.add_argument(
+        '--corpus_dedup',
+        default=False, action='store_true',
+        help=('option to deduplicate texts across data groups (i.e. `.jsonl` files) '
+              f'using a fingerprint store shared by all jobs, `[DESTINATION]/puddin/dedup/{_CORPUS_DEDUP_FNAME}`. '
+              'Texts already accepted from another data group are added to the exclusions '
+              'with `excl_type="xdup"` (and the accepted text\'s id as `duplicate_of`) '
+              'instead of being cleaned, sliced, and parsed.'))
+
+    parser.add_argument(
+        '--clean_workers',
+        type=int, default=1,
+        help=('number of processes to run the text normalization steps of cleaning '
+              '(encoding translation, URL removal, spacing & line break fixes) in. '
+              'Output is identical to that of a single process.'))
+
+    parser.add_argument(
+        '--clean_chunk_rows',
+        type=int, default=DEFAULT_CHUNK_ROWS,
+        help=(f'number of texts sent to a cleaning process at once. Default: {DEFAULT_CHUNK_ROWS}.'))
+
+    parser.add_argument(
+        '--checkpoint_rows',
+        type=int, default=0,
+        help=('option to clean dataframes of more than this many texts in chunks, '
+              'each saved as soon as it is cleaned, so that a requeued job resumes '
+              'after the last completed chunk. Chunked preprocessing (`--chunk_rows`/'
+              '`--max_mem`) always resumes this way. Default: 0 (off).'))
+
+    parser.add_argument(
+        '--regex_engine',
+        choices=('re', 're2'), default='re',
+        help=('regex engine for the cleaning, exclusion, and sentence break patterns. '
+              '`re2` (requires `pip install google-re2`) matches in linear time, so no text '
+              'can make a pattern backtrack for minutes; patterns it cannot express '
+              '(back-references, lookarounds) still use `re`. '
+              'See `script/regex_engine_report.py`.'))
+
+    parser.add_argument(
+        '--clean_cache',
+        default=False, action='store_true',
+        help=('option to cache cleaning results (normalized texts and exclusion verdicts) '
+              f'in `[DESTINATION]/puddin/clean_cache/{_CLEAN_CACHE_FNAME}`, keyed by a '
+              'fingerprint of each text before cleaning. Texts cleaned by a previous run '
+              '(e.g. before a crash, or with `-R`/`-S`) are then not cleaned again. '
+              'Results are discarded whenever `pile_regex_imports.py`, '
+              '`pile_normalize.py`, or `pile_exclude.py` changes.'))
+
+    parser.add_argument(
+        '--recheck_exclusions',
+        default=False, action='store_true',
+        help=('option to re-evaluate the exclusions of already processed data after '
+              'exclusion patterns (in `pile_regex_imports.py`/`pile_exclude.py`) were edited or added, '
+              'instead of processing it. Only the exclusion types whose patterns changed since '
+              'a text was checked are applied, and only to texts whose verdict they could change. '
+              'Texts no longer excluded are cleaned and parsed as new slices of their data group; '
+              'texts newly excluded are moved to the exclusions.'))
+
+    parser.add_argument(
+        '--full_hash',
+        default=False, action='store_true',
+        help=('option to fingerprint files by hashing their full content instead of '
+              'their size and sampled blocks when deciding which outputs are out of date. '
+              'Slower, but catches changes of any single byte. (Records made in the other '
+              'mode are not used; files without a record are compared by modification time.)'))
+
+    parser.add_argument(
+        '--near_dup',
+        type=float, default=None, metavar='THRESHOLD',
+        help=('option to exclude near-duplicate texts: cleaned texts whose word shingles '
+              'have an estimated Jaccard similarity >= THRESHOLD (e.g. 0.8) to an earlier '
+              'text of the data group, or to a text kept from a previously processed data group, '
+              'are added to the exclusions with `excl_type="ndup"`. MinHash signatures of kept texts '
+              f'are saved to `[DESTINATION]/puddin/{_NEAR_DUP_DIRNAME}/` for later data groups.'))
+
+    parser.add_argument(
+        '--minhash_perms',
+        type=int, default=64,
+        help=('number of MinHash permutations (signature values per text) '
+              'used for `--near_dup`. Signatures saved with a different number are ignored.'))
+
     args = parser.parse_args()
 
     #! the input string has to be quoted for it to remain a string
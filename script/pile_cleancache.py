@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+'''
+persistent cache of cleaning results, keyed by the content of the text
+before cleaning.
+
+For every text cleaned by `parse_pile.clean_df()`, the cache records
+  - the text after the pre-exclusion normalization steps
+    (what is saved in `pile_tables/tmp/`)
+  - the exclusion verdict for it: the `excl_type` assigned by
+    `pull_exclusions()`, or '' if it was kept
+  - for kept texts, the text after the post-exclusion steps
+  - which steps changed the text (`text_changes` flags, see `pile_normalize`)
+keyed by the 128-bit fingerprint of the input text and the version of the
+  cleaning rules: a hash of `pile_regex_imports.py`, `pile_normalize.py`,
+  `pile_exclude.py`, and `pile_regex_engine.py`, and of the regex engine
+  selected (see `pile_regex_engine.set_regex_engine()`).
+  Editing any of them changes the version, so results recorded with previous
+  rules are ignored (and deleted when the cache is next opened).
+
+Texts are stored zlib compressed, and only if a step changed them
+  (NULL = same as the text before that step).
+'''
+import sqlite3
+import zlib
+from contextlib import closing
+from hashlib import blake2b
+from pathlib import Path
+
+from pile_dedup import text_fingerprint
+from pile_regex_engine import get_regex_engine
+
+# files whose content determines the cleaning results
+_RULES_FILES = ('pile_regex_imports.py', 'pile_normalize.py', 'pile_exclude.py',
+                'pile_regex_engine.py')
+# texts read/written per statement batch
+_BATCH = 50000
+# max number of `?` parameters in a single SQLite statement (older SQLite: 999)
+_SQL_VARS = 900
+
+
+def rules_version(script_dir: Path = Path(__file__).parent):
+    """hash of the modules defining the cleaning steps and exclusion patterns,
+    and of the regex engine they are currently compiled with"""
+    digest = blake2b(digest_size=8)
+    for fname in _RULES_FILES:
+        digest.update(script_dir.joinpath(fname).read_bytes())
+    digest.update(get_regex_engine().encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _pack(text, before):
+    return None if text == before else zlib.compress(text.encode('utf-8'), 1)
+
+
+def _unpack(blob, before):
+    return before if blob is None else zlib.decompress(blob).decode('utf-8')
+
+
+class CleaningCache:
+    """SQLite store of `raw text fingerprint + rules version` ->
+    (pre-exclusion text, exclusion verdict, post-exclusion text)"""
+
+    def __init__(self, db_path: Path, timeout: float = 600, version: str = None):
+        self.db_path = db_path
+        self.timeout = timeout
+        self.version = version or rules_version()
+        if not db_path.parent.is_dir():
+            db_path.parent.mkdir(parents=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS cleaned ('
+                         ' fingerprint BLOB NOT NULL,'
+                         ' rules TEXT NOT NULL,'
+                         ' pre_text BLOB,'
+                         ' verdict TEXT,'
+                         ' post_text BLOB,'
+                         ' changes INTEGER,'
+                         ' PRIMARY KEY (fingerprint, rules)) WITHOUT ROWID')
+            # (caches created before change flags were recorded)
+            if 'changes' not in (row[1] for row in conn.execute('PRAGMA table_info(cleaned)')):
+                conn.execute('ALTER TABLE cleaned ADD COLUMN changes INTEGER')
+            # results of previous versions of the rules can never be hits again
+            self.purged = conn.execute('DELETE FROM cleaned WHERE rules != ?',
+                                       (self.version,)).rowcount
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=self.timeout)
+
+    def lookup(self, texts):
+        """cached results for the given (uncleaned) texts.
+
+        Returns:
+            list: one entry per text, None if not cached, otherwise a tuple of
+                (pre-exclusion text, verdict or None if unknown,
+                 post-exclusion text or None if unknown/excluded,
+                 change flags of the steps applied)
+        """
+        texts = list(texts)
+        fingerprints = [text_fingerprint(t) for t in texts]
+        found = {}
+        with closing(self._connect()) as conn:
+            for start in range(0, len(fingerprints), _SQL_VARS):
+                batch = fingerprints[start:start + _SQL_VARS]
+                found.update(
+                    (fp, row) for fp, *row in conn.execute(
+                        'SELECT fingerprint, pre_text, verdict, post_text, changes '
+                        'FROM cleaned WHERE rules = ? AND fingerprint IN '
+                        f'({",".join("?" * len(batch))})',
+                        [self.version, *batch]))
+        results = []
+        for text, fp in zip(texts, fingerprints):
+            if fp not in found:
+                results.append(None)
+                continue
+            pre_blob, verdict, post_blob, changes = found[fp]
+            pre_text = _unpack(pre_blob, text)
+            post_text = (_unpack(post_blob, pre_text)
+                         if verdict == '' else None)
+            results.append((pre_text, verdict, post_text, changes or 0))
+        return results
+
+    def store(self, texts, pre_texts, verdicts, post_texts, changes):
+        """records cleaning results (same length iterables). `verdicts` entries
+        are None where unknown (e.g. excluded by a previous run), and
+        `post_texts` entries are None unless the verdict is '' (kept).
+        Results without a verdict do not replace already cached ones."""
+        rows = ((text_fingerprint(text), self.version, _pack(pre, text), verdict,
+                 None if post is None else _pack(post, pre), int(changed))
+                for text, pre, verdict, post, changed
+                in zip(texts, pre_texts, verdicts, post_texts, changes))
+        with closing(self._connect()) as conn:
+            while True:
+                batch = [row for row, __ in zip(rows, range(_BATCH))]
+                if not batch:
+                    break
+                with conn:
+                    conn.executemany(
+                        'INSERT OR REPLACE INTO cleaned VALUES (?, ?, ?, ?, ?, ?)',
+                        (row for row in batch if row[3] is not None))
+                    conn.executemany(
+                        'INSERT OR IGNORE INTO cleaned VALUES (?, ?, ?, ?, ?, ?)',
+                        (row for row in batch if row[3] is None))
+
+    def __len__(self):
+        with closing(self._connect()) as conn:
+            return conn.execute('SELECT COUNT(*) FROM cleaned WHERE rules = ?',
+                                (self.version,)).fetchone()[0]
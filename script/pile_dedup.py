@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+'''
+deduplication of pile texts by content fingerprint.
+
+Instead of hashing (and holding) every full text string, as
+  `df.drop_duplicates(subset='raw')` does, each text is reduced to a 128-bit
+  blake2b fingerprint. Fingerprints are kept in sorted numpy arrays along with
+  the raw ordinal (see `pile_ingest.iter_subset_records()`) of the first text
+  seen with that fingerprint, i.e. 16 + 4 bytes per unique text.
+
+Deduplication across data groups (i.e. across jsonl files/jobs) uses
+  `CorpusDedupStore`, an SQLite database of fingerprints shared by all jobs.
+'''
+import sqlite3
+from contextlib import closing
+from hashlib import blake2b
+from itertools import repeat
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+FINGERPRINT_DTYPE = np.dtype('S16')
+ORDINAL_DTYPE = np.dtype('uint32')
+# texts claimed per write transaction in the corpus-wide store
+_CLAIM_BATCH = 50000
+# max number of `?` parameters in a single SQLite statement (older SQLite: 999)
+_SQL_VARS = 900
+
+
+def text_fingerprint(text: str):
+    return blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+def fingerprint_texts(texts):
+    """array of 128-bit fingerprints (as `S16`) for an iterable of texts"""
+    return np.array([text_fingerprint(t) for t in texts], dtype=FINGERPRINT_DTYPE)
+
+
+class FingerprintStore:
+    """set of text fingerprints, each mapped to the raw ordinal of the first
+    text that had it.
+
+    Fingerprints are held in a few sorted runs (numpy arrays). New fingerprints
+    are added as a new run, and runs are merged whenever the newest run is at
+    least as long as the one before it, so there are only ~log2(n) runs to search.
+    """
+
+    def __init__(self):
+        self._runs = []
+
+    def __len__(self):
+        return sum(len(keys) for keys, __ in self._runs)
+
+    @property
+    def nbytes(self):
+        return sum(keys.nbytes + ordinals.nbytes for keys, ordinals in self._runs)
+
+    def lookup(self, keys: np.ndarray):
+        """raw ordinals stored for the given fingerprints (-1 where not found)"""
+        found = np.full(len(keys), -1, dtype='int64')
+        for run_keys, run_ordinals in self._runs:
+            if not len(run_keys):
+                continue
+            pos = np.searchsorted(run_keys, keys)
+            pos[pos >= len(run_keys)] = 0
+            hit = (run_keys[pos] == keys) & (found < 0)
+            found[hit] = run_ordinals[pos[hit]]
+        return found
+
+    def add(self, keys: np.ndarray, ordinals):
+        """adds fingerprints that are *not* already in the store"""
+        if not len(keys):
+            return
+        order = np.argsort(keys, kind='stable')
+        self._runs.append((keys[order].astype(FINGERPRINT_DTYPE),
+                           np.asarray(ordinals)[order].astype(ORDINAL_DTYPE)))
+        while (len(self._runs) > 1
+               and len(self._runs[-1][0]) >= len(self._runs[-2][0])):
+            (keys_b, ords_b), (keys_a, ords_a) = self._runs.pop(), self._runs.pop()
+            merged_keys = np.concatenate([keys_a, keys_b])
+            order = np.argsort(merged_keys, kind='stable')
+            self._runs.append((merged_keys[order],
+                               np.concatenate([ords_a, ords_b])[order]))
+
+    def dedup(self, keys: np.ndarray, ordinals):
+        """checks a batch of fingerprints (in original order) against the store
+        and against each other, and adds the new ones to the store.
+
+        Returns:
+            tuple: (boolean array, True for the first occurrence of each new text;
+                    array of the raw ordinal each text collapses into, i.e. its own
+                    for first occurrences)
+        """
+        ordinals = np.asarray(ordinals, dtype='int64')
+        if not len(keys):
+            return np.zeros(0, dtype=bool), ordinals
+        unique_keys, first_ix, inverse = np.unique(
+            keys, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        prior = self.lookup(unique_keys)
+        # earlier in store if seen before this batch, otherwise first in batch
+        kept_ordinal = np.where(prior >= 0, prior, ordinals[first_ix])
+        is_new = np.zeros(len(keys), dtype=bool)
+        new_first_ix = first_ix[prior < 0]
+        is_new[new_first_ix] = True
+        self.add(unique_keys[prior < 0], ordinals[new_first_ix])
+        return is_new, kept_ordinal[inverse]
+
+
+def drop_duplicate_texts(df: pd.DataFrame, store: FingerprintStore = None,
+                         text_col: str = 'raw'):
+    """fingerprint based replacement for `df.drop_duplicates(subset='raw')`
+    (keeps first occurrences, in order) that also records what each
+    dropped duplicate collapsed into.
+
+    Args:
+        df (pd.DataFrame): texts in original order with `raw_ordinal` column
+        store (FingerprintStore, optional): fingerprints of texts already kept,
+            e.g. from previous chunks of the same file. Updated in place.
+
+    Returns:
+        tuple: (deduplicated dataframe,
+                dataframe of duplicates: `raw_ordinal`, `duplicate_of` (raw ordinal of kept text))
+    """
+    if store is None:
+        store = FingerprintStore()
+    keys = fingerprint_texts(df[text_col])
+    is_new, kept_ordinal = store.dedup(keys, df.raw_ordinal.to_numpy())
+    dups_df = pd.DataFrame(
+        {'raw_ordinal': df.raw_ordinal.to_numpy()[~is_new],
+         'duplicate_of': kept_ordinal[~is_new]}).astype(ORDINAL_DTYPE)
+    return df.loc[is_new, :], dups_df
+
+
+def get_dups_path(excl_path):
+    """path for duplicates record of a data group, next to its exclusions
+    e.g. `pile_exclusions/pile_00_Pile-CC_excl.pkl.gz`
+        -> `pile_exclusions/pile_00_Pile-CC_dups.pkl.gz`"""
+    return excl_path.with_name(excl_path.name.replace('_excl.', '_dups.'))
+
+
+class CorpusDedupStore:
+    """persistent store of the fingerprints of texts accepted by any data group,
+    shared by every job writing to the same `puddin/` directory
+    (including concurrent SLURM array tasks).
+
+    Held in an SQLite database. Each batch is claimed in a single write
+    transaction, so when two jobs see the same text, whichever commits first
+    owns it and the other sees it as already accepted elsewhere. Claims of texts
+    the owning data group then excludes are released (see `release()`), so
+    that the next data group to see the text can accept it.
+    """
+
+    def __init__(self, db_path: Path, timeout: float = 600):
+        self.db_path = db_path
+        self.timeout = timeout
+        if not db_path.parent.is_dir():
+            db_path.parent.mkdir(parents=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS accepted ('
+                         ' fingerprint BLOB PRIMARY KEY,'
+                         ' text_id TEXT NOT NULL,'
+                         ' data_group TEXT NOT NULL) WITHOUT ROWID')
+            conn.execute('CREATE INDEX IF NOT EXISTS accepted_ids '
+                         'ON accepted (data_group, text_id)')
+
+    def _connect(self):
+        # autocommit mode: transactions are opened explicitly with BEGIN IMMEDIATE
+        return sqlite3.connect(self.db_path, timeout=self.timeout,
+                               isolation_level=None)
+
+    def claim(self, texts, text_ids, data_group: str):
+        """records the given texts as accepted by `data_group`, unless another
+        data group already accepted them.
+
+        Returns:
+            pd.Series: (indexed like `text_ids`) `text_id` of the text accepted
+                by another data group, or <NA> if the text is (now) owned by `data_group`
+        """
+        text_ids = pd.Series(text_ids)
+        fingerprints = [text_fingerprint(t) for t in texts]
+        owners = {}
+        with closing(self._connect()) as conn:
+            for start in range(0, len(fingerprints), _CLAIM_BATCH):
+                batch = fingerprints[start:start + _CLAIM_BATCH]
+                batch_ids = text_ids.iloc[start:start + _CLAIM_BATCH].astype(str)
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    conn.executemany(
+                        'INSERT OR IGNORE INTO accepted VALUES (?, ?, ?)',
+                        zip(batch, batch_ids, repeat(data_group)))
+                    for sub in range(0, len(batch), _SQL_VARS):
+                        lookup = batch[sub:sub + _SQL_VARS]
+                        owners.update(
+                            (fp, (owner_id, owner_group)) for fp, owner_id, owner_group
+                            in conn.execute(
+                                'SELECT fingerprint, text_id, data_group FROM accepted '
+                                f'WHERE fingerprint IN ({",".join("?" * len(lookup))})',
+                                lookup))
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+                conn.execute('COMMIT')
+
+        return pd.Series(
+            [owners[fp][0] if owners[fp][1] != data_group else pd.NA
+             for fp in fingerprints],
+            index=text_ids.index, dtype='string')
+
+    def release(self, text_ids, data_group: str):
+        """removes the claims of `data_group` on the texts with the given ids
+        (texts it excluded after claiming them)
+
+        Returns:
+            int: number of claims removed
+        """
+        text_ids = [str(t) for t in text_ids]
+        released = 0
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for start in range(0, len(text_ids), _SQL_VARS - 1):
+                    batch = text_ids[start:start + _SQL_VARS - 1]
+                    released += conn.execute(
+                        'DELETE FROM accepted WHERE data_group = ? AND '
+                        f'text_id IN ({",".join("?" * len(batch))})',
+                        [data_group] + batch).rowcount
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+        return released
+
+    def __len__(self):
+        with closing(self._connect()) as conn:
+            return conn.execute('SELECT COUNT(*) FROM accepted').fetchone()[0]
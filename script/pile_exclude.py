@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+'''
+exclusion patterns applied by `parse_pile.pull_exclusions()`, and a classifier
+that checks each text against all of them in a single pass.
+
+The rules are `(excl_type, pattern)` pairs in order of precedence: a text
+  is assigned the `excl_type` of the first rule whose pattern it matches
+  (later patterns are not tried), which is the type it got when every pattern
+  was applied to the whole dataframe in turn, and the matching texts dropped
+  before the next pattern.
+
+Each exclusion type is versioned by a hash of its patterns (and flags): the
+  exclusions tables record the version that produced each verdict
+  (`excl_version`), and a record next to them lists the versions the kept
+  texts were checked against (see `get_rules_path()`), so that after editing
+  or adding patterns, only the affected texts need to be checked again
+  (`parse_pile.py --recheck_exclusions`).
+
+Patterns that declare required literals (see `pile_regex_engine`) are only
+  tried on the texts of a batch that contain one of them, found with a
+  vectorized substring check of the whole batch first.
+'''
+import json
+from hashlib import blake2b
+from pathlib import Path
+
+import numpy as np
+
+from pile_normalize import UNK_CHAR_STR
+from pile_regex_engine import compile_pattern
+from pile_regex_imports import (code_regex, defwiki, json_regex, likely_html,
+                                midword_punc_regex, mixed_letter_digit_regex,
+                                underscore_regex, wikipat)
+
+# NOTE: this was applied with `pd.Series.str.contains()`, i.e. as a regex
+#   (so `?` makes the second `_` optional); compiled the same way to keep the results
+unk_char_regex = compile_pattern(UNK_CHAR_STR, literals=['UNK__>'])
+
+# exclusion codes (int8) of the rows of a dataframe in `pull_exclusions()`
+EXCL_PREVIOUS = -1  # excluded by a previous run (already in saved exclusions)
+EXCL_KEPT = 0
+EXCL_KNOWN = 1  # excluded by a known verdict (e.g. from the cleaning cache)
+EXCL_RULE_OFFSET = 2  # + index of the first exclusion rule matched
+
+
+class ExclusionClassifier:
+    """ordered `(excl_type, compiled pattern)` exclusion rules"""
+
+    def __init__(self, *rules):
+        self.rules = rules
+        self.excl_types = tuple(excl_type for excl_type, __ in rules)
+        self.patterns = tuple(pattern for __, pattern in rules)
+        # excl_type: hash of its patterns (in order of precedence)
+        self.versions = {}
+        for excl_type in dict.fromkeys(self.excl_types):
+            digest = blake2b(excl_type.encode('utf-8'), digest_size=8)
+            for rule_type, pattern in rules:
+                if rule_type == excl_type:
+                    digest.update(f'\0{pattern.flags}\0{pattern.pattern}'.encode('utf-8'))
+            self.versions[excl_type] = digest.hexdigest()
+
+    def subset(self, excl_types):
+        """classifier with only the rules of the given exclusion types
+        (in the same order of precedence)"""
+        return ExclusionClassifier(*(rule for rule in self.rules
+                                     if rule[0] in excl_types))
+
+    def __call__(self, texts):
+        """Returns:
+            list: index of the first rule each text matched (-1 = no match)
+        """
+        texts = list(texts)
+        # bit i set = text is a candidate for rule i
+        candidates = np.zeros(len(texts), dtype='uint32')
+        for i, pattern in enumerate(self.patterns):
+            candidates |= pattern.literal_mask(texts).astype('uint32') << np.uint32(i)
+        # unfiltered `search` of the rules to try for each combination of candidate bits
+        searches = tuple(pattern.compiled.search for pattern in self.patterns)
+        plans = {}
+        rule_ix = []
+        for text, bits in zip(texts, candidates.tolist()):
+            if bits not in plans:
+                plans[bits] = tuple((i, search) for i, search in enumerate(searches)
+                                    if bits >> i & 1)
+            for i, search in plans[bits]:
+                if search(text):
+                    rule_ix.append(i)
+                    break
+            else:
+                rule_ix.append(-1)
+        return rule_ix
+
+
+def get_rules_path(excl_path: Path):
+    """path for the record of the rule versions the kept texts of a data group
+    were checked against, next to its exclusions
+    e.g. `pile_exclusions/pile_00_Pile-CC_excl.pkl.gz`
+        -> `pile_exclusions/pile_00_Pile-CC_rules.json`"""
+    return excl_path.with_name(excl_path.name.split('.', 1)[0]
+                               .replace('_excl', '_rules') + '.json')
+
+
+def save_rule_versions(excl_path: Path, versions: dict):
+    get_rules_path(excl_path).write_text(json.dumps(versions, indent=1))
+
+
+def load_rule_versions(excl_path: Path):
+    """excl_type: version of the rules the kept texts were checked against
+    ({} if unknown, i.e. processed before versions were recorded)"""
+    rules_path = get_rules_path(excl_path)
+    return json.loads(rules_path.read_text()) if rules_path.is_file() else {}
+
+
+EXCLUSION_CLASSIFIER = ExclusionClassifier(
+    # uninterpretable/unknown characters (could not be decoded)
+    ('?unk', unk_char_regex),
+    # wikitext/wikimedia formatting
+    ('wiki', defwiki),
+    ('wiki', wikipat),
+    # html source code
+    ('html', likely_html),
+    # technical seeming strings
+    ('json', json_regex),
+    ('code', code_regex),
+    ('_wrd', underscore_regex),
+    ('a0wrd', mixed_letter_digit_regex),
+    ('punc', midword_punc_regex))
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+'''
+content fingerprints of input and intermediate files, used instead of
+modification times to decide whether an output is stale.
+
+A fingerprint is the file size plus a hash of evenly spaced sample blocks
+  (a few milliseconds even for 14G jsonl files), or, with `full=True`,
+  a hash of the whole file. Copying or `touch`ing a file does not change it.
+
+`FileLedger` records, for every output saved by `parse_pile.py`, the
+  fingerprints of the files it was derived from (its sources and all of their
+  recorded sources). Records are keyed by the output's own fingerprint,
+  so they follow a file when it is moved or copied elsewhere, together with
+  the set of source fingerprints: outputs with the same content (e.g. the empty
+  exclusions tables of different data groups) each keep their own record.
+
+`ChunkProgress` records which chunks of a table written in chunks are complete,
+  so an interrupted (e.g. requeued SLURM) job can resume after them.
+'''
+import json
+import sqlite3
+from contextlib import closing
+from hashlib import blake2b
+from pathlib import Path
+
+_SAMPLE_BLOCKS = 16
+_SAMPLE_BLOCK_BYTES = 64 * 1024
+_FULL_READ_BYTES = 16 * 1024**2
+# (resolved path, size, mtime_ns, full) -> fingerprint, for this process
+_CACHE = {}
+
+
+def file_fingerprint(path: Path, full: bool = False):
+    """`[s|f]:[size]:[hash]` fingerprint of a file's content: `s` = sampled blocks
+    (whole content for files of up to `_SAMPLE_BLOCKS` blocks), `f` = full hash"""
+    stat = path.stat()
+    cache_key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns, full)
+    if cache_key in _CACHE:
+        return _CACHE[cache_key]
+
+    size = stat.st_size
+    digest = blake2b(digest_size=16)
+    with path.open(mode='rb') as f:
+        if full or size <= _SAMPLE_BLOCKS * _SAMPLE_BLOCK_BYTES:
+            for block in iter(lambda: f.read(_FULL_READ_BYTES), b''):
+                digest.update(block)
+        else:
+            # first and last blocks always included
+            step = (size - _SAMPLE_BLOCK_BYTES) // (_SAMPLE_BLOCKS - 1)
+            for i in range(_SAMPLE_BLOCKS):
+                f.seek(i * step)
+                digest.update(f.read(_SAMPLE_BLOCK_BYTES))
+    fingerprint = f'{"f" if full else "s"}:{size}:{digest.hexdigest()}'
+    _CACHE[cache_key] = fingerprint
+    return fingerprint
+
+
+class FileLedger:
+    """SQLite record of which source file contents each output was derived from"""
+
+    def __init__(self, db_path: Path, full_hash: bool = False, timeout: float = 600):
+        self.db_path = db_path
+        self.full_hash = full_hash
+        self.timeout = timeout
+        if not db_path.parent.is_dir():
+            db_path.parent.mkdir(parents=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS derivations ('
+                         ' fingerprint TEXT NOT NULL,'
+                         ' ancestors TEXT NOT NULL,'
+                         ' path TEXT,'
+                         ' PRIMARY KEY (fingerprint, ancestors))')
+            # (ledgers of before: one record per fingerprint)
+            if conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                            "AND name = 'derived'").fetchone():
+                conn.execute('INSERT OR IGNORE INTO derivations '
+                             'SELECT fingerprint, ancestors, path FROM derived')
+                conn.execute('DROP TABLE derived')
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=self.timeout)
+
+    def fingerprint(self, path: Path):
+        return file_fingerprint(path, full=self.full_hash)
+
+    def ancestor_sets(self, path: Path):
+        """fingerprints of the recorded sources of a file's content, one set per
+        derivation recorded for it (empty list if not recorded)"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute('SELECT ancestors FROM derivations WHERE fingerprint = ?',
+                                (self.fingerprint(path),)).fetchall()
+        return [set(json.loads(row[0])) for row in rows]
+
+    def record(self, output_path: Path, *source_paths: Path):
+        """records `output_path` (as just saved) as derived from the current
+        content of `source_paths`, and from everything those were derived from
+        (by any of their recorded derivations)"""
+        ancestors = set()
+        for source_path in source_paths:
+            if source_path is None or not Path(source_path).is_file():
+                continue
+            source_path = Path(source_path)
+            ancestors.add(self.fingerprint(source_path))
+            ancestors.update(*self.ancestor_sets(source_path))
+        with closing(self._connect()) as conn, conn:
+            conn.execute('INSERT OR REPLACE INTO derivations VALUES (?, ?, ?)',
+                         (self.fingerprint(output_path),
+                          json.dumps(sorted(ancestors)), str(output_path)))
+
+    def is_current(self, output_path: Path, source_path: Path):
+        """whether the output's content was derived from the current content of
+        `source_path`, either directly/indirectly or as a sibling
+        (e.g. a final & a raw dataframe made from the same jsonl file content),
+        by any derivation recorded for it.
+
+        Returns:
+            bool or None: None if there is no record of `output_path`'s
+                current content (e.g. saved before fingerprints were recorded)
+        """
+        output_sets = self.ancestor_sets(output_path)
+        if not output_sets:
+            return None
+        source_fingerprint = self.fingerprint(source_path)
+        source_sets = [a for a in self.ancestor_sets(source_path) if a]
+        return any(source_fingerprint in output_ancestors
+                   or any(a <= output_ancestors for a in source_sets)
+                   for output_ancestors in output_sets)
+
+
+class ChunkProgress:
+    """small JSON ledger (`progress.json` in a table's chunk directory) of the
+    chunks completed so far, plus any `info` needed to resume (e.g. chunk sizes).
+    Progress only carries over while `key` (what the chunks are made from and
+    how, e.g. input fingerprint and chunk size) is unchanged; otherwise
+    (`resumed` is False) it starts over. The ledger is replaced atomically,
+    so a chunk is only ever recorded after its files were saved."""
+
+    def __init__(self, chunk_dir: Path, key: dict):
+        self.path = chunk_dir.joinpath('progress.json')
+        # (round trip, to compare with what was read from file)
+        self.key = json.loads(json.dumps(key))
+        try:
+            record = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            record = {}
+        self.resumed = record.get('key') == self.key
+        self.done = set(record.get('done', ())) if self.resumed else set()
+        self.info = record.get('info', {}) if self.resumed else {}
+        if not chunk_dir.is_dir():
+            chunk_dir.mkdir(parents=True)
+
+    def _save(self):
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        tmp_path.write_text(json.dumps({'key': self.key, 'info': self.info,
+                                        'done': sorted(self.done)}))
+        tmp_path.replace(self.path)
+
+    def restart(self):
+        self.done = set()
+        self.info = {}
+        self._save()
+
+    def set_info(self, **info):
+        self.info.update(info)
+        self._save()
+
+    def mark_done(self, chunk_num: int):
+        self.done.add(chunk_num)
+        self._save()
@@ -0,0 +1,519 @@
+# -*- coding: utf-8 -*-
+'''
+functions for reading texts out of the pile's original jsonlines data files.
+
+Everything here works on a stream of records so that `parse_pile.py` can
+  build its dataframes either all at once (default) or one chunk at a time
+  (`--chunk_rows`/`--max_mem`). Inputs can be plain `.jsonl` files or
+  `.jsonl.zst`/`.jsonl.gz` files as distributed, which are decompressed
+  as they are read (`.zst` requires the `zstandard` package).
+'''
+import gzip
+import json
+from hashlib import blake2b
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from queue import Queue
+from threading import Thread
+
+import jsonlines
+import numpy as np
+import pandas as pd
+
+# rough multiple of a chunk's text size held in memory while it is cleaned:
+#   `raw` + `text` + `orig_df` copies, intermediate `apply` results,
+#   exclusion frames, and python `str` object overhead
+_CLEANING_MEM_FACTOR = 12
+_BYTES_PER_GB = 1024**3
+# size of the byte ranges read by each worker when reading in parallel
+_READ_RANGE_BYTES = 64 * 1024**2
+# amount of (decompressed) data read at a time when streaming
+_READ_BLOCK_BYTES = 4 * 1024**2
+# decompressed blocks kept ready by the background decompression thread
+_PREFETCH_BLOCKS = 4
+JSONL_SUFFIXES = ('.jsonl', '.jsonl.zst', '.jsonl.gz')
+# sidecar index: one fixed size record per jsonl record (i.e. per non-blank line)
+INDEX_SUFFIX = '.idx'
+INDEX_DTYPE = np.dtype([('offset', '<u8'),   # (decompressed) byte offset of line
+                        ('length', '<u4'),   # line length in bytes, without `\n`
+                        ('set_code', 'u1'),  # position of pile_set_name in `set_names`
+                        ('hash', '<u8')])    # 64-bit blake2b digest of line bytes
+_UTF8_BOM = b'\xef\xbb\xbf'
+_SUBSET_KEY = b'"pile_set_name": '
+_SUBSET_KEY_STR = _SUBSET_KEY + b'"'
+
+
+def iter_subset_texts(raw_fpath: Path, selected_subset: str,
+                      prefilter: bool = True, workers: int = 1):
+    """yields the text of every record in a `.jsonl` (or `.jsonl.zst`/`.jsonl.gz`)
+    file belonging to the selected pile subset, in file order.
+    (See `iter_subset_records()`.)"""
+    for __, text in iter_subset_records(raw_fpath, selected_subset,
+                                        prefilter=prefilter, workers=workers):
+        yield text
+
+
+def iter_subset_records(raw_fpath: Path, selected_subset: str,
+                        prefilter: bool = True, workers: int = 1):
+    """yields `(raw_ordinal, text)` for every record in a `.jsonl`
+    (or `.jsonl.zst`/`.jsonl.gz`) file belonging to the selected pile subset,
+    in file order. `raw_ordinal` is the position of the record among all
+    records (i.e. non-blank lines) in the file, starting at 0, which is also
+    its position in the file's sidecar index (see `build_jsonl_index()`).
+
+    With `prefilter`, the raw bytes of each line are checked for the subset's
+    `"pile_set_name": "<subset>"` marker first, and only candidate lines
+    (or lines where the check is inconclusive) are JSON decoded.
+    With `workers` > 1, lines are decoded and filtered in a process pool;
+    uncompressed files are split into byte ranges (aligned on line breaks),
+    compressed files are decompressed by a background thread and handed to the
+    pool in blocks. Either way, records are still yielded in file order.
+    """
+    for raw_ordinal, __, text in iter_routed_records(
+            raw_fpath, (selected_subset,), prefilter=prefilter, workers=workers):
+        yield raw_ordinal, text
+
+
+def iter_routed_records(raw_fpath: Path, selected_subsets,
+                        prefilter: bool = True, workers: int = 1):
+    """like `iter_subset_records()`, but for any of several pile subsets,
+    so that the file is read and decoded only once for all of them.
+
+    Yields:
+        tuple: `(raw_ordinal, pile_set_name, text)` in file order
+    """
+    selected_subsets = tuple(selected_subsets)
+    compressed = is_compressed(raw_fpath)
+    if workers > 1:
+        if compressed:
+            results = _iter_blocks_parallel(raw_fpath, selected_subsets, prefilter, workers)
+        else:
+            results = _iter_ranges_parallel(raw_fpath, selected_subsets, prefilter, workers)
+
+    elif not prefilter and not compressed:
+        with raw_fpath.open(encoding='utf-8-sig', mode='r') as jlf:
+            jlreader = jsonlines.Reader(jlf)
+            for raw_ordinal, d in enumerate(jlreader.iter()):
+                if d['meta']['pile_set_name'] in selected_subsets:
+                    yield raw_ordinal, d['meta']['pile_set_name'], d['text']
+        return
+
+    else:
+        results = (route_lines(lines, selected_subsets, prefilter)
+                   for lines in iter_line_blocks(raw_fpath))
+
+    # ordinals in each result are relative to the start of its block/range
+    offset = 0
+    for n_records, records in results:
+        for local_ordinal, pile_set_name, text in records:
+            yield offset + local_ordinal, pile_set_name, text
+        offset += n_records
+
+
+def is_jsonl_path(path: Path):
+    return path.name.endswith(JSONL_SUFFIXES)
+
+
+def is_compressed(path: Path):
+    return path.suffix in ('.zst', '.gz')
+
+
+def jsonl_stem(path: Path):
+    """file name without jsonl (and compression) extensions; i.e. the data group.
+    e.g. `train/00.jsonl.zst` -> `00`"""
+    for suffix in sorted(JSONL_SUFFIXES, key=len, reverse=True):
+        if path.name.endswith(suffix):
+            return path.name[:-len(suffix)]
+    return path.stem
+
+
+def open_jsonl(raw_fpath: Path):
+    """opens a (possibly compressed) jsonl file as a binary stream
+    of the decompressed data"""
+    if raw_fpath.suffix == '.zst':
+        try:
+            import zstandard
+        except ImportError:
+            sys.exit('Error: the `zstandard` package is required to read '
+                     f'`.zst` compressed input ({raw_fpath}).')
+        # the pile's shards were compressed with a long window
+        dctx = zstandard.ZstdDecompressor(max_window_size=2**31)
+        return dctx.stream_reader(raw_fpath.open(mode='rb'),
+                                  read_across_frames=True, closefd=True)
+    if raw_fpath.suffix == '.gz':
+        return gzip.open(raw_fpath, mode='rb')
+    return raw_fpath.open(mode='rb')
+
+
+def iter_line_blocks(raw_fpath: Path, block_bytes: int = _READ_BLOCK_BYTES,
+                     with_offsets: bool = False):
+    """yields lists of complete lines (as bytes) read from a (possibly compressed)
+    jsonl file, about `block_bytes` of (decompressed) data at a time.
+    With `with_offsets`, yields `(offset, lines)`, where `offset` is the
+    (decompressed) byte offset of the first line in the block.
+    For compressed files, decompression runs ahead in a background thread."""
+    blocks = _iter_stream_line_blocks(raw_fpath, block_bytes)
+    if is_compressed(raw_fpath):
+        blocks = _prefetch(blocks, _PREFETCH_BLOCKS)
+    for offset, lines in blocks:
+        yield (offset, lines) if with_offsets else lines
+
+
+def _iter_stream_line_blocks(raw_fpath: Path, block_bytes: int):
+    with open_jsonl(raw_fpath) as stream:
+        remainder = stream.read(len(_UTF8_BOM))
+        offset = 0
+        if remainder == _UTF8_BOM:
+            remainder = b''
+            offset = len(_UTF8_BOM)
+        while True:
+            block = stream.read(block_bytes)
+            if not block:
+                break
+            block = remainder + block
+            lines = block.split(b'\n')
+            remainder = lines.pop()
+            yield offset, lines
+            offset += len(block) - len(remainder)
+        if remainder:
+            yield offset, [remainder]
+
+
+def _prefetch(iterable, max_buffered: int):
+    """iterates over `iterable` in a background thread,
+    keeping up to `max_buffered` items ready"""
+    buffer = Queue(maxsize=max_buffered)
+    done = object()
+
+    def _fill():
+        try:
+            for item in iterable:
+                buffer.put(item)
+        except BaseException as e:  # pylint: disable=broad-except
+            buffer.put(e)
+        buffer.put(done)
+
+    Thread(target=_fill, daemon=True).start()
+    while True:
+        item = buffer.get()
+        if item is done:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+def route_lines(lines, selected_subsets: tuple, prefilter: bool = True):
+    """selects records of any of the given subsets from a list of raw jsonl lines (bytes).
+
+    Returns:
+        tuple: (number of records in `lines`,
+                list of `(ordinal within lines, pile_set_name, text)` for selected records)
+    """
+    markers = tuple(marker for subset in selected_subsets
+                    for marker in subset_markers(subset))
+    records = []
+    n_records = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        n_records += 1
+        if prefilter and not _line_could_match(line, markers):
+            continue
+        d = json.loads(line)
+        pile_set_name = d['meta']['pile_set_name']
+        if pile_set_name in selected_subsets:
+            records.append((n_records - 1, pile_set_name, d['text']))
+    return n_records, records
+
+
+def _iter_ranges_parallel(raw_fpath: Path, selected_subsets: tuple,
+                          prefilter: bool, workers: int):
+    jobs = ((_read_range_texts, raw_fpath, start, end, selected_subsets, prefilter)
+            for start, end in get_byte_ranges(raw_fpath, _READ_RANGE_BYTES))
+    yield from _iter_ordered_results(jobs, workers)
+
+
+def _iter_blocks_parallel(raw_fpath: Path, selected_subsets: tuple,
+                          prefilter: bool, workers: int):
+    jobs = ((route_lines, lines, selected_subsets, prefilter)
+            for lines in iter_line_blocks(raw_fpath, _READ_RANGE_BYTES))
+    yield from _iter_ordered_results(jobs, workers)
+
+
+def _iter_ordered_results(jobs, workers: int):
+    """runs `(function, *args)` jobs in a process pool and yields each
+    job's result in job order. Only a few jobs ahead of the one
+    being consumed are submitted, so memory use stays bounded."""
+    max_pending = workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for func, *args in jobs:
+            pending.append(executor.submit(func, *args))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def get_byte_ranges(raw_fpath: Path, range_bytes: int = _READ_RANGE_BYTES,
+                    n_ranges: int = None):
+    """splits a file into consecutive (start, end) byte ranges of about
+    `range_bytes` bytes each, or into `n_ranges` ranges. Every boundary
+    falls just after a line break, so no line is split between ranges."""
+    size = raw_fpath.stat().st_size
+    if n_ranges is None:
+        n_ranges = max(1, -(-size // range_bytes))
+    boundaries = [0]
+    with raw_fpath.open(mode='rb') as f:
+        for i in range(1, n_ranges):
+            target = max(size * i // n_ranges, boundaries[-1])
+            f.seek(target)
+            f.readline()
+            boundary = min(f.tell(), size)
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+    if boundaries[-1] < size:
+        boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def _read_range_texts(raw_fpath: Path, start: int, end: int,
+                      selected_subsets: tuple, prefilter: bool):
+    with raw_fpath.open(mode='rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    if start == 0 and data.startswith(_UTF8_BOM):
+        data = data[len(_UTF8_BOM):]
+    return route_lines(data.split(b'\n'), selected_subsets, prefilter)
+
+
+def subset_markers(selected_subset: str):
+    """bytes for the `pile_set_name` key/value pair of the given subset,
+    as they are formatted in the pile's jsonl files (non-ASCII characters
+    escaped, or as UTF-8)"""
+    return tuple(dict.fromkeys(
+        _SUBSET_KEY + json.dumps(selected_subset, ensure_ascii=ensure_ascii).encode('utf-8')
+        for ensure_ascii in (True, False)))
+
+
+def _line_could_match(line: bytes, markers: tuple):
+    """False only if the raw line certainly belongs to a subset other than
+    those of the given marker(s).
+
+    An unescaped `"` cannot occur inside a JSON string, so the key in its
+    usual format (`"pile_set_name": "`) can only be the actual metadata key.
+    If it is there without any of the markers, the record is for another subset,
+    unless its value has escapes (e.g. `"\\u0050ile-CC"`). Any other formatting
+    is inconclusive and the line must be decoded.
+    """
+    if any(marker in line for marker in markers):
+        return True
+    key_pos = line.find(_SUBSET_KEY_STR)
+    if key_pos < 0:
+        return True
+    value_start = key_pos + len(_SUBSET_KEY_STR)
+    return b'\\' in line[value_start:line.find(b'"', value_start)]
+
+
+def iter_routed_chunks(routed_records, chunk_rows: int = 0, chunk_chars: int = 0):
+    """groups an iterable of routed `(raw_ordinal, pile_set_name, text)` records
+    into chunks bounded by the number of texts, the total number of characters,
+    or both. Each subset's records are buffered separately, so that every chunk
+    holds records of a single subset (still in original order within the subset).
+    Up to one chunk per subset is buffered at once.
+
+    Args:
+        routed_records (iterable): records in original order
+        chunk_rows (int, optional): max texts per chunk. 0 = no limit.
+        chunk_chars (int, optional): max total characters per chunk. 0 = no limit.
+            (A single text longer than the limit gets a chunk to itself.)
+
+    Yields:
+        tuple: (pile_set_name, list of consecutive `(raw_ordinal, text)` records)
+    """
+    buffers = {}
+    for raw_ordinal, pile_set_name, text in routed_records:
+        chunk, chunk_size = buffers.get(pile_set_name, ([], 0))
+        if chunk and ((chunk_rows and len(chunk) >= chunk_rows)
+                      or (chunk_chars and chunk_size + len(text) > chunk_chars)):
+            yield pile_set_name, chunk
+            chunk, chunk_size = [], 0
+        chunk.append((raw_ordinal, text))
+        buffers[pile_set_name] = (chunk, chunk_size + len(text))
+
+    for pile_set_name, (chunk, __) in buffers.items():
+        if chunk:
+            yield pile_set_name, chunk
+
+
+def mem_budget_to_chunk_chars(max_mem_gb: float):
+    """converts a memory budget (in GB) for cleaning into
+    the number of text characters that can be loaded per chunk"""
+    if not max_mem_gb:
+        return 0
+    return max(1, int(max_mem_gb * _BYTES_PER_GB / _CLEANING_MEM_FACTOR))
+
+
+def get_chunk_dir(table_fpath: Path):
+    """returns the directory that holds the chunk files of a table
+    written in chunked mode, e.g.
+    `pile_tables/raw/pile_00_Pile-CC_df.pkl.gz`
+        -> `pile_tables/raw/pile_00_Pile-CC_df.chunks/`"""
+    return table_fpath.with_name(table_fpath.name.split('.', 1)[0] + '.chunks')
+
+
+def get_chunk_path(table_fpath: Path, chunk_num: int):
+    return get_chunk_dir(table_fpath).joinpath(
+        f'chunk-{str(chunk_num).zfill(4)}.pkl.gz')
+
+
+def table_exists(table_fpath: Path):
+    """True if a table was saved either as a single file or in chunks"""
+    return table_fpath.is_file() or any(get_chunk_dir(table_fpath).glob('chunk-*'))
+
+
+def iter_table(table_fpath: Path):
+    """yields the dataframe(s) of a table saved either as a single `.pkl.gz` file
+    or (from chunked preprocessing) as chunk files in a `*.chunks/` dir, in
+    order, one at a time (nothing if the table does not exist)"""
+    if table_fpath.is_file():
+        yield pd.read_pickle(table_fpath)
+        return
+    for chunk_path in sorted(get_chunk_dir(table_fpath).glob('chunk-*')):
+        yield pd.read_pickle(chunk_path)
+
+
+def read_table(table_fpath: Path):
+    """loads a dataframe saved either as a single `.pkl.gz` file
+    or (from chunked preprocessing) as chunk files in a `*.chunks/` dir"""
+    if table_fpath.is_file():
+        return pd.read_pickle(table_fpath)
+    return pd.concat(iter_table(table_fpath))
+
+
+def get_index_path(raw_fpath: Path):
+    """e.g. `train/00.jsonl.zst` -> `train/00.jsonl.zst.idx`"""
+    return raw_fpath.with_name(raw_fpath.name + INDEX_SUFFIX)
+
+
+def build_jsonl_index(raw_fpath: Path, index_path: Path = None):
+    """streams a (possibly compressed) jsonl file once and saves a sidecar
+    index with the byte offset, length, pile set code and content hash of
+    each record (in `INDEX_DTYPE`), so records can later be read by raw ordinal
+    without reading the whole file (see `read_records()`).
+
+    Returns:
+        Path: path of saved index
+    """
+    index_path = index_path or get_index_path(raw_fpath)
+    set_codes = {}
+    index_blocks = []
+    for offset, lines in iter_line_blocks(raw_fpath, with_offsets=True):
+        block_index = np.zeros(len(lines), dtype=INDEX_DTYPE)
+        n_records = 0
+        for line in lines:
+            if line.strip():
+                set_name = _line_set_name(line)
+                if set_name not in set_codes:
+                    set_codes[set_name] = len(set_codes)
+                block_index[n_records] = (
+                    offset, len(line), set_codes[set_name], _line_hash(line))
+                n_records += 1
+            offset += len(line) + 1
+        index_blocks.append(block_index[:n_records])
+
+    index = (np.concatenate(index_blocks) if index_blocks
+             else np.zeros(0, dtype=INDEX_DTYPE))
+    # written to file object so numpy does not add a `.npz` extension
+    with index_path.open(mode='wb') as f:
+        np.savez(f, records=index,
+                 set_names=np.array(list(set_codes), dtype=str),
+                 source_size=np.array([raw_fpath.stat().st_size], dtype='<u8'))
+    return index_path
+
+
+def load_jsonl_index(raw_fpath: Path, index_path: Path = None):
+    """loads the sidecar index of a jsonl file.
+
+    Returns:
+        tuple: (structured array of `INDEX_DTYPE` records, list of pile set names)
+            or (None, None) if there is no index or it does not match the file size.
+    """
+    index_path = index_path or get_index_path(raw_fpath)
+    if not index_path.is_file():
+        return None, None
+    with np.load(index_path) as loaded:
+        if int(loaded['source_size'][0]) != raw_fpath.stat().st_size:
+            print(f'WARNING: index {index_path} is out of date. Ignoring.')
+            return None, None
+        return loaded['records'], loaded['set_names'].tolist()
+
+
+def subset_ordinals(index, set_names, selected_subset: str):
+    """raw ordinals of all records of the given pile subset"""
+    if selected_subset not in set_names:
+        return np.zeros(0, dtype='<u8')
+    return np.flatnonzero(index['set_code'] == set_names.index(selected_subset))
+
+
+def read_records(raw_fpath: Path, ordinals, index=None):
+    """reads and decodes the records at the given raw ordinals (in the given order)
+    using the file's sidecar index. Uncompressed files are read by seeking
+    directly to each record; compressed files are streamed once, up to the
+    last requested record.
+    """
+    if index is None:
+        index, __ = load_jsonl_index(raw_fpath)
+        if index is None:
+            raise FileNotFoundError(
+                f'No (current) index for {raw_fpath}. Run `build_jsonl_index()` first.')
+    ordinals = [int(o) for o in ordinals]
+    lines = {}
+    if is_compressed(raw_fpath):
+        position = 0
+        with open_jsonl(raw_fpath) as stream:
+            for ordinal in sorted(set(ordinals), key=lambda o: index['offset'][o]):
+                entry = index[ordinal]
+                _skip_bytes(stream, int(entry['offset']) - position)
+                lines[ordinal] = stream.read(int(entry['length']))
+                position = int(entry['offset']) + int(entry['length'])
+    else:
+        with raw_fpath.open(mode='rb') as f:
+            for ordinal in set(ordinals):
+                entry = index[ordinal]
+                f.seek(int(entry['offset']))
+                lines[ordinal] = f.read(int(entry['length']))
+
+    records = []
+    for ordinal in ordinals:
+        line = lines[ordinal]
+        if _line_hash(line) != int(index['hash'][ordinal]):
+            raise ValueError(f'Record {ordinal} of {raw_fpath} does not match its index '
+                             '(file changed?). Rebuild the index.')
+        records.append(json.loads(line))
+    return records
+
+
+def _skip_bytes(stream, n_bytes: int):
+    while n_bytes > 0:
+        skipped = len(stream.read(min(n_bytes, _READ_BLOCK_BYTES)))
+        if not skipped:
+            break
+        n_bytes -= skipped
+
+
+def _line_set_name(line: bytes):
+    start = line.find(_SUBSET_KEY_STR)
+    if start >= 0:
+        start += len(_SUBSET_KEY)
+        end = line.find(b'"', start + 1)
+        if end > 0 and line[end - 1:end] != b'\\':
+            return json.loads(line[start:end + 1])
+    return json.loads(line)['meta']['pile_set_name']
+
+
+def _line_hash(line: bytes):
+    return int.from_bytes(blake2b(line, digest_size=8).digest(), 'little')
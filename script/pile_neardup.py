@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+'''
+near-duplicate detection for (cleaned) pile texts with MinHash & LSH.
+
+Each text is reduced to a set of word shingles (`shingle_words` consecutive
+  words), and to a MinHash signature of `num_perm` 32-bit values: the fraction
+  of equal values in two signatures estimates the Jaccard similarity of the
+  texts' shingle sets. Signatures are split into bands (locality sensitive
+  hashing), and only texts sharing at least one band are compared.
+
+Signatures of the texts kept by a data group are saved
+  (`[DESTINATION]/puddin/neardup/pile_[group]_[subset]_minhash.npz`)
+  so that texts of later data groups are also compared against them.
+  Data groups cleaned in chunks save them per chunk instead
+  (`pile_[group]_[subset]_minhash.chunks/chunk-0001.npz`, ...), as each chunk
+  is done, and each chunk is compared against those of the earlier chunks.
+'''
+import re
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+SIGNATURE_DTYPE = np.dtype('uint32')
+BAND_KEY_DTYPE = np.dtype('uint64')
+SIGNATURES_SUFFIX = '_minhash.npz'
+_WORD_RE = re.compile(r'\w+')
+# shingle hashes processed per vectorized batch (batch array: n x num_perm x 8 bytes)
+_BATCH_SHINGLES = 2**18
+
+
+def lsh_bands(threshold: float, num_perm: int):
+    """number of bands for `num_perm` signature values (bands x rows = num_perm),
+    chosen so that the LSH "S-curve" threshold, (1/bands)^(1/rows),
+    is as close as possible to `threshold` without exceeding it
+    (candidates are verified against `threshold` afterwards)"""
+    below = [((1 / b) ** (b / num_perm), b)
+             for b in range(1, num_perm + 1) if not num_perm % b]
+    below = [(t, b) for t, b in below if t <= threshold]
+    return max(below)[1] if below else num_perm
+
+
+class MinHashLSH:
+    """MinHash signatures and LSH candidate matching for a Jaccard `threshold`"""
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64,
+                 shingle_words: int = 5, seed: int = 1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_words = shingle_words
+        self.bands = lsh_bands(threshold, num_perm)
+        self.rows = num_perm // self.bands
+        rng = np.random.default_rng(seed)
+        # multiply-shift hash functions: (a*x + b mod 2^64) >> 32, a odd
+        self._perm_a = rng.integers(1, 2**63, num_perm, dtype='uint64') | np.uint64(1)
+        self._perm_b = rng.integers(0, 2**63, num_perm, dtype='uint64')
+        self._band_mult = rng.integers(1, 2**63, self.rows, dtype='uint64') | np.uint64(1)
+
+    def shingle_hashes(self, text: str):
+        """64-bit hashes of the word shingles of a text"""
+        words = np.fromiter((zlib.crc32(w.encode('utf-8'))
+                             for w in _WORD_RE.findall(text.lower())),
+                            dtype='uint64')
+        if not len(words):
+            # no words at all: one shingle for the whole text
+            return np.array([zlib.crc32(text.encode('utf-8'))], dtype='uint64')
+        width = min(self.shingle_words, len(words))
+        n_shingles = len(words) - width + 1
+        hashes = np.zeros(n_shingles, dtype='uint64')
+        for i in range(width):
+            hashes = hashes * np.uint64(1000003) + words[i:i + n_shingles]
+        return hashes
+
+    def signatures(self, texts):
+        """MinHash signatures (n texts x `num_perm`) computed in vectorized batches"""
+        texts = list(texts)
+        sigs = np.empty((len(texts), self.num_perm), dtype=SIGNATURE_DTYPE)
+        start = 0
+        while start < len(texts):
+            batch, n_shingles = [], 0
+            while start + len(batch) < len(texts) and (
+                    not batch or n_shingles < _BATCH_SHINGLES):
+                batch.append(self.shingle_hashes(texts[start + len(batch)]))
+                n_shingles += len(batch[-1])
+            offsets = np.cumsum([0] + [len(h) for h in batch[:-1]])
+            hashed = ((np.concatenate(batch)[:, None] * self._perm_a + self._perm_b)
+                      >> np.uint64(32)).astype(SIGNATURE_DTYPE)
+            sigs[start:start + len(batch)] = np.minimum.reduceat(hashed, offsets, axis=0)
+            start += len(batch)
+        return sigs
+
+    def band_keys(self, sigs: np.ndarray):
+        """one 64-bit key per band of each signature (n texts x `bands`)"""
+        banded = sigs.reshape(len(sigs), self.bands, self.rows).astype(BAND_KEY_DTYPE)
+        return (banded * self._band_mult).sum(axis=2, dtype=BAND_KEY_DTYPE)
+
+    def similarity(self, sigs_a: np.ndarray, sigs_b: np.ndarray):
+        """estimated Jaccard similarity of paired signatures (rows of a & b)"""
+        return (sigs_a == sigs_b).mean(axis=1)
+
+    def match_saved(self, sigs: np.ndarray, keys: np.ndarray,
+                    saved_sigs: np.ndarray, saved_keys: np.ndarray):
+        """best match of each text among previously saved signatures.
+
+        Returns:
+            tuple: (index of the most similar saved text at or above `threshold`,
+                    -1 if none; its estimated similarity)
+        """
+        best_ix = np.full(len(sigs), -1, dtype='int64')
+        best_sim = np.zeros(len(sigs), dtype='float32')
+        if not len(sigs) or not len(saved_sigs):
+            return best_ix, best_sim
+        for band in range(self.bands):
+            order = np.argsort(saved_keys[:, band], kind='stable')
+            sorted_keys = saved_keys[order, band]
+            lo = np.searchsorted(sorted_keys, keys[:, band], side='left')
+            hi = np.searchsorted(sorted_keys, keys[:, band], side='right')
+            counts = hi - lo
+            if not counts.any():
+                continue
+            # expand to (text, saved text) candidate pairs
+            cand_text = np.repeat(np.arange(len(sigs)), counts)
+            cand_saved = order[np.repeat(lo, counts)
+                               + (np.arange(counts.sum())
+                                  - np.repeat(np.cumsum(counts) - counts, counts))]
+            sim = self.similarity(sigs[cand_text], saved_sigs[cand_saved])
+            better = (sim >= self.threshold) & (sim > best_sim[cand_text])
+            # highest similarity per text is written last
+            by_sim = np.argsort(sim[better], kind='stable')
+            best_ix[cand_text[better][by_sim]] = cand_saved[better][by_sim]
+            best_sim[cand_text[better][by_sim]] = sim[better][by_sim]
+        return best_ix, best_sim
+
+    def match_within(self, sigs: np.ndarray, keys: np.ndarray, skip=None):
+        """compares texts (in order) to the earlier texts of the same batch that
+        were kept, i.e. the first text of a group of near-duplicates is kept.
+
+        Args:
+            skip (np.ndarray, optional): boolean mask of texts already excluded
+                (neither checked nor kept)
+
+        Returns:
+            tuple: (index of the kept text each near-duplicate matched, -1 if none;
+                    its estimated similarity)
+        """
+        best_ix = np.full(len(sigs), -1, dtype='int64')
+        best_sim = np.zeros(len(sigs), dtype='float32')
+        buckets = [{} for __ in range(self.bands)]
+        for i, row_keys in enumerate(keys.tolist()):
+            if skip is not None and skip[i]:
+                continue
+            candidates = {j for band, key in enumerate(row_keys)
+                          for j in buckets[band].get(key, ())}
+            if candidates:
+                candidates = np.fromiter(candidates, dtype='int64', count=len(candidates))
+                sim = self.similarity(sigs[candidates], sigs[i])
+                if sim.max() >= self.threshold:
+                    best_ix[i] = candidates[sim.argmax()]
+                    best_sim[i] = sim.max()
+                    continue
+            for band, key in enumerate(row_keys):
+                buckets[band].setdefault(key, []).append(i)
+        return best_ix, best_sim
+
+    def save(self, path: Path, text_ids, sigs: np.ndarray, keys: np.ndarray):
+        """saves the signatures of kept texts (replacing any previous save)"""
+        if not path.parent.is_dir():
+            path.parent.mkdir(parents=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with tmp_path.open('wb') as f:
+            np.savez(f, text_id=np.asarray(text_ids, dtype=str),
+                     signatures=sigs, band_keys=keys,
+                     params=np.array([self.num_perm, self.shingle_words, self.bands]))
+        tmp_path.replace(path)
+
+    def load(self, path: Path):
+        """previously saved signatures, if computed with the same parameters
+
+        Returns:
+            tuple: (text ids, signatures, band keys) or (None, None, None)
+        """
+        with np.load(path) as saved:
+            if saved['params'].tolist() != [self.num_perm, self.shingle_words, self.bands]:
+                return None, None, None
+            return saved['text_id'], saved['signatures'], saved['band_keys']
+
+
+def get_signatures_path(sig_dir: Path, df_path: Path):
+    """e.g. `pile_tables/pile_00_Pile-CC_df.pkl.gz` -> `[sig_dir]/pile_00_Pile-CC_minhash.npz`"""
+    stem = df_path.name.split('.', 1)[0].rsplit('_', 1)[0]
+    return sig_dir.joinpath(stem + SIGNATURES_SUFFIX)
+
+
+def get_signatures_chunk_path(sig_dir: Path, df_path: Path, chunk_num: int):
+    """e.g. `pile_tables/pile_00_Pile-CC_df.pkl.gz`, 1
+        -> `[sig_dir]/pile_00_Pile-CC_minhash.chunks/chunk-0001.npz`"""
+    own_path = get_signatures_path(sig_dir, df_path)
+    return own_path.with_suffix('.chunks').joinpath(f'chunk-{str(chunk_num).zfill(4)}.npz')
+
+
+def get_saved_signature_paths(sig_dir: Path, df_path: Path):
+    """saved signatures of the *other* data groups of the same subset
+    (whole data groups, and chunks of data groups cleaned in chunks)"""
+    own_path = get_signatures_path(sig_dir, df_path)
+    subset = own_path.name[:-len(SIGNATURES_SUFFIX)].split('_', 2)[2]
+    return sorted(p for p in (list(sig_dir.glob(f'pile_*_{subset}{SIGNATURES_SUFFIX}'))
+                              + list(sig_dir.glob(f'pile_*_{subset}_minhash.chunks/chunk-*.npz')))
+                  if own_path not in (p, p.parent.with_suffix('.npz')))
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+'''
+text normalization steps applied by `parse_pile.clean_df()`, and an engine
+to run them over a series of texts either serially or in a process pool.
+
+The steps are plain module level functions (`str` -> `str`) composed into
+  `TextPipeline`s, which apply all of their steps to each text in a single pass.
+  Pipelines can be sent to worker processes, which only need to import this
+  module (not `parse_pile.py` with `stanza`). Texts are split into consecutive
+  chunks, every chunk goes through the pipeline in one worker, and the
+  results are put back together in the original order, so the output is the
+  same as that of running the pipeline serially.
+
+Every step has its own bit in a per-text `uint16` "changed by" flag
+  (`CHANGE_FLAGS`), set when the step changed the text; the flags of all
+  cleaning steps are saved with the texts (`text_changes` column).
+'''
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from unidecode import unidecode
+
+from pile_regex_imports import (bracket_url, end_of_line_abbr, likely_url,
+                                missing_space_regex, punc_only)
+
+UNK_CHAR_STR = '<__?UNK__>'
+DEFAULT_CHUNK_ROWS = 10000
+
+
+class _CodepointTable(dict):
+    """`str.translate()` table of codepoint -> ASCII transliteration, filled in
+    the first time each codepoint is looked up (i.e. holds only the characters
+    seen so far by this process). `unidecode` transliterates character by
+    character, so translating with this table gives the same result, including
+    `UNK_CHAR_STR` for characters without a transliteration."""
+
+    def __missing__(self, codepoint):
+        repl = self[codepoint] = unidecode(chr(codepoint), errors='replace',
+                                           replace_str=UNK_CHAR_STR)
+        return repl
+
+
+_CODEPOINT_TABLE = _CodepointTable()
+
+
+def translate_encoding(text: str):
+    # `str.isascii()` checks a flag of the string object: no scan, no copy
+    if text.isascii():
+        return text
+    return text.translate(_CODEPOINT_TABLE)
+
+
+def remove_urls(text: str):
+    return likely_url.sub(r' ', bracket_url.sub(r'\1', text))
+
+
+def add_missing_spaces(text: str):
+    return missing_space_regex.sub(r'\1\3 \2\4', text)
+
+
+def break_punc_lines(text: str):
+    return punc_only.sub(r'\1\2\3\4\5\6\7\n\n', text)
+
+
+def fix_line_end_abbr(text: str):
+    return end_of_line_abbr.sub(r'\1\2\5\6 \3\4', text)
+
+
+class TextPipeline:
+    """declarative sequence of `(label, function)` normalization steps that are
+    applied to one text after another in a single pass: each text goes through
+    all the steps before the next text is started, and only the final result
+    of each text is kept. Which steps changed each text (bits from `first_bit`
+    on, one per step) and the time spent on each step are recorded along the way."""
+
+    def __init__(self, *steps, first_bit: int = 0):
+        self.labels = tuple(label for label, __ in steps)
+        self.funcs = tuple(func for __, func in steps)
+        self.bits = tuple(1 << (first_bit + i) for i in range(len(steps)))
+        self.mask = sum(self.bits)
+
+    def __call__(self, texts):
+        """Returns:
+            tuple: (list of normalized texts, list of change flags per text,
+                    list of nanoseconds per step)
+        """
+        steps = tuple(zip(self.funcs, self.bits))
+        nanosecs = [0] * len(steps)
+        results = []
+        changes = []
+        clock = time.perf_counter_ns
+        for text in texts:
+            changed = 0
+            for i, (func, bit) in enumerate(steps):
+                t0 = clock()
+                new_text = func(text)
+                nanosecs[i] += clock() - t0
+                # `re.sub()` & `unidecode()` return the same object if nothing changed
+                if new_text is not text and new_text != text:
+                    changed |= bit
+                text = new_text
+            results.append(text)
+            changes.append(changed)
+        return results, changes, nanosecs
+
+
+# pipelines in the order applied by `clean_df()`
+#   before exclusions are pulled
+PRE_EXCLUSION_PIPELINE = TextPipeline(
+    ('translating encoding', translate_encoding),
+    ('removing URLs', remove_urls),
+    ('adding missing spaces after word-edge punctuation', add_missing_spaces))
+#   after exclusions are pulled
+POST_EXCLUSION_PIPELINE = TextPipeline(
+    ('punctuation delineated text breaks', break_punc_lines),
+    ('title abbreviations at line breaks', fix_line_end_abbr),
+    first_bit=len(PRE_EXCLUSION_PIPELINE.bits))
+# step label: bit set in `text_changes` if the step changed the text
+CHANGE_FLAGS = {label: bit for pipeline in (PRE_EXCLUSION_PIPELINE, POST_EXCLUSION_PIPELINE)
+                for label, bit in zip(pipeline.labels, pipeline.bits)}
+
+
+def apply_pipeline(texts: pd.Series, pipeline: TextPipeline, workers: int = 1,
+                   chunk_rows: int = DEFAULT_CHUNK_ROWS):
+    """runs a text pipeline over a series of texts, in `workers`
+    processes if > 1, in chunks of `chunk_rows` texts each.
+
+    Returns:
+        tuple: (series of resulting texts with the same index,
+                `uint16` array of change flags per text,
+                dict of step label: seconds, summed over workers)
+    """
+    values = texts.tolist()
+    if workers > 1 and len(values) > chunk_rows:
+        chunks = [values[i:i + chunk_rows]
+                  for i in range(0, len(values), chunk_rows)]
+        results = []
+        changes = []
+        nanosecs = [0] * len(pipeline.funcs)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # `map()` yields results in chunk order
+            for chunk_result, chunk_changes, chunk_ns in executor.map(pipeline, chunks):
+                results.extend(chunk_result)
+                changes.extend(chunk_changes)
+                nanosecs = [n + c for n, c in zip(nanosecs, chunk_ns)]
+    else:
+        results, changes, nanosecs = pipeline(values)
+    return (pd.Series(results, index=texts.index, name=texts.name),
+            np.array(changes, dtype='uint16'),
+            {label: ns / 1e9 for label, ns in zip(pipeline.labels, nanosecs)})
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+'''
+estimated stanza parsing time of texts, used by `parse_pile.slice_df()` to pack
+texts into slices of roughly equal predicted parsing time (`--slice_hours`), and
+the rule slices are cut by (with either text counts or predicted time as cost).
+
+Parsing time depends on how much text there is to tokenize, tag, and parse,
+  not on the number of texts, so the model is linear in per-text counts:
+  `seconds = texts * c_texts + chars * c_chars + sentences * c_sentences`
+  (sentences are estimated from sentence-final punctuation and line breaks,
+  without tokenizing).
+
+The coefficients are fit (least squares, none negative) to the parsing times
+  of completed slices (see `calibrate_parse_cost.py`), so they reflect the
+  hardware the jobs actually ran on. Until a model has been calibrated, the
+  defaults below (rough estimates from the Pile-CC runs of spring 2022,
+  ~0.8 hours per 9999 texts on a GPU node) are used.
+'''
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+FEATURES = ('texts', 'chars', 'sentences')
+DEFAULT_COEFS = {'texts': 0.01, 'chars': 4e-5, 'sentences': 3e-3}
+# end of a sentence (estimate): final punctuation before whitespace, or a line break
+SENT_END_REGEX = r'[.!?]+["\')\]]*\s|\n+'
+# fewer completed slices than this are too few to fit a model to
+MIN_CALIBRATION_SLICES = 5
+
+
+def text_features(texts: pd.Series):
+    """per-text counts the parsing time is estimated from (columns `FEATURES`)"""
+    texts = texts.astype('string')
+    return pd.DataFrame({'texts': 1,
+                         'chars': texts.str.len().fillna(0).astype('int64'),
+                         # (+1: the last sentence need not end in punctuation)
+                         'sentences': texts.str.count(SENT_END_REGEX)
+                         .fillna(0).astype('int64') + 1},
+                        index=texts.index)
+
+
+class ParseCostModel:
+    """linear estimate of parsing seconds from `text_features()`
+    (or their sums over the texts of slices)"""
+
+    def __init__(self, coefs: dict = None, n_slices: int = 0):
+        self.coefs = dict(DEFAULT_COEFS if coefs is None else coefs)
+        # number of completed slices the coefficients were fit to (0 = defaults)
+        self.n_slices = n_slices
+
+    def __repr__(self):
+        fit = (f'fit to {self.n_slices} slices' if self.n_slices
+               else 'default coefficients')
+        return (f'ParseCostModel({fit}: '
+                + ', '.join(f'{f}={self.coefs[f]:.3g}s' for f in FEATURES) + ')')
+
+    def predict(self, features: pd.DataFrame):
+        """predicted seconds for each row of `features`"""
+        return features.loc[:, list(FEATURES)].to_numpy(dtype='float64') @ np.array(
+            [self.coefs[f] for f in FEATURES])
+
+    @classmethod
+    def fit(cls, slice_features: pd.DataFrame, seconds):
+        """fits the coefficients to the feature totals and parsing `seconds`
+        of completed slices; features that would get a negative coefficient
+        (i.e. not independently informative for these slices) are dropped"""
+        X = slice_features.loc[:, list(FEATURES)].to_numpy(dtype='float64')
+        y = np.asarray(seconds, dtype='float64')
+        if len(y) < MIN_CALIBRATION_SLICES:
+            raise ValueError(f'{len(y)} completed slices; at least '
+                             f'{MIN_CALIBRATION_SLICES} are needed to calibrate.')
+        used = list(range(len(FEATURES)))
+        while used:
+            coefs, *__ = np.linalg.lstsq(X[:, used], y, rcond=None)
+            if (coefs >= 0).all():
+                break
+            del used[int(np.argmin(coefs))]
+        fitted = dict.fromkeys(FEATURES, 0.0)
+        fitted.update({FEATURES[i]: float(c) for i, c in zip(used, coefs)})
+        return cls(fitted, n_slices=len(y))
+
+    def save(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({'coefs': self.coefs,
+                                    'n_slices': self.n_slices}, indent=1))
+
+    @classmethod
+    def load(cls, path: Path = None):
+        """model saved at `path` (default coefficients if there is none)"""
+        if path is None or not path.is_file():
+            return cls()
+        record = json.loads(path.read_text())
+        return cls(record['coefs'], n_slices=record.get('n_slices', 0))
+
+
+def slice_bounds(costs, limit: float):
+    """end positions of consecutive slices of texts with the given `costs`
+    (e.g. 1 per text, or predicted seconds): slices of up to `limit` are cut
+    until the remainder is at most 2.2x the limit; a remainder over 1.1x the
+    limit is then split in half (so that no slice is much smaller or larger
+    than the rest), and the rest is the last slice"""
+    cum_costs = np.cumsum(np.asarray(costs, dtype='float64'))
+    total = cum_costs[-1] if len(cum_costs) else 0.0
+    bounds = []
+    start, sliced = 0, 0.0
+
+    def cut(cost):
+        # (at least one text per slice, even if it alone exceeds the limit)
+        end = max(start + 1,
+                  int(np.searchsorted(cum_costs, sliced + cost, side='right')))
+        bounds.append(end)
+        return end, cum_costs[end - 1]
+
+    while total - sliced > 2.2 * limit:
+        start, sliced = cut(limit)
+    if total - sliced > 1.1 * limit:
+        start, sliced = cut((total - sliced) / 2)
+    if start < len(cum_costs) or not bounds:
+        bounds.append(len(cum_costs))
+    return bounds
+
+
+def stream_slices(pieces, limit: float):
+    """cuts an ordered stream of `(dataframe, features, costs)` pieces into the
+    slices `slice_bounds()` would cut all of it into, yielding each
+    `(dataframe, features)` slice as soon as it is certain: while more than 2.2x
+    the limit is buffered, the next slice is a full one whatever follows, so
+    no more than about two slices (plus a piece) are held at a time"""
+    buffer = []
+    for piece in pieces:
+        buffer.append(piece)
+        if sum(costs.sum() for __, __, costs in buffer) <= 2.2 * limit:
+            continue
+        df, features, costs = _concat_pieces(buffer)
+        start = 0
+        while costs[start:].sum() > 2.2 * limit:
+            end = start + slice_bounds(costs[start:], limit)[0]
+            yield df.iloc[start:end], features.iloc[start:end]
+            start = end
+        # (nothing is left if the last text alone was over 2.2x the limit)
+        buffer = ([(df.iloc[start:], features.iloc[start:], costs[start:])]
+                  if start < len(costs) else [])
+
+    if buffer:
+        df, features, costs = _concat_pieces(buffer)
+        start = 0
+        for end in slice_bounds(costs, limit):
+            yield df.iloc[start:end], features.iloc[start:end]
+            start = end
+
+
+def _concat_pieces(pieces):
+    if len(pieces) == 1:
+        return pieces[0]
+    dfs, features, costs = zip(*pieces)
+    return pd.concat(dfs), pd.concat(features), np.concatenate(costs)
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+'''
+pluggable regex engines for the patterns defined in `pile_regex_imports`.
+
+Patterns are compiled with `compile_pattern()`, which returns an `EnginePattern`:
+  a stand-in for `re.Pattern` whose matching methods (`search`, `sub`, ...)
+  are bound to the pattern compiled by the current engine. Switching engines
+  with `set_regex_engine()` rebinds every pattern in place, so modules that
+  imported the pattern objects (`from pile_regex_imports import ...`) follow.
+  Patterns are only registered for this as long as they are in use (e.g. as
+  module globals); ones compiled by tools or tests are not kept alive.
+
+Engines:
+  - `re`: python's backtracking engine (default)
+  - `re2`: Google's RE2 (`pip install google-re2`), which matches in time linear
+    in the length of the text, so no text can make a pattern backtrack
+    for minutes. Patterns RE2 cannot express (back-references, lookarounds,
+    python's `$` before a final newline) keep using `re`.
+
+Ported patterns are rewritten for the differences between the engines
+  (python `\\s` also matches `\\v` and `\\x1c-\\x1f`; inline comments; flags).
+  RE2's `\\w`, `\\d`, and `\\b` are ASCII only, i.e. identical to python's on
+  ASCII text, which is what the patterns are applied to (after
+  `pile_normalize.translate_encoding()`). See `script/regex_engine_report.py`
+  for which patterns are ported and whether their matches are identical.
+
+The engine is also set in the environment (`PUDDIN_REGEX_ENGINE`),
+  so worker processes started later use the same engine.
+
+Patterns can declare `literals`: substrings of which at least one occurs in
+  any text the pattern can match (e.g. `</` for html tags). The matching
+  methods then skip the regex for texts containing none of them and return
+  what the regex would have (no match, or the text unchanged for `sub()`), and
+  `literal_mask()` gives the candidate texts of a whole batch at once.
+'''
+import os
+import re
+import weakref
+
+import numpy as np
+
+try:
+    import re2
+except ImportError:
+    re2 = None
+
+ENGINES = ('re', 're2')
+ENGINE_ENV_VAR = 'PUDDIN_REGEX_ENGINE'
+# method: (position of the `string` argument, result without a match)
+_METHODS = {'search': (0, lambda string: None),
+            'match': (0, lambda string: None),
+            'fullmatch': (0, lambda string: None),
+            'sub': (1, lambda string: string),
+            'subn': (1, lambda string: (string, 0)),
+            'findall': (0, lambda string: []),
+            'finditer': (0, lambda string: iter(())),
+            'split': (0, lambda string: [string])}
+# what python's `\s` matches in ASCII text (RE2's `\s` is `[\t\n\f\r ]`)
+_PY_SPACE = r'\t\n\v\f\r \x1c-\x1f'
+# patterns compiled with `compile_pattern()` (that are still in use)
+_PATTERNS = weakref.WeakSet()
+_ENGINE = os.environ.get(ENGINE_ENV_VAR, 're')
+if _ENGINE not in ENGINES or (_ENGINE == 're2' and re2 is None):
+    _ENGINE = 're'
+
+
+class UnportablePattern(ValueError):
+    pass
+
+
+def translate_for_re2(pattern: str, flags: int = 0):
+    """RE2 syntax equivalent of a python pattern (for ASCII text)
+
+    Raises:
+        UnportablePattern: for constructs RE2 does not support
+    """
+    if flags & (re.VERBOSE | re.LOCALE):
+        raise UnportablePattern('VERBOSE/LOCALE flags')
+    out = []
+    in_class = False
+    class_start = 0
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\':
+            escaped = pattern[i + 1]
+            if escaped in '123456789':
+                raise UnportablePattern('back-reference')
+            if escaped == 's':
+                out.append(_PY_SPACE if in_class else f'[{_PY_SPACE}]')
+            elif escaped == 'S':
+                if in_class:
+                    raise UnportablePattern('\\S in character class')
+                out.append(f'[^{_PY_SPACE}]')
+            elif escaped == 'Z':
+                out.append('\\z')
+            else:
+                out.append(pattern[i:i + 2])
+            i += 2
+            continue
+        if in_class:
+            # `]` right after `[` or `[^` is a literal
+            if char == ']' and i != class_start:
+                in_class = False
+        elif char == '[':
+            in_class = True
+            class_start = i + 2 if pattern.startswith('[^', i) else i + 1
+        elif pattern.startswith('(?#', i):
+            i = pattern.index(')', i) + 1
+            continue
+        elif pattern.startswith(('(?=', '(?!', '(?<=', '(?<!'), i):
+            raise UnportablePattern('lookaround')
+        elif pattern.startswith('(?P=', i):
+            raise UnportablePattern('back-reference')
+        elif char == '$' and not flags & re.MULTILINE:
+            # python's `$` also matches before a newline at the very end
+            raise UnportablePattern('`$` without MULTILINE')
+        out.append(char)
+        i += 1
+
+    inline_flags = ''.join(flag for flag, value in (('i', re.IGNORECASE),
+                                                    ('m', re.MULTILINE),
+                                                    ('s', re.DOTALL))
+                           if flags & value)
+    return (f'(?{inline_flags})' if inline_flags else '') + ''.join(out)
+
+
+def port_pattern(regex: re.Pattern):
+    """compiles a python pattern with RE2, if possible
+
+    Returns:
+        tuple: (RE2 pattern or None, reason it could not be ported or '')
+    """
+    if re2 is None:
+        return None, 'google-re2 not installed'
+    try:
+        translated = translate_for_re2(regex.pattern, regex.flags)
+    except UnportablePattern as e:
+        return None, str(e)
+    try:
+        return re2.compile(translated), ''
+    except re2.error as e:
+        return None, f'RE2 error: {e}'
+
+
+def _prefiltered(method, may_match, string_pos: int, no_match):
+    def prefiltered(*args, **kwargs):
+        string = args[string_pos] if len(args) > string_pos else kwargs['string']
+        return method(*args, **kwargs) if may_match(string) else no_match(string)
+    return prefiltered
+
+
+class EnginePattern:
+    """`re.Pattern` stand-in bound to the current engine"""
+
+    def __init__(self, pattern: str, flags: int = 0, literals=None):
+        self.literals = tuple(literals) if literals else None
+        if self.literals is None:
+            self.may_match = lambda string: True
+        elif len(self.literals) == 1:
+            literal = self.literals[0]
+            self.may_match = lambda string: literal in string
+        else:
+            # (not referencing `self`, so that unused patterns are freed right away)
+            literals = self.literals
+            self.may_match = lambda string: any(lit in string for lit in literals)
+        self.re_pattern = re.compile(pattern, flags)
+        self.pattern = self.re_pattern.pattern
+        self.flags = self.re_pattern.flags
+        self.groups = self.re_pattern.groups
+        self.groupindex = self.re_pattern.groupindex
+        self.re2_pattern = None
+        self.port_error = None
+        self.engine = None
+        self.compiled = None
+        self.use(_ENGINE)
+
+    def use(self, engine: str):
+        compiled = self.re_pattern
+        if engine == 're2':
+            if self.re2_pattern is None and self.port_error is None:
+                self.re2_pattern, self.port_error = port_pattern(self.re_pattern)
+            compiled = self.re2_pattern or self.re_pattern
+        self.engine = 're' if compiled is self.re_pattern else 're2'
+        self.compiled = compiled
+        for name, (string_pos, no_match) in _METHODS.items():
+            method = getattr(compiled, name)
+            setattr(self, name, method if self.literals is None else
+                    _prefiltered(method, self.may_match, string_pos, no_match))
+
+    def literal_mask(self, texts):
+        """boolean array, True for texts containing any of the pattern's
+        literals (all True if it has none)"""
+        texts = texts if isinstance(texts, list) else list(texts)
+        if self.literals is None:
+            return np.ones(len(texts), dtype=bool)
+        mask = np.zeros(len(texts), dtype=bool)
+        for literal in self.literals:
+            mask |= np.fromiter((literal in t for t in texts), dtype=bool, count=len(texts))
+        return mask
+
+    def __reduce__(self):
+        return compile_pattern, (self.pattern, self.flags, self.literals)
+
+    def __repr__(self):
+        return f'<{self.engine}>{self.re_pattern!r}'
+
+
+def compile_pattern(pattern: str, flags: int = 0, literals=None):
+    """`literals`: substrings at least one of which any match requires
+    (case sensitive, so only letterless literals with `re.IGNORECASE`)"""
+    compiled = EnginePattern(pattern, flags, literals)
+    _PATTERNS.add(compiled)
+    return compiled
+
+
+def get_regex_engine():
+    return _ENGINE
+
+
+def set_regex_engine(engine: str):
+    """switches all patterns compiled with `compile_pattern()` to `engine`
+
+    Returns:
+        list: the patterns that could not be ported (still using `re`)
+    """
+    global _ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f'unknown regex engine: {engine} (options: {", ".join(ENGINES)})')
+    if engine == 're2' and re2 is None:
+        raise ImportError('the re2 engine requires the google-re2 package '
+                          '(pip install google-re2)')
+    _ENGINE = engine
+    os.environ[ENGINE_ENV_VAR] = engine
+    patterns = sorted(_PATTERNS, key=lambda compiled: compiled.pattern)
+    for compiled in patterns:
+        compiled.use(engine)
+    return [compiled for compiled in patterns if compiled.engine != engine]
@@ -1,9 +1,11 @@
 import re
 
-likely_html = re.compile(r'<(\w*).*>[^<]*</\1>')
+from pile_regex_engine import compile_pattern
 
-defwiki = re.compile(r'<nowiki>')
-wikipat = re.compile(r'[{[]{2,}[^|}\]]+\|[^}\]]*\}{2,}')
+likely_html = compile_pattern(r'<(\w*).*>[^<]*</\1>', literals=['</'])
+
+defwiki = compile_pattern(r'<nowiki>', literals=['<nowiki>'])
+wikipat = compile_pattern(r'[{[]{2,}[^|}\]]+\|[^}\]]*\}{2,}', literals=['}}'])
 # wt0 = re.compile(r"\*")
 # wt1 = re.compile(r"(['(\s[])\w+/([\w{}]+)")
 # wt2 = re.compile(r"\[{2}spoiler:(.+?)\]{2}")
@@ -18,62 +20,66 @@ wikipat = re.compile(r'[{[]{2,}[^|}\]]+\|[^}\]]*\}{2,}')
 # wt11 = re.compile(r"('{2,})([^']+'?[^']+?)\1")
 # wt12 = re.compile(r'\n{4,}')
 
-bracket_url = re.compile(r'\[url=[^\]]*]([^[]*)\[/url\]')
-likely_url = re.compile(
+bracket_url = compile_pattern(r'\[url=[^\]]*]([^[]*)\[/url\]', literals=['[/url]'])
+likely_url = compile_pattern(
     r'https?://\S*\s|www\.\S*\s|[\w\d]+\.[\w\d]+\.[\w\d]+\S*\s|http://www\.\w+\.\w{2:3}'
     # r'(\(?\[?(?:https?)://w{0,3}\S*[^\s./]{2,}\.[^\s./]{2,}[\./\@]\S*[/:\@]\S*)'
 )
 
 # exclusion regex patterns
 # letters interspersed with numbers in the same "word"
-mixed_letter_digit_regex = re.compile(
+mixed_letter_digit_regex = compile_pattern(
     r'\d*[a-z]+\d+[a-z]*\d*[a-z]*'
     r'|\d{3:}[a-z]+[a-z]*\d*[a-z]*', re.IGNORECASE)
 
 # (exclusion filters)
 # single "word" containing `_` or other non acceptible mid-word punch
-underscore_regex = re.compile(r'[\w]*?_[\w]+?')
-midword_punc_regex = re.compile(
+underscore_regex = compile_pattern(r'[\w]*?_[\w]+?', literals=['_'])
+midword_punc_regex = compile_pattern(
     r'\b[a-z]+[^\w\s\-\'/\\&@]+?[a-zA-Z]+\b')
 
 # for cleaning --> .sub(r'\1\3 \2\4', str)
-missing_space_regex = re.compile(r'(?# lowercaseUppercase with no \s)([a-z]+)([A-Z])'
-                                 r'|(?# word-edge punc with no \s)([a-z][.!?,;:]+)([A-Z])')
+missing_space_regex = compile_pattern(r'(?# lowercaseUppercase with no \s)([a-z]+)([A-Z])'
+                                      r'|(?# word-edge punc with no \s)([a-z][.!?,;:]+)([A-Z])')
 # a single instance of code declaration
-code_regex = re.compile(
+code_regex = compile_pattern(
     r'(=|[=!><][=!><])\s?(self|true|false|\w+\.?\w*)',
-    re.IGNORECASE)
+    re.IGNORECASE,
+    literals=['=', '!!', '!<', '!>', '<!', '<<', '<>', '>!', '><', '>>'])
 
 # a single instance of json like dictionary formatting
-json_regex = re.compile(r'{"\w+":{"\w+":')
+json_regex = compile_pattern(r'{"\w+":{"\w+":', literals=['":{"'])
 
 # cleaning regex patterns
 # abbreviations that can be followed by r"\. [A-Z]" without signaling end of sentence
 # only `Aa` capitalization is considered sentence start, not `AA` (another abbr.)
-end_of_line_abbr = re.compile(
+end_of_line_abbr = compile_pattern(
     r'(?:(Mr|M[sx]|Messrs|Mmes|[SG]en|[FS]t|Re[vp]|Pr(?:es|of)|Supe?|Capt'
     r'|Asst|Ms?gr|Engr?|Assoc|Arb|Assemb|Pharm?|Hon|i\.e|e\.g|ca?'
     r'|(?<![A-Z])[A-Z](?![A-Z]))(e?s?\.[^\w\n]?)\n([^\n\w]?[A-Z]))'
     r'|(?<!\n)\n([^\n\w]?[A-Z]{2,})'
-    r'|(Jan|Feb|Mar|Apr|Ju[nl]|Aug|Sept?|Nov|Oct|Dec)(\.?)\n(?=\d)')
-punc_only = re.compile(
+    r'|(Jan|Feb|Mar|Apr|Ju[nl]|Aug|Sept?|Nov|Oct|Dec)(\.?)\n(?=\d)',
+    literals=['\n'])
+punc_only = compile_pattern(
     r'(?# full line nonword chars only )^([\W_]+)$'
     r'|(?# any punc/non`\n`ws repeated 4+)(_|[^\w\n])(\2{4,})'
     r'|(?# punc/non`\n`ws except . repeated 4)([^a-z\d.\n])(\4{3})'
     r'|(?# punc/non`\n`ws except .!?$*= or blank repeated 3)([^a-z\d.!?$=* \n])(\6{2})',
     re.MULTILINE | re.IGNORECASE)
-linebreak_is_sent = re.compile(
+linebreak_is_sent = compile_pattern(
     r'(?:(?#1--> )([^A-Z\n]{3,}[.?!;][\'"?! \t\f\v\r]*|\.{4,})\n[ \t\f\v\r]*(?#2--> )([(#["\']?[A-Z]|\W*?\d+\W*?\w))'
-    r'|(?:(?#3--> )(\D[.;:][\'"?! \t\f\v\r]*)\n[ \t\f\v\r]*(?#4--> )([\(\#\["\']?[A-Z]|[\#\[\(]\d+[\)\]]))')
+    r'|(?:(?#3--> )(\D[.;:][\'"?! \t\f\v\r]*)\n[ \t\f\v\r]*(?#4--> )([\(\#\["\']?[A-Z]|[\#\[\(]\d+[\)\]]))',
+    literals=['\n'])
 
-solonew_or_dupwhite = re.compile(r'(?<![\n])(\n)(?!\n)|([ \t\f\v\r])\2+')
-extra_newlines = re.compile(r'\n{3,}')
+solonew_or_dupwhite = compile_pattern(r'(?<![\n])(\n)(?!\n)|([ \t\f\v\r])\2+',
+                                      literals=['\n', '  ', '\t\t', '\f\f', '\v\v', '\r\r'])
+extra_newlines = compile_pattern(r'\n{3,}', literals=['\n\n\n'])
 
 # nonbreaking_colon = re.compile(r'\d+?:\n\d+?')
 # linebreak_is_sent = re.compile(
 #     r'([\w\d][.?!][\'"?! ]*?)\n+|([^,;:)\]\)/-])\n+'
 #     + r'([A-Z][^A-Z]|[(#["\'][A-Z]|\W*?\d+.*?\w)')
 
-start_chars = re.compile(
+start_chars = compile_pattern(
     r'^[A-Z][^A-Z\n]|^[\(\["\'][A-Z]|^[\W]*$')
-sent_end_punc = re.compile(r'([.?!][\'"?!]?)')
+sent_end_punc = compile_pattern(r'([.?!][\'"?!]?)')
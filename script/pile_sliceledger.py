@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+'''
+SQLite ledger of the processing state of every dataframe slice, shared by all
+jobs writing to the same destination (`puddin/slice-ledger.sqlite`).
+
+A slice goes through the states
+  - `created`: saved by `parse_pile.slice_df()` (with its row of the slice info)
+  - `claimed`: picked up by a job to be parsed (`worker` identifies the job)
+  - `parsing`: handed to stanza
+  - `done`: conllu file and final slice dataframe saved
+  - `failed`: parsing raised an error (`error` holds it)
+with the time of each transition, so slices left `claimed` or `parsing` by a
+  job that was killed can be told apart from ones that are still running.
+
+A job claims a slice only if it is `created` or `failed`, or if it has been
+  `claimed`/`parsing` without a heartbeat for longer than `stale_after` seconds
+  (its job is taken to have been killed), unless the claim is forced. Of jobs
+  claiming the same slice at once, only one gets it; the others skip it. While
+  a slice is parsed, its job records a heartbeat every `HEARTBEAT_SECONDS` (see
+  `SliceLedger.keep_alive()`), so however long parsing takes, a running slice
+  does not go stale.
+
+Each state change is a single short transaction on one row, so any number of
+  jobs can update the ledger at once (SQLite locks the database for the
+  duration of a write; writers wait up to `timeout` seconds for each other).
+  This replaces `all-completed-slices_meta-index.csv`, which every job read
+  and rewrote whole after each slice. Its layout (one row per completed slice)
+  is produced on demand by `SliceLedger.to_frame()`; see `export_slice_ledger.py`.
+'''
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+STATES = ('created', 'claimed', 'parsing', 'done', 'failed')
+# states a slice can be claimed from (without forcing or its claim being stale)
+CLAIMABLE_STATES = ('created', 'failed')
+# seconds between heartbeats of a job parsing a slice
+HEARTBEAT_SECONDS = 10 * 60
+# seconds without a heartbeat after which a slice left `claimed` or `parsing`
+#   can be claimed again
+DEFAULT_STALE_SECONDS = 3600
+# legacy index of completed slices, imported into a new ledger
+LEGACY_INDEX_FNAME = 'all-completed-slices_meta-index.csv'
+
+
+def worker_id():
+    """host and process of this job (and SLURM job/array task, if any)"""
+    slurm_id = os.environ.get('SLURM_JOB_ID')
+    if slurm_id and 'SLURM_ARRAY_TASK_ID' in os.environ:
+        slurm_id = (f"{os.environ.get('SLURM_ARRAY_JOB_ID', slurm_id)}_"
+                    f"{os.environ['SLURM_ARRAY_TASK_ID']}")
+    return (f'{socket.gethostname()}:{os.getpid()}'
+            + (f' (slurm {slurm_id})' if slurm_id else ''))
+
+
+def _json_value(value):
+    # (slice info rows hold paths and numpy numbers)
+    if isinstance(value, Path):
+        return str(value)
+    if hasattr(value, 'item'):
+        return value.item()
+    return None if pd.isna(value) else value
+
+
+class SliceLedger:
+    """SQLite table of slices (keyed by `tmp_slice_path`, relative to the
+    destination), their state, timings, and slice info"""
+
+    def __init__(self, db_path: Path, timeout: float = 600):
+        self.db_path = db_path
+        self.timeout = timeout
+        if not db_path.parent.is_dir():
+            db_path.parent.mkdir(parents=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS slices ('
+                         ' tmp_slice_path TEXT PRIMARY KEY,'
+                         ' slice_name TEXT,'
+                         ' data_origin_group TEXT,'
+                         ' slice_number TEXT,'
+                         ' state TEXT NOT NULL,'
+                         ' info TEXT NOT NULL,'
+                         ' created_at REAL,'
+                         ' claimed_at REAL,'
+                         ' parsing_at REAL,'
+                         ' heartbeat_at REAL,'
+                         ' finished_at REAL,'
+                         ' parsing_seconds REAL,'
+                         ' worker TEXT,'
+                         ' attempts INTEGER NOT NULL DEFAULT 0,'
+                         ' error TEXT)')
+            # (ledgers created before heartbeats were recorded)
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(slices)')}
+            if 'heartbeat_at' not in columns:
+                conn.execute('ALTER TABLE slices ADD COLUMN heartbeat_at REAL')
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=self.timeout)
+
+    def __len__(self):
+        with closing(self._connect()) as conn:
+            return conn.execute('SELECT COUNT(*) FROM slices').fetchone()[0]
+
+    def record_created(self, slice_info: pd.DataFrame):
+        """records (or resets, if resliced) the slices in `slice_info`
+        (rows as in `slice-info_[data group].csv`, indexed by slice number)"""
+        now = time.time()
+        rows = []
+        for slice_number, row in slice_info.iterrows():
+            info = {col: _json_value(value) for col, value in row.items()}
+            info['slice_number'] = int(slice_number)
+            rows.append((str(info['tmp_slice_path']), None,
+                         info.get('data_origin_group'), str(slice_number),
+                         json.dumps(info), now))
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO slices (tmp_slice_path, slice_name, '
+                'data_origin_group, slice_number, state, info, created_at) '
+                "VALUES (?, ?, ?, ?, 'created', ?, ?)", rows)
+
+    def claim(self, tmp_slice_path, slice_name: str, info: dict = None,
+              stale_after: float = DEFAULT_STALE_SECONDS, force: bool = False):
+        """records that this job is parsing the slice, if it is not in the
+        ledger, `created`, `failed`, or `claimed`/`parsing` without a heartbeat
+        for more than `stale_after` seconds (any state if `force`)
+
+        Returns:
+            tuple: whether the slice was claimed, and (state, worker) of the
+                slice before (None if it was not in the ledger)
+        """
+        tmp_slice_path = str(tmp_slice_path)
+        info = {col: _json_value(value) for col, value in (info or {}).items()}
+        with closing(self._connect()) as conn:
+            # (read and update in one write transaction: no other job in between)
+            conn.execute('BEGIN IMMEDIATE')
+            with conn:
+                record = conn.execute(
+                    'SELECT state, worker, '
+                    'COALESCE(heartbeat_at, parsing_at, claimed_at) '
+                    'FROM slices WHERE tmp_slice_path = ?', (tmp_slice_path,)).fetchone()
+                now = time.time()
+                previous = record[:2] if record else None
+                if not (force or record is None or record[0] in CLAIMABLE_STATES
+                        or (record[0] in ('claimed', 'parsing')
+                            and now - (record[2] or 0) > stale_after)):
+                    return False, previous
+                if record is None:
+                    # (sliced before the ledger was kept)
+                    conn.execute(
+                        'INSERT INTO slices (tmp_slice_path, data_origin_group, '
+                        "slice_number, state, info) VALUES (?, ?, ?, 'created', ?)",
+                        (tmp_slice_path, info.get('data_origin_group'),
+                         info.get('slice_number'), json.dumps(info)))
+                conn.execute(
+                    "UPDATE slices SET state = 'claimed', slice_name = ?, "
+                    'claimed_at = ?, parsing_at = NULL, heartbeat_at = NULL, '
+                    'finished_at = NULL, '
+                    'parsing_seconds = NULL, error = NULL, worker = ?, '
+                    'attempts = attempts + 1 WHERE tmp_slice_path = ?',
+                    (slice_name, now, worker_id(), tmp_slice_path))
+        return True, previous
+
+    def set_state(self, tmp_slice_path, state: str, error: str = None):
+        """`parsing`, `done`, or `failed` (with the `error`)"""
+        if state not in STATES[2:]:
+            raise ValueError(f'{state!r} is not one of {STATES[2:]}')
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            if state == 'parsing':
+                conn.execute("UPDATE slices SET state = 'parsing', parsing_at = ? "
+                             'WHERE tmp_slice_path = ?', (now, str(tmp_slice_path)))
+            else:
+                conn.execute('UPDATE slices SET state = ?, finished_at = ?, error = ?, '
+                             'parsing_seconds = ? - COALESCE(claimed_at, parsing_at) '
+                             'WHERE tmp_slice_path = ?',
+                             (state, now, error, now, str(tmp_slice_path)))
+
+    def heartbeat(self, tmp_slice_path):
+        """records that this job is still parsing the slice (if it is still
+        this job's claim)
+
+        Returns:
+            bool: whether the slice is still claimed by this job
+        """
+        with closing(self._connect()) as conn, conn:
+            return conn.execute(
+                'UPDATE slices SET heartbeat_at = ? WHERE tmp_slice_path = ? AND '
+                "state IN ('claimed', 'parsing') AND worker = ?",
+                (time.time(), str(tmp_slice_path), worker_id())).rowcount > 0
+
+    @contextmanager
+    def keep_alive(self, tmp_slice_path, interval: float = HEARTBEAT_SECONDS):
+        """records a heartbeat for the slice every `interval` seconds (from a
+        background thread) while the `with` block runs"""
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(interval):
+                try:
+                    if not self.heartbeat(tmp_slice_path):
+                        return
+                except sqlite3.Error as e:
+                    print(f'(slice ledger heartbeat failed: {e!r})')
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def import_completed(self, index_path: Path):
+        """adds the slices of a legacy completed slices index (`.csv`) as `done`
+        (the last record of each slice, for slices not already in the ledger)
+
+        Returns:
+            int: number of slices added
+        """
+        index = pd.read_csv(index_path, dtype=str).drop_duplicates(
+            subset='tmp_slice_path', keep='last')
+        rows = []
+        for record in index.to_dict('records'):
+            record = {col: (None if pd.isna(v) else v) for col, v in record.items()}
+            started = pd.to_datetime(record.pop('started_at', None), errors='coerce')
+            finished = pd.to_datetime(record.pop('finished_at', None), errors='coerce')
+            parsing_time = pd.to_timedelta(record.pop('parsing_time', None), errors='coerce')
+            rows.append((
+                record['tmp_slice_path'], record.pop('slice_name', None),
+                record.get('data_origin_group'), record.get('slice_number'),
+                json.dumps(record),
+                None if pd.isna(started) else started.timestamp(),
+                None if pd.isna(finished) else finished.timestamp(),
+                None if pd.isna(parsing_time) else parsing_time.total_seconds()))
+        with closing(self._connect()) as conn, conn:
+            return conn.executemany(
+                'INSERT OR IGNORE INTO slices (tmp_slice_path, slice_name, '
+                'data_origin_group, slice_number, state, info, claimed_at, '
+                "finished_at, parsing_seconds, attempts) VALUES (?, ?, ?, ?, 'done', ?, ?, ?, ?, 1)",
+                rows).rowcount
+
+    def to_frame(self, states=('done',)):
+        """slices in the given states (None = all) as a dataframe, in the layout
+        of `all-completed-slices_meta-index.csv` (indexed by `slice_name`; one row
+        per slice, in order of completion), plus the ledger's state columns"""
+        query = ('SELECT slice_name, info, state, worker, attempts, error, created_at, '
+                 'claimed_at, parsing_at, heartbeat_at, finished_at, parsing_seconds '
+                 'FROM slices')
+        params = []
+        if states is not None:
+            query += f' WHERE state IN ({",".join("?" * len(states))})'
+            params = list(states)
+        query += ' ORDER BY finished_at IS NULL, finished_at, claimed_at, created_at'
+        with closing(self._connect()) as conn:
+            records = conn.execute(query, params).fetchall()
+
+        rows = []
+        for (slice_name, info, state, worker, attempts, error, created_at,
+             claimed_at, parsing_at, heartbeat_at, finished_at, parsing_secs) in records:
+            row = {'slice_name': slice_name}
+            row.update(json.loads(info))
+            row.update(
+                started_at=(time.ctime(claimed_at) if claimed_at else None),
+                finished_at=(time.ctime(finished_at) if finished_at else None),
+                parsing_time=(pd.Timedelta(seconds=round(parsing_secs))
+                              if parsing_secs is not None else pd.NaT),
+                parsing_seconds=(round(parsing_secs) if parsing_secs is not None
+                                 else None),
+                state=state, worker=worker, attempts=attempts, error=error,
+                created_at=(time.ctime(created_at) if created_at else None),
+                parsing_at=(time.ctime(parsing_at) if parsing_at else None),
+                heartbeat_at=(time.ctime(heartbeat_at) if heartbeat_at else None))
+            rows.append(row)
+        df = pd.DataFrame(rows)
+        return df.set_index('slice_name') if not df.empty else df
@@ -0,0 +1,254 @@
+# coding=utf-8
+"""
+Profile the patterns of `pile_regex_imports` on a sample of texts from
+`pile_tables/` dataframes (or `.jsonl` files): per pattern, the total time,
+p50/p99/max time per text, and the share of texts matched. The slowest texts
+of each pattern are saved to a jsonl file for inspection.
+
+Matching runs in a separate process, so a text that takes longer than
+`--time_limit` seconds can be stopped (python's `re` cannot be interrupted
+otherwise); such texts are recorded as timeouts. For the slowest texts of each
+pattern, matching is also timed on the first 1/4 and 1/2 of the text: time
+growing faster than length (scaling exponent >= `--superlinear`, or a timeout)
+flags the pattern as super-linear, i.e. prone to catastrophic backtracking.
+
+    examples:
+        python script/profile_regex.py
+        python script/profile_regex.py /share/compling/data/puddin/pile_tables/pile_00_Pile-CC_df.pkl.gz -n 5000 -t 30 -o logs/regex_profile
+        python script/profile_regex.py [...] --regex_engine re2 -p likely_url -p linebreak_is_sent
+"""
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from pile_regex_engine import set_regex_engine
+from regex_engine_report import get_patterns, sample_texts
+
+# fractions of the slowest texts timed to estimate how time scales with length
+_SCALING_FRACTIONS = (0.25, 0.5, 1.0)
+# shorter timings are too noisy to estimate scaling from
+_MIN_SCALING_SEC = 0.001
+# set in the parent before forking profiling workers (inherited, not pickled)
+_TEXTS = []
+
+
+def _main():
+    args = _parse_args()
+    if args.regex_engine != 're':
+        try:
+            set_regex_engine(args.regex_engine)
+        except ImportError as e:
+            sys.exit(str(e))
+    patterns = get_patterns()
+    if args.patterns:
+        unknown = set(args.patterns) - set(patterns)
+        if unknown:
+            sys.exit(f'Unknown pattern(s): {", ".join(unknown)}. Options: '
+                     + ', '.join(patterns))
+        patterns = {name: patterns[name] for name in args.patterns}
+
+    texts = sample_texts(args.input_files, args.sample_size,
+                         args.corpus_selection, args.seed)
+    if texts.empty:
+        sys.exit('No texts found in input files.')
+    global _TEXTS
+    _TEXTS = texts.tolist()
+    lengths = texts.str.len()
+    print(f'{len(texts)} sample texts: {lengths.sum()} characters '
+          f'(median {int(lengths.median())}, max {lengths.max()}); '
+          f'method: {args.method}; time limit: {args.time_limit} sec per text\n')
+
+    rows = []
+    worst_records = []
+    for name, pattern in patterns.items():
+        print(f'profiling {name} [{pattern.engine}]...', end=' ', flush=True)
+        secs, matched = profile_pattern(name, args.method, range(len(_TEXTS)),
+                                        args.time_limit)
+        timed_out = np.isnan(secs)
+        worst = np.argsort(np.where(timed_out, np.inf, secs))[::-1][:args.worst]
+        exponents = [scaling_exponent(name, args.method, i, args.time_limit)
+                     for i in worst]
+        max_exponent = max((e for e in exponents if not np.isnan(e)), default=np.nan)
+        row = {'pattern': name,
+               'engine': pattern.engine,
+               'matched %': round(100 * np.nanmean(np.where(timed_out, np.nan, matched)), 1),
+               'total sec': round(np.nansum(secs), 3),
+               'p50 ms': round(1000 * np.nanpercentile(secs, 50), 3),
+               'p99 ms': round(1000 * np.nanpercentile(secs, 99), 3),
+               'max ms': round(1000 * np.nanmax(secs), 3),
+               'timeouts': int(timed_out.sum()),
+               'scaling': round(max_exponent, 2),
+               'flag': ('super-linear' if timed_out.any() or max_exponent >= args.superlinear
+                        else '')}
+        rows.append(row)
+        print(f"{row['total sec']} sec" + (f" ! {row['flag']}" if row['flag'] else ''))
+        for i, exponent in zip(worst, exponents):
+            worst_records.append({'pattern': name,
+                                  'text_id': texts.index[i],
+                                  'seconds': None if timed_out[i] else float(secs[i]),
+                                  'timed_out': bool(timed_out[i]),
+                                  'scaling': None if np.isnan(exponent) else round(exponent, 2),
+                                  'length': len(_TEXTS[i]),
+                                  'text': _TEXTS[i]})
+
+    report = pd.DataFrame(rows).set_index('pattern').sort_values('total sec', ascending=False)
+    print('\n' + report.to_string(na_rep='-'))
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        summary_path = args.output.with_name(args.output.name + '_summary.csv')
+        worst_path = args.output.with_name(args.output.name + '_worst.jsonl')
+        report.to_csv(summary_path)
+        with worst_path.open('w') as f:
+            for record in worst_records:
+                f.write(json.dumps(record) + '\n')
+        print(f'\nsummary saved to {summary_path}\n'
+              f'{args.worst} slowest texts per pattern saved to {worst_path}')
+
+
+def _match_text(compiled, method: str, text: str):
+    if method == 'search':
+        return compiled.search(text) is not None
+    # full scan, as done by `sub()`
+    n_matches = 0
+    for __ in compiled.finditer(text):
+        n_matches += 1
+    return n_matches > 0
+
+
+def _profile_worker(conn, name: str, method: str, text_ix, max_chars: int):
+    compiled = get_patterns()[name].compiled
+    clock = time.perf_counter
+    for i in text_ix:
+        text = _TEXTS[i] if max_chars is None else _TEXTS[i][:max_chars]
+        t0 = clock()
+        matched = _match_text(compiled, method, text)
+        conn.send((i, clock() - t0, matched))
+    conn.close()
+
+
+def profile_pattern(name: str, method: str, text_ix, time_limit: float,
+                    max_chars: int = None):
+    """times a pattern on each text (of `_TEXTS`) in a worker process, which is
+    killed and restarted after the next text if a text takes over `time_limit`
+
+    Returns:
+        tuple: (array of seconds per text, NaN for timeouts;
+                boolean array, True for texts matched)
+    """
+    text_ix = list(text_ix)
+    secs = np.full(len(text_ix), np.nan)
+    matched = np.zeros(len(text_ix), dtype=bool)
+    position = {i: pos for pos, i in enumerate(text_ix)}
+    context = multiprocessing.get_context('fork')
+    start = 0
+    while start < len(text_ix):
+        parent_conn, child_conn = context.Pipe(duplex=False)
+        worker = context.Process(target=_profile_worker,
+                                 args=(child_conn, name, method,
+                                       text_ix[start:], max_chars))
+        worker.start()
+        child_conn.close()
+        while start < len(text_ix):
+            if not parent_conn.poll(time_limit):
+                # text `start` timed out: skip it & restart the worker after it
+                worker.kill()
+                start += 1
+                break
+            i, seconds, is_match = parent_conn.recv()
+            secs[position[i]] = seconds
+            matched[position[i]] = is_match
+            start = position[i] + 1
+        worker.join()
+        parent_conn.close()
+    return secs, matched
+
+
+def scaling_exponent(name: str, method: str, text_i: int, time_limit: float):
+    """estimated exponent k of `time ~ length^k` for one text, from timing the pattern
+    on growing prefixes (inf if a prefix timed out, NaN if too fast to tell)"""
+    length = len(_TEXTS[text_i])
+    timings = []
+    for fraction in _SCALING_FRACTIONS:
+        n_chars = max(1, int(length * fraction))
+        secs, __ = profile_pattern(name, method, [text_i], time_limit,
+                                   max_chars=n_chars)
+        if np.isnan(secs[0]):
+            return np.inf
+        timings.append((n_chars, secs[0]))
+    timings = [(n, s) for n, s in timings if s >= _MIN_SCALING_SEC]
+    if len(timings) < 2 or timings[0][0] == timings[-1][0]:
+        return np.nan
+    (n0, s0), (n1, s1) = timings[0], timings[-1]
+    return np.log(s1 / s0) / np.log(n1 / n0)
+
+
+def _parse_args():
+
+    parser = argparse.ArgumentParser(
+        description=('Time each regex pattern on a sample of texts, save the slowest '
+                     'texts per pattern, and flag patterns with super-linear behavior.'),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        'input_files', type=Path, nargs='*',
+        default=sorted(Path(__file__).parent.parent
+                       .joinpath('demo', 'data', 'pile').glob('*.jsonl')),
+        help=('`pile_tables/` dataframe(s) (`.pkl.gz`) and/or `.jsonl` file(s) '
+              'to sample texts from. Defaults to the demo data files.'))
+
+    parser.add_argument(
+        '-c', '--corpus_selection', type=str, default='Pile-CC',
+        help='pile set to select from `.jsonl` inputs.')
+
+    parser.add_argument(
+        '-n', '--sample_size', type=int, default=2000,
+        help='number of texts to sample.')
+
+    parser.add_argument(
+        '-s', '--seed', type=int, default=0,
+        help='random seed for sampling.')
+
+    parser.add_argument(
+        '-p', '--pattern', dest='patterns', action='append', default=[],
+        help='name of a pattern in `pile_regex_imports` to profile '
+             '(can be used multiple times). Defaults to all patterns.')
+
+    parser.add_argument(
+        '-m', '--method', choices=('search', 'scan'), default='scan',
+        help=('`search`: time to the first match (as for exclusions); '
+              '`scan`: time to find all matches (as for `sub()` cleaning steps).'))
+
+    parser.add_argument(
+        '-t', '--time_limit', type=float, default=10,
+        help='seconds a pattern may take on a single text before it is stopped.')
+
+    parser.add_argument(
+        '-w', '--worst', type=int, default=5,
+        help='number of slowest texts per pattern to save and test for scaling.')
+
+    parser.add_argument(
+        '--superlinear', type=float, default=1.5,
+        help='scaling exponent (time ~ length^k) at which a pattern is flagged.')
+
+    parser.add_argument(
+        '--regex_engine', choices=('re', 're2'), default='re',
+        help='regex engine to profile (see `pile_regex_engine`).')
+
+    parser.add_argument(
+        '-o', '--output', type=Path, default=None,
+        help=('path prefix to save the summary (`[output]_summary.csv`) '
+              'and slowest texts (`[output]_worst.jsonl`) to.'))
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    _main()
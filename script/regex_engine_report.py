@@ -0,0 +1,142 @@
+# coding=utf-8
+"""
+Compatibility report for the regex engines of `pile_regex_engine`:
+which patterns of `pile_regex_imports` are ported to RE2 (and why the others
+are not), and whether the ported patterns find identical matches
+(spans and groups of every match) on a sample of texts.
+
+Texts are sampled from `pile_tables/` dataframes (`text` column, or `raw`
+after encoding translation) or `.jsonl` files (after encoding translation),
+i.e. in the form the patterns are applied to.
+
+    examples:
+        python script/regex_engine_report.py
+        python script/regex_engine_report.py /share/compling/data/puddin/pile_tables/pile_00_Pile-CC_df.pkl.gz -n 5000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import pile_regex_imports
+from pile_ingest import is_jsonl_path, iter_subset_records, jsonl_stem
+from pile_normalize import translate_encoding
+from pile_regex_engine import EnginePattern, set_regex_engine
+
+
+def _main():
+    args = _parse_args()
+    texts = sample_texts(args.input_files, args.sample_size,
+                         args.corpus_selection, args.seed).tolist()
+    if not texts:
+        sys.exit('No texts found in input files.')
+    print(f'{len(texts)} sample texts, '
+          f'{round(sum(len(t) for t in texts) / 1024**2, 2)} M characters\n')
+
+    try:
+        set_regex_engine('re2')
+    except ImportError as e:
+        sys.exit(str(e))
+
+    rows = []
+    for name, pattern in get_patterns().items():
+        row = {'pattern': name, 'engine': pattern.engine,
+               'not ported': pattern.port_error or ''}
+        if pattern.engine == 're2':
+            re_matches, row['re sec'] = _time_matches(pattern.re_pattern, texts)
+            re2_matches, row['re2 sec'] = _time_matches(pattern.re2_pattern, texts)
+            row['texts matched'] = sum(bool(m) for m in re_matches)
+            row['texts differing'] = sum(a != b for a, b in zip(re_matches, re2_matches))
+        rows.append(row)
+    report = pd.DataFrame(rows).set_index('pattern')
+    if 'texts matched' in report.columns:
+        report = report.astype({'texts matched': 'Int64', 'texts differing': 'Int64'})
+    print(report.to_string(na_rep='-'))
+
+    ported = report.loc[report.engine == 're2', :]
+    if ported['texts differing'].any():
+        print('\n! Some ported patterns do not match identically !')
+    else:
+        print(f'\nAll {len(ported)} ported patterns match identically on the sample.')
+    if args.output:
+        report.to_csv(args.output)
+        print(f'report saved to {args.output}')
+
+
+def get_patterns():
+    """name: pattern for every pattern defined in `pile_regex_imports`"""
+    return {name: value for name, value in vars(pile_regex_imports).items()
+            if isinstance(value, EnginePattern)}
+
+
+def sample_texts(paths, sample_size: int, subset: str = 'Pile-CC', seed: int = 0):
+    """random sample of (encoding translated) texts from dataframes and/or jsonl files
+
+    Returns:
+        pd.Series: texts indexed by text id (dataframes) or
+            `[jsonl stem]:[raw ordinal]` (jsonl files)
+    """
+    ids, texts = [], []
+    for path in paths:
+        if is_jsonl_path(path):
+            for ordinal, text in iter_subset_records(path, subset):
+                ids.append(f'{jsonl_stem(path)}:{ordinal}')
+                texts.append(translate_encoding(text))
+        else:
+            df = pd.read_pickle(path)
+            ids.extend(df.text_id.astype(str) if 'text_id' in df.columns
+                       else df.index.astype(str))
+            texts.extend(df.text if 'text' in df.columns
+                         else df.raw.apply(translate_encoding))
+    if len(texts) > sample_size:
+        rng = np.random.default_rng(seed)
+        keep = sorted(rng.choice(len(texts), sample_size, replace=False))
+        ids, texts = [ids[i] for i in keep], [texts[i] for i in keep]
+    return pd.Series([str(t) for t in texts], index=ids, dtype=object)
+
+
+def _time_matches(compiled, texts):
+    t0 = time.perf_counter()
+    matches = [[(m.span(), m.groups()) for m in compiled.finditer(t)] for t in texts]
+    return matches, round(time.perf_counter() - t0, 3)
+
+
+def _parse_args():
+
+    parser = argparse.ArgumentParser(
+        description=('Report which regex patterns run on RE2 and compare their '
+                     'matches to python `re` on a sample of texts.'),
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        'input_files', type=Path, nargs='*',
+        default=sorted(Path(__file__).parent.parent
+                       .joinpath('demo', 'data', 'pile').glob('*.jsonl')),
+        help=('`pile_tables/` dataframe(s) (`.pkl.gz`) and/or `.jsonl` file(s) '
+              'to sample texts from. Defaults to the demo data files.'))
+
+    parser.add_argument(
+        '-c', '--corpus_selection', type=str, default='Pile-CC',
+        help='pile set to select from `.jsonl` inputs.')
+
+    parser.add_argument(
+        '-n', '--sample_size', type=int, default=2000,
+        help='number of texts to sample.')
+
+    parser.add_argument(
+        '-s', '--seed', type=int, default=0,
+        help='random seed for sampling.')
+
+    parser.add_argument(
+        '-o', '--output', type=Path, default=None,
+        help='path to save the report to (csv).')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    _main()
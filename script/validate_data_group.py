@@ -5,6 +5,7 @@ from multiprocessing import current_process
 import pandas as pd
 import sys
 
+from pile_ingest import iter_table, read_table
 from pull_ids_from_conll import conllu_id_iter, reconstruct_raw_iter
 
 VALID_EXCL_DIR_NAME = "validated"
@@ -95,8 +96,10 @@ def assess_data_group(grp: str, info: pd.DataFrame, rawdf_path: Path, data_dir:
     # * EXCLUSIONS
     excl_path = data_dir.joinpath(info.exclusions_path.iloc[0])
     xdf = _load_exclusions(excl_path)
+    text_changes = _load_text_changes(
+        data_dir.joinpath(info.final_df_path.iloc[0]), xdf)
 
-    gdf = _consolidate_info(gdf, xdf)
+    gdf = _consolidate_info(gdf, xdf, text_changes)
     is_missing = gdf.missing
     # * Pull info for ids that are missing from both conllu file and exclusions
     if any(is_missing
@@ -194,7 +197,7 @@ def _prep_raw_dataframe(info, rawdf_path):
     _inform(
         _format(f"Loading initial/raw dataframe:\n > {rawdf_path}\n   ..."))
 
-    rdf = pd.read_pickle(rawdf_path).rename(
+    rdf = read_table(rawdf_path).rename(
         columns={
             "raw": "raw_text",
             "text_id": "raw_id",
@@ -316,7 +319,7 @@ def _load_exclusions(excl_path):
     #     # else:
     #     #     xdf = xdf.assign(row_ix=xdf.index).set_index("text_id")
     _inform(_format(f"Loading exclusions dataframe:\n > {excl_path}"))
-    xdf = pd.read_pickle(excl_path).rename(columns={'text_id': 'raw_id'})
+    xdf = read_table(excl_path).rename(columns={'text_id': 'raw_id'})
     xdf = xdf.assign(known_fail=xdf.excl_type.str.contains("fail"),
                      row_ix=pd.to_numeric(xdf.index, downcast='unsigned'))
 
@@ -335,7 +338,7 @@ def _load_exclusions(excl_path):
 
     xdf = xdf.assign(
         excl_type=pd.Categorical(xdf.excl_type.astype("string"),
-                                 categories=['wiki', 'html', 'json', 'code', '_wrd',
+                                 categories=['xdup', 'ndup', 'wiki', 'html', 'json', 'code', '_wrd',
                                              'a0wrd', 'punc', 'fail', _MISSING_EXCL_CODE]),
         # row_ix=pd.to_numeric(xdf.row_ix, downcast="unsigned"),
         slice_code=xdf.slice_code.astype("string")
@@ -378,7 +381,25 @@ def _add_slice_code(df):
     return df.assign(slice_code=df.slice_code.astype('category'))
 
 
-def _consolidate_info(gdf, xdf):
+def _load_text_changes(final_df_path: Path, xdf):
+    """`text_changes` flags (set by each cleaning step that changed a text,
+    see `pile_normalize`) by raw id, from the final dataframe and the exclusions.
+    None if not recorded (data processed before the flags were saved)"""
+    changes = []
+    if 'text_changes' in xdf.columns:
+        changes.append(xdf.text_changes.dropna())
+    # (final tables saved in chunks are read a chunk at a time)
+    for fdf in iter_table(final_df_path):
+        if 'text_changes' in fdf.columns:
+            changes.append(fdf.set_index('text_id').text_changes)
+    if not changes:
+        return None
+    changes = pd.concat(changes)
+    changes.index = changes.index.astype('string')
+    return changes[~changes.index.duplicated()]
+
+
+def _consolidate_info(gdf, xdf, text_changes=None):
     # > for every text in gdf that is also in xdf, add `excl_type` and `known_fail` values
     # > and every text *not* in xdf will have NaN values for these new columns
     xdf_addition = (xdf.rename(columns={'text': 'excl_text'})
@@ -395,13 +416,23 @@ def _consolidate_info(gdf, xdf):
     gdf = gdf.loc[:, ~gdf.columns.isin(
         xdf_addition.columns)].join(xdf_addition)
 
+    # > texts changed by cleaning: from the recorded flags where available
+    # >   (otherwise, by comparing excluded and raw texts)
+    if text_changes is None:
+        text_changes = pd.Series(dtype='UInt16')
+    flags = text_changes.reindex(gdf.index.astype('string')).set_axis(gdf.index)
+    has_flags = flags.notna()
+    text_altered = (flags != 0).astype('boolean')
+    text_altered[~has_flags] = (gdf.excl_text[~has_flags]
+                                != gdf.raw_text[~has_flags])
+
     gdf = gdf.assign(
         success=~gdf.conll_id.isna(),
         known_fail=gdf.known_fail.fillna(False),
         slice=gdf.conll_id.str.split(".").str.get(0).astype("string"),
         excl_type=gdf.excl_type.astype("string").astype("category"),
         data_group=gdf.data_group.astype("string").astype("category"),
-        text_altered=gdf.excl_text != gdf.raw_text,
+        text_altered=text_altered,
         # docs_in_conllu=pd.to_numeric(gdf.docs_in_conllu, downcast='unsigned')
     )
     gdf = gdf.loc[:, ~gdf.columns.str.endswith('_text')]
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# (the pipeline modules are run as scripts from `script/`)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1].joinpath('script')))
@@ -0,0 +1,57 @@
+import contextlib
+import io
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('stanza')
+import parse_pile as pp  # noqa: E402
+from pile_cleancache import CleaningCache  # noqa: E402
+from pile_ingest import read_table  # noqa: E402
+
+SAMPLE_JSONL = Path(__file__).resolve().parents[1].joinpath(
+    'demo', 'data', 'pile', 'sample-2.jsonl')
+SUBSETS = ['Pile-CC', 'OpenWebText2']
+
+
+def _process(dest_dir: Path):
+    """final and exclusions tables of the sample (without the output paths),
+    and the lines reporting cleaning cache hits"""
+    pp.confirm_destination_dir(dest_dir)
+    with contextlib.redirect_stdout(io.StringIO()) as log:
+        for __ in pp.process_raw_jsonlines([SAMPLE_JSONL], SUBSETS):
+            pass
+    tables = {}
+    for subset in SUBSETS:
+        finaldf_fpath = pp.get_dfpkl_outpath('sample-2', subset)
+        for table_fpath in (finaldf_fpath,
+                            pp.get_dfpkl_outpath(finaldf_fpath.stem, is_excl=True)):
+            df = read_table(table_fpath)
+            tables[table_fpath.name] = (
+                df.loc[:, ~df.columns.str.endswith('fpath')]
+                .sort_values('text_id').reset_index(drop=True))
+    return tables, [line.split()[:3] for line in log.getvalue().splitlines()
+                    if line.endswith('found in cleaning cache')]
+
+
+@pytest.mark.parametrize('chunk_rows', [0, 7])
+def test_cached_cleaning_matches_fresh_run(tmp_path, monkeypatch, chunk_rows):
+    monkeypatch.setattr(pp, '_CHUNK_ROWS', chunk_rows)
+    monkeypatch.setattr(pp, '_CLEAN_CACHE', None)
+    fresh, __ = _process(tmp_path.joinpath('fresh'))
+
+    cache = CleaningCache(tmp_path.joinpath('cleaned-texts.sqlite'))
+    monkeypatch.setattr(pp, '_CLEAN_CACHE', cache)
+    first, first_hits = _process(tmp_path.joinpath('first'))
+    assert all(found == '0' for found, __, __ in first_hits)
+    cached_texts = len(cache)
+    assert cached_texts
+    second, second_hits = _process(tmp_path.joinpath('second'))
+    assert second_hits and all(found == total for found, __, total in second_hits)
+    assert len(cache) == cached_texts
+
+    for tables in (first, second):
+        assert tables.keys() == fresh.keys()
+        for name, df in tables.items():
+            pd.testing.assert_frame_equal(df, fresh[name], check_like=True)
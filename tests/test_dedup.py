@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from pile_dedup import CorpusDedupStore, FingerprintStore, drop_duplicate_texts
+
+
+def _raw_df(seed=6, n_texts=3000):
+    rng = np.random.default_rng(seed)
+    texts = [f'text {i}' + ' é' * (i % 3) for i in rng.integers(0, 800, n_texts)]
+    texts[5:8] = ['', '', ' ']
+    return pd.DataFrame({'raw': texts, 'raw_ordinal': np.arange(n_texts) * 2})
+
+
+def test_fingerprint_dedup_matches_drop_duplicates():
+    df = _raw_df()
+    expected = df.drop_duplicates(subset='raw')
+
+    deduped, dups = drop_duplicate_texts(df)
+    pd.testing.assert_frame_equal(deduped, expected)
+    assert len(dups) == len(df) - len(expected)
+    # (each duplicate collapses into the first text it duplicates)
+    first_ordinal = expected.set_index('raw').raw_ordinal
+    dup_texts = df.set_index('raw_ordinal').raw.loc[dups.raw_ordinal]
+    assert (first_ordinal.loc[dup_texts].to_numpy() == dups.duplicate_of).all()
+
+
+def test_chunked_fingerprint_dedup_matches_drop_duplicates():
+    df = _raw_df()
+    store = FingerprintStore()
+    deduped = pd.concat([drop_duplicate_texts(df.iloc[start:start + 250], store)[0]
+                         for start in range(0, len(df), 250)])
+    pd.testing.assert_frame_equal(deduped, df.drop_duplicates(subset='raw'))
+    assert len(store) == len(deduped)
+
+
+def test_released_claims_are_accepted_by_the_next_group(tmp_path):
+    store = CorpusDedupStore(tmp_path.joinpath('accepted-texts.sqlite'))
+    texts = ['kept text', 'excluded text']
+    assert store.claim(texts, ['pcc_00_01', 'pcc_00_02'], 'pcc_00').isna().all()
+
+    assert store.release(['pcc_00_02'], 'pcc_00') == 1
+    assert store.release(['pcc_00_01'], 'pcc_01') == 0
+    owners = store.claim(texts, ['pcc_01_01', 'pcc_01_02'], 'pcc_01')
+    assert owners.tolist() == ['pcc_00_01', pd.NA]
+    assert len(store) == 2
@@ -0,0 +1,47 @@
+import json
+from pathlib import Path
+
+from pile_exclude import EXCLUSION_CLASSIFIER
+from pile_normalize import translate_encoding
+
+SAMPLE_JSONL = Path(__file__).resolve().parents[1].joinpath(
+    'demo', 'data', 'pile', 'sample-2.jsonl')
+TEXTS = [
+    '',
+    'plain text.',
+    'a <__UNK__> character, with an_underscore',
+    'some <nowiki> and {{cite|x}} markup',
+    '{{Infobox|name=x}} and <b>html</b>',
+    '<p>html</p> with {"a":{"b": 1}}',
+    '{"a":{"b": 1}} and some_variable',
+    'if x == true: return x_y  # and a0b1 word',
+    'mixed a0b1 and mid.word, punc',
+    'only mid!word punc',
+]
+
+
+def _sample_texts():
+    with SAMPLE_JSONL.open(encoding='utf-8') as jsonl:
+        return [translate_encoding(json.loads(line)['text']) for line in jsonl]
+
+
+def _applied_in_turn(texts):
+    """excl_type per text (None if kept) when each rule's pattern is applied to
+    the texts no earlier rule matched, as exclusions used to be pulled"""
+    verdicts = [None] * len(texts)
+    remaining = list(range(len(texts)))
+    for excl_type, pattern in EXCLUSION_CLASSIFIER.rules:
+        matched = {i for i in remaining if pattern.re_pattern.search(texts[i])}
+        for i in matched:
+            verdicts[i] = excl_type
+        remaining = [i for i in remaining if i not in matched]
+    return verdicts
+
+
+def test_single_pass_matches_rules_applied_in_turn():
+    texts = TEXTS + _sample_texts()
+    expected = _applied_in_turn(texts)
+    assert set(expected) == {None, *EXCLUSION_CLASSIFIER.excl_types}
+    excl_types = EXCLUSION_CLASSIFIER.excl_types
+    assert [excl_types[i] if i >= 0 else None
+            for i in EXCLUSION_CLASSIFIER(texts)] == expected
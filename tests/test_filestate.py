@@ -0,0 +1,39 @@
+import json
+import sqlite3
+from contextlib import closing
+
+from pile_filestate import FileLedger, file_fingerprint
+
+
+def test_identical_outputs_of_different_sources(tmp_path):
+    ledger = FileLedger(tmp_path.joinpath('file-ledger.sqlite'))
+    sources = [tmp_path.joinpath(f'0{i}.jsonl') for i in range(2)]
+    outputs = [tmp_path.joinpath(f'pile_0{i}_Pile-CC_excl.pkl.gz') for i in range(2)]
+    for i, (source, output) in enumerate(zip(sources, outputs)):
+        source.write_text(f'{{"text": "{i}"}}\n')
+        # (e.g. empty exclusions tables)
+        output.write_bytes(b'same content')
+        ledger.record(output, source)
+
+    assert ledger.is_current(outputs[0], sources[0])
+    assert ledger.is_current(outputs[1], sources[1])
+    assert len(ledger.ancestor_sets(outputs[0])) == 2
+
+    sources[0].write_text('{"text": "edited"}\n')
+    assert not ledger.is_current(outputs[0], sources[0])
+    assert ledger.is_current(outputs[1], sources[1])
+
+
+def test_single_record_ledgers_are_carried_over(tmp_path):
+    db_path = tmp_path.joinpath('file-ledger.sqlite')
+    source, output = tmp_path.joinpath('00.jsonl'), tmp_path.joinpath('00_df.pkl.gz')
+    source.write_text('{"text": "0"}\n')
+    output.write_bytes(b'table')
+    with closing(sqlite3.connect(db_path)) as conn, conn:
+        conn.execute('CREATE TABLE derived (fingerprint TEXT PRIMARY KEY, '
+                     'ancestors TEXT NOT NULL, path TEXT)')
+        conn.execute('INSERT INTO derived VALUES (?, ?, ?)',
+                     (file_fingerprint(output),
+                      json.dumps([file_fingerprint(source)]), str(output)))
+
+    assert FileLedger(db_path).is_current(output, source)
@@ -0,0 +1,50 @@
+import gzip
+import json
+from pathlib import Path
+
+import pytest
+
+from pile_ingest import iter_routed_records, iter_subset_records
+
+SAMPLE_PATH = Path(__file__).resolve().parents[1].joinpath('demo', 'data', 'pile', 'sample-2.jsonl')
+SUBSETS = ['Pile-CC', 'OpenWebText2', 'Wikipedia (en)', 'StackExchange', 'Wikipédia']
+
+
+def _tricky_lines():
+    """records the byte prefilter must neither drop nor wrongly select"""
+    records = [
+        # (the marker of another subset in the text is escaped)
+        {'text': 'quoted: "pile_set_name": "OpenWebText2"', 'meta': {'pile_set_name': 'Pile-CC'}},
+        {'text': '"pile_set_name": "Pile-CC"', 'meta': {'pile_set_name': 'OpenWebText2'}},
+    ]
+    lines = [json.dumps(record) for record in records]
+    lines.append(json.dumps({'text': 'utf-8 subset name', 'meta': {'pile_set_name': 'Wikipédia'}},
+                            ensure_ascii=False))
+    lines.append(json.dumps({'text': 'escaped subset name', 'meta': {'pile_set_name': 'Wikipédia'}}))
+    # other key formats: inconclusive, so decoded
+    lines.append(json.dumps({'text': 'compact', 'meta': {'pile_set_name': 'Pile-CC'}},
+                            separators=(',', ':')))
+    lines.append('{"meta": {"pile_set_name" : "OpenWebText2"}, "text": "spaced key"}')
+    lines.append('{"text": "escaped", "meta": {"pile_set_name": "\\u0050ile-CC"}}')
+    return lines
+
+
+@pytest.fixture(params=['.jsonl', '.jsonl.gz'])
+def jsonl_path(request, tmp_path):
+    lines = SAMPLE_PATH.read_text(encoding='utf-8').splitlines() + _tricky_lines()
+    path = tmp_path.joinpath('00' + request.param)
+    data = ('\n'.join(lines) + '\n').encode('utf-8')
+    path.write_bytes(gzip.compress(data) if request.param == '.jsonl.gz' else data)
+    return path
+
+
+def test_prefilter_selects_what_full_decoding_selects(jsonl_path):
+    for subset in SUBSETS:
+        full = list(iter_subset_records(jsonl_path, subset, prefilter=False))
+        assert full
+        assert list(iter_subset_records(jsonl_path, subset)) == full
+    routed = list(iter_routed_records(jsonl_path, SUBSETS))
+    assert routed == list(iter_routed_records(jsonl_path, SUBSETS, prefilter=False))
+    assert routed == list(iter_routed_records(jsonl_path, SUBSETS, workers=2))
+    assert {name for __, name, __ in routed} == set(SUBSETS)
+    assert any(text == 'escaped' for __, __, text in routed)
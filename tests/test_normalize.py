@@ -0,0 +1,59 @@
+import contextlib
+import io
+import json
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from pile_normalize import (CHANGE_FLAGS, POST_EXCLUSION_PIPELINE,
+                            PRE_EXCLUSION_PIPELINE, apply_pipeline)
+
+SAMPLE_JSONL = Path(__file__).resolve().parents[1].joinpath(
+    'demo', 'data', 'pile', 'sample-2.jsonl')
+
+
+def _sample_texts():
+    with SAMPLE_JSONL.open(encoding='utf-8') as jsonl:
+        return pd.Series([json.loads(line)['text'] for line in jsonl])
+
+
+def test_change_flags_mark_the_steps_that_changed_each_text():
+    texts = pd.concat([_sample_texts(), pd.Series(['', 'unchanged text.'])],
+                      ignore_index=True)
+    assert len(set(CHANGE_FLAGS.values())) == len(CHANGE_FLAGS)
+    for pipeline in (PRE_EXCLUSION_PIPELINE, POST_EXCLUSION_PIPELINE):
+        results, changes, __ = apply_pipeline(texts, pipeline)
+        for text, result, changed in zip(texts, results, changes):
+            expected = 0
+            for func, bit in zip(pipeline.funcs, pipeline.bits):
+                new_text = func(text)
+                if new_text != text:
+                    expected |= bit
+                text = new_text
+            assert result == text
+            assert changed == expected
+        assert changes.any() and not changes.all()
+        texts = results
+
+
+@pytest.mark.parametrize('chunk_rows', [0, 7])
+def test_nonzero_flags_mark_the_altered_texts(tmp_path, monkeypatch, chunk_rows):
+    pytest.importorskip('stanza')
+    import parse_pile as pp
+    from pile_ingest import read_table
+
+    monkeypatch.setattr(pp, '_CHUNK_ROWS', chunk_rows)
+    pp.confirm_destination_dir(tmp_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for __ in pp.process_raw_jsonlines([SAMPLE_JSONL], ['Pile-CC']):
+            pass
+    finaldf_fpath = pp.get_dfpkl_outpath('sample-2', 'Pile-CC')
+    raw_texts = read_table(
+        finaldf_fpath.parent.joinpath('raw', finaldf_fpath.name)).set_index('text_id').raw
+    for table_fpath in (finaldf_fpath,
+                        pp.get_dfpkl_outpath(finaldf_fpath.stem, is_excl=True)):
+        df = read_table(table_fpath)
+        is_altered = df.text.to_numpy() != raw_texts.loc[df.text_id].to_numpy()
+        assert is_altered.any()
+        assert ((df.text_changes != 0).to_numpy() == is_altered).all()
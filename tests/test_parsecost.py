@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pile_parsecost import slice_bounds, stream_slices
+
+
+def _pieces(costs, piece_rows):
+    df = pd.DataFrame({'text_id': [f'pcc_00_{i:04d}' for i in range(len(costs))]})
+    features = pd.DataFrame({'chars': np.arange(len(costs))})
+    for start in range(0, len(costs), piece_rows):
+        end = start + piece_rows
+        yield df.iloc[start:end], features.iloc[start:end], costs[start:end]
+
+
+def _streamed_bounds(costs, limit, piece_rows):
+    sizes = [len(sldf) for sldf, __ in
+             stream_slices(_pieces(costs, piece_rows), limit)]
+    return np.cumsum(sizes).tolist()
+
+
+@pytest.mark.parametrize('costs, limit', [([1, 1, 100], 10),
+                                          ([100], 10),
+                                          ([1] * 23, 10)])
+def test_stream_slices_edge_cases(costs, limit):
+    costs = np.array(costs, dtype='float64')
+    for piece_rows in (1, 2, len(costs)):
+        assert _streamed_bounds(costs, limit, piece_rows) == slice_bounds(costs, limit)
+
+
+def test_stream_slices_match_slice_bounds():
+    rng = np.random.default_rng(24)
+    for __ in range(500):
+        n_texts = int(rng.integers(1, 80))
+        # row counts, and predicted seconds with the occasional very long text
+        costs = (np.ones(n_texts) if rng.random() < 0.3
+                 else rng.lognormal(0, 1.5, n_texts))
+        limit = float(rng.choice([1, 3, 6, 10, 25]))
+        piece_rows = int(rng.integers(1, 30))
+        bounds = slice_bounds(costs, limit)
+        assert _streamed_bounds(costs, limit, piece_rows) == bounds
+        # (every slice has texts, so the count used for zfilling is exact)
+        assert np.diff([0] + bounds).min() > 0
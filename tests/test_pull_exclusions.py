@@ -0,0 +1,58 @@
+import contextlib
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('stanza')
+import parse_pile as pp  # noqa: E402
+from pile_exclude import EXCLUSION_CLASSIFIER  # noqa: E402
+
+TEXTS = ['plain text.', '{"a":{"b": 1}} json', 'some <nowiki> markup',
+         'if x == true: return', 'mixed a0b1 word', '<p>html</p>', 'another text',
+         'only mid!word punc', 'an_underscore', 'kept text']
+
+
+def _df(n_texts=60, seed=19):
+    rng = np.random.default_rng(seed)
+    texts = [TEXTS[i] + f' {n}' for n, i in enumerate(rng.integers(0, len(TEXTS), n_texts))]
+    return pd.DataFrame({'text_id': [f'pcc_00_{n:02d}' for n in range(n_texts)],
+                         'slice_id': '', 'text': texts,
+                         'pile_set_name': 'Pile-CC', 'pile_set_code': 'pcc'})
+
+
+def _pulled_in_turn(df, prev_excl, verdicts):
+    """kept rows and (text_id, excl_type) of the exclusions in the order they were
+    saved when `df` was filtered with `isin()` after each step"""
+    df = df.loc[~df.text_id.isin(prev_excl.text_id), :]
+    excluded = list(zip(prev_excl.text_id, prev_excl.excl_type))
+    known = df.text_id.map(verdicts)
+    excluded += [(t, v) for t, v in zip(df.text_id, known) if isinstance(v, str) and v]
+    to_check = df.loc[known.isna(), :]
+    for excl_type, pattern in EXCLUSION_CLASSIFIER.rules:
+        is_match = to_check.text.map(lambda text: bool(pattern.re_pattern.search(text)))
+        excluded += [(t, excl_type) for t in to_check.text_id[is_match]]
+        to_check = to_check.loc[~is_match, :]
+    excluded_ids = {t for t, __ in excluded}
+    return df.loc[~df.text_id.isin(excluded_ids), :], excluded
+
+
+def test_exclusion_codes_keep_row_order(tmp_path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        pp.confirm_destination_dir(tmp_path)
+    df = _df()
+    excl_save_path = pp.get_dfpkl_outpath('00', 'Pile-CC', is_excl=True)
+    prev_excl = df.iloc[[3, 40]].assign(excl_type=['html', 'code'])
+    prev_excl.to_pickle(excl_save_path)
+    verdicts = {'pcc_00_05': 'punc', 'pcc_00_06': '', 'pcc_00_11': 'json',
+                'pcc_00_40': 'wiki'}
+    expected_kept, expected_excl = _pulled_in_turn(df, prev_excl, verdicts)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        kept, excl_df = pp.pull_exclusions(df, excl_save_path, verdicts=dict(verdicts))
+
+    pd.testing.assert_frame_equal(kept, expected_kept)
+    assert list(zip(excl_df.text_id, excl_df.excl_type)) == expected_excl
+    assert len({excl_type for __, excl_type in expected_excl}) > 5
+    pd.testing.assert_frame_equal(pd.read_pickle(excl_save_path), excl_df)
@@ -0,0 +1,46 @@
+import contextlib
+import io
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('stanza')
+import parse_pile as pp  # noqa: E402
+import pile_exclude as pe  # noqa: E402
+from pile_regex_engine import compile_pattern  # noqa: E402
+
+SAMPLE_JSONL = Path(__file__).resolve().parents[1].joinpath(
+    'demo', 'data', 'pile', 'sample-2.jsonl')
+
+
+@pytest.fixture
+def restore_classifier():
+    classifier = pp.EXCLUSION_CLASSIFIER
+    yield
+    pp.EXCLUSION_CLASSIFIER = classifier
+
+
+def test_recheck_group_with_empty_exclusions(tmp_path, restore_classifier):
+    pp.confirm_destination_dir(tmp_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for __ in pp.process_raw_jsonlines([SAMPLE_JSONL], ['Pile-CC']):
+            pass
+    finaldf_fpath = pp.get_dfpkl_outpath('sample-2', 'Pile-CC')
+    excl_fpath = pp.get_dfpkl_outpath(finaldf_fpath.stem, is_excl=True)
+    kept_texts = len(pd.read_pickle(finaldf_fpath))
+    excluded = pd.read_pickle(excl_fpath)
+    excluded.iloc[:0].to_pickle(excl_fpath)
+
+    # a broader pattern for one type, so the group is rechecked
+    rules = [(t, compile_pattern(r'[A-Za-z]\d\d[A-Za-z]') if t == 'a0wrd' else p)
+             for t, p in pe.EXCLUSION_CLASSIFIER.rules]
+    pp.EXCLUSION_CLASSIFIER = pe.ExclusionClassifier(*rules)
+    with contextlib.redirect_stdout(io.StringIO()):
+        admitted = pp.recheck_exclusions(finaldf_fpath)
+
+    assert admitted.empty
+    rechecked = pd.read_pickle(excl_fpath)
+    assert (rechecked.excl_type == 'a0wrd').all()
+    assert len(rechecked) + len(pd.read_pickle(finaldf_fpath)) == kept_texts
+    assert pp.load_rule_versions(excl_fpath) == pp.EXCLUSION_CLASSIFIER.versions
@@ -0,0 +1,22 @@
+import gc
+
+import pile_regex_imports
+from pile_regex_engine import (_PATTERNS, EnginePattern, compile_pattern,
+                               get_regex_engine, set_regex_engine)
+
+
+def test_only_patterns_in_use_are_registered():
+    module_patterns = {id(p) for p in vars(pile_regex_imports).values()
+                       if isinstance(p, EnginePattern)}
+    assert module_patterns <= {id(p) for p in _PATTERNS}
+    registered = len(_PATTERNS)
+
+    pattern = compile_pattern(r'\d+\w', literals=['0', '1'])
+    assert len(_PATTERNS) == registered + 1
+    assert pattern.search('a 1b').group() == '1b'
+    del pattern
+    gc.collect()
+    assert len(_PATTERNS) == registered
+
+    set_regex_engine(get_regex_engine())
+    assert module_patterns <= {id(p) for p in _PATTERNS}
@@ -0,0 +1,66 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from pile_sliceledger import SliceLedger
+
+SLICE_PATH = 'pile_tables/slices/PccTe/tmp/pile_test_Pile-CC_df-01.pkl.gz'
+
+
+def _ledger(tmp_path):
+    ledger = SliceLedger(tmp_path.joinpath('slice-ledger.sqlite'), timeout=30)
+    ledger.record_created(pd.DataFrame(
+        {'tmp_slice_path': [SLICE_PATH], 'data_origin_group': ['test']}, index=[1]))
+    return ledger
+
+
+def test_concurrent_claims_of_one_slice(tmp_path):
+    ledger = _ledger(tmp_path)
+    start = threading.Barrier(2)
+
+    def claim(slice_name):
+        start.wait()
+        return ledger.claim(SLICE_PATH, slice_name)
+
+    with ThreadPoolExecutor(2) as pool:
+        results = list(pool.map(claim, ['PccTe_01', 'PccTe_01']))
+
+    assert sorted(claimed for claimed, __ in results) == [False, True]
+    refused = next(previous for claimed, previous in results if not claimed)
+    assert refused[0] == 'claimed'
+    slices = ledger.to_frame(states=None)
+    assert slices.state.tolist() == ['claimed']
+    assert slices.attempts.tolist() == [1]
+
+
+def test_claim_only_unfinished_or_stale_slices(tmp_path):
+    ledger = _ledger(tmp_path)
+    assert ledger.claim(SLICE_PATH, 'PccTe_01')[0]
+    ledger.set_state(SLICE_PATH, 'parsing')
+    assert not ledger.claim(SLICE_PATH, 'PccTe_01')[0]
+    time.sleep(0.05)
+    assert ledger.claim(SLICE_PATH, 'PccTe_01', stale_after=0.01)[0]
+
+    ledger.set_state(SLICE_PATH, 'failed', error='RuntimeError()')
+    claimed, previous = ledger.claim(SLICE_PATH, 'PccTe_01')
+    assert claimed and previous[0] == 'failed'
+    ledger.set_state(SLICE_PATH, 'done')
+    assert not ledger.claim(SLICE_PATH, 'PccTe_01', stale_after=0)[0]
+    claimed, previous = ledger.claim(SLICE_PATH, 'PccTe_01', force=True)
+    assert claimed and previous[0] == 'done'
+    assert ledger.to_frame(states=None).attempts.tolist() == [4]
+
+
+def test_heartbeats_keep_a_long_parse_from_going_stale(tmp_path):
+    ledger = _ledger(tmp_path)
+    assert ledger.claim(SLICE_PATH, 'PccTe_01')[0]
+    ledger.set_state(SLICE_PATH, 'parsing')
+    with ledger.keep_alive(SLICE_PATH, interval=0.02):
+        for __ in range(5):
+            time.sleep(0.05)
+            assert not ledger.claim(SLICE_PATH, 'PccTe_01', stale_after=0.2)[0]
+    time.sleep(0.25)
+    assert ledger.claim(SLICE_PATH, 'PccTe_01', stale_after=0.2)[0]
+    assert ledger.to_frame(states=None).attempts.tolist() == [2]